@@ -0,0 +1,84 @@
+"""
+Build grader_lib/ from the relayer modules the grader uses (chain config,
+keyring, logging, RPC client, ABI decoding, relay verification, token index)
+as of a pinned revision of this repository, with package-relative imports.
+
+    python .guides/tests/build_grader_lib.py [--revision REV]
+
+The grader runs next to the student's repository, which has modules with
+the same names that the student is free to change.  Importing these as
+grader_lib.* keeps the grader's copies separate from those, and reading them
+from git rather than the working tree keeps the student's edits out of them.
+grader_lib/ is not committed: gen_keys.py builds it on first import, and
+again whenever REVISION changes.  Bump REVISION to give the grader a newer
+version of the relayer modules.
+"""
+import argparse
+import re
+import subprocess
+from pathlib import Path
+
+REVISION = "c434396beafac6604010beb0bbacbb13ae1dbff8"
+MODULES = ("abi_artifact", "bridge_keyring", "bridge_log", "chain_config", "relay_verify", "rpc_client",
+           "rpc_limiter", "token_mapping")
+DATA = ("chains.json",)
+GRADER_LIB = Path(__file__).resolve().with_name("grader_lib")
+
+
+def _git(*args):
+    return subprocess.run(["git", "-C", str(GRADER_LIB.parent), *args], check=True, capture_output=True).stdout
+
+
+def packaged(source):
+    """
+    A relayer module with its imports of the other MODULES made package-relative.
+    """
+    source = re.sub(r"^(\s*)import (\w+)$", lambda m: f"{m[1]}from . import {m[2]}" if m[2] in MODULES else m[0],
+                    source, flags=re.M)
+    return re.sub(r"^(\s*)from (\w+) import", lambda m: f"{m[1]}from .{m[2]} import" if m[2] in MODULES else m[0],
+                  source, flags=re.M)
+
+
+def build(revision=REVISION, out=GRADER_LIB):
+    """
+    Write the package to `out`.  Raises ValueError if a module imports a
+    relayer module that isn't in MODULES.
+    """
+    out = Path(out)
+    root = {Path(p).stem for p in _git("ls-tree", "--name-only", "--full-tree", revision).decode().split()
+            if p.endswith(".py")}
+    files = {}
+    for name in MODULES:
+        source = packaged(_git("show", f"{revision}:{name}.py").decode())
+        missing = {m for m in re.findall(r"^\s*(?:import|from) (\w+)", source, flags=re.M) if m in root}
+        if missing:
+            raise ValueError(f"{name}.py imports {', '.join(sorted(missing))}; add it to MODULES")
+        files[f"{name}.py"] = source
+    for name in DATA:
+        files[name] = _git("show", f"{revision}:{name}").decode()
+    files["__init__.py"] = f'"""\nRelayer modules for the grader, built by build_grader_lib.py.\n"""\nrevision = "{revision}"\n'
+    out.mkdir(parents=True, exist_ok=True)
+    for name, text in files.items():
+        (out / name).write_text(text)
+
+
+def built_revision(out=GRADER_LIB):
+    init = Path(out) / "__init__.py"
+    found = re.search(r'^revision = "(\w+)"$', init.read_text(), flags=re.M) if init.exists() else None
+    return found and found[1]
+
+
+def ensure(revision=REVISION, out=GRADER_LIB):
+    """
+    Build grader_lib unless it is already built from `revision`.
+    """
+    if built_revision(out) != revision:
+        build(revision, out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build grader_lib from a pinned revision")
+    parser.add_argument("--revision", default=REVISION)
+    args = parser.parse_args()
+    build(args.revision)
+    print(f"Built {GRADER_LIB} from {args.revision}")
@@ -1,4 +1,7 @@
 from web3 import Web3
+import build_grader_lib
+build_grader_lib.ensure()  # before anything imports grader_lib
+from grader_lib.bridge_keyring import get_keyring
 
 def get_eth_keys(keyId = 0, filename = "/home/codio/workspace/.guides/tests/eth_mnemonic.txt"):
     """
@@ -8,21 +11,14 @@ def get_eth_keys(keyId = 0, filename = "/home/codio/workspace/.guides/tests/eth_
 
     Each mnemonic is stored on a separate line
     If fewer than (keyId+1) mnemonics have been generated, generate a new one and return that
+    Accounts are derived once per process and cached by bridge_keyring
     """
-    w3 = Web3()
     try:
-        w3.eth.account.enable_unaudited_hdwallet_features()
-        f = open(filename,"r")
-        #mnemonic_secrets = [line.strip() for line in f]
-        mnemonic_secrets = f.read().splitlines()
-        mnemonic_secret = mnemonic_secrets[keyId].rstrip()
-        acct = w3.eth.account.from_mnemonic(mnemonic_secret)
-        eth_pk = acct._address
-        eth_sk = acct._private_key
-        f.close()
+        acct = get_keyring(filename).get(keyId)
     except Exception as e:
         print( e )
         print( "Generating account" )
+        w3 = Web3()
         w3.eth.account.enable_unaudited_hdwallet_features()
         acct,mnemonic_secret = w3.eth.account.create_with_mnemonic()
         eth_pk = acct._address
@@ -37,6 +33,13 @@ def get_eth_keys(keyId = 0, filename = "/home/codio/workspace/.guides/tests/eth_
     #acct = w3.eth.account.privateKeyToAccount(eth_sk)
     return acct
 
+def get_eth_keys_many(keyIds, filename = "/home/codio/workspace/.guides/tests/eth_mnemonic.txt"):
+    """
+    Accounts for several key ids at once; the ones not derived yet are derived in parallel
+    All the key ids must already exist in the mnemonic file
+    """
+    return get_keyring(filename).get_many(keyIds)
+
 if __name__ == "__main__":
     for i in range(4):
         acct = get_eth_keys(keyId=i)
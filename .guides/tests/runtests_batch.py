@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Clone and grade a whole cohort concurrently.
+
+    python runtests_batch.py roster.txt [--workers 8] [--out grades.csv]
+
+roster.txt has one "github_username repository" pair per line.  Each student
+is graded in a fresh worker process (the student's bridge.py is imported by
+validate.load_student_bridge, and no module state leaks between students),
+with output going to logs/<github_username>.log.  Grader transactions from all
+workers share nonces through validate.allocate_nonce, so throughput is bounded
+by chain confirmations rather than by one repository at a time.
+"""
+import argparse
+import contextlib
+import csv
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+key_dir = "/home/codio/workspace/ssh_keys"
+key_file = "id_mcit5830"
+tests_dir = Path(__file__).resolve().parent
+
+
+def read_roster(path):
+    students = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                github_username, repo = line.split()[:2]
+                students.append((github_username, repo))
+    return students
+
+
+def clone_repo(github_username, repo, dir_string):
+    import pygit2
+
+    dir_path = Path(dir_string)
+    if dir_path.exists():
+        shutil.rmtree(dir_path)
+    keypair = pygit2.Keypair("git", f"{key_dir}/{key_file}.pub", f"{key_dir}/{key_file}", "")
+    callbacks = pygit2.RemoteCallbacks(credentials=keypair)
+    print(f'Cloning from: git@github.com:{github_username}/{repo}.git')
+    pygit2.clone_repository(f"git@github.com:{github_username}/{repo}.git", dir_string, callbacks=callbacks)
+
+
+def grade_one(github_username, repo, work_dir, log_dir):
+    """
+    Clone and grade one student inside a worker process.  Returns (score, seconds, error).
+    """
+    start = time.time()
+    dir_string = str(Path(work_dir) / github_username / repo)
+    log_path = Path(log_dir) / f"{github_username}.log"
+    # validate reads erc20s.csv and the grader keys relative to the tests directory
+    os.chdir(tests_dir)
+    sys.path.insert(0, str(tests_dir))
+    with open(log_path, "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            clone_repo(github_username, repo, dir_string)
+        except Exception as e:
+            print(f"Failed to clone the repository.\n{e}")
+            return 0, time.time() - start, "clone failed"
+        try:
+            from validate import validate
+
+            score = validate(dir_string)
+        except Exception as e:
+            print(f"Grader error\n{e}")
+            return 0, time.time() - start, f"grader error: {e}"
+    return score, time.time() - start, ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grade many student repositories concurrently")
+    parser.add_argument("roster", help="file with one 'github_username repository' pair per line")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--out", default="grades.csv")
+    parser.add_argument("--work-dir", default=str(tests_dir / "submissions"))
+    parser.add_argument("--log-dir", default=str(tests_dir / "logs"))
+    args = parser.parse_args()
+
+    if not Path(f"{key_dir}/{key_file}").is_file() or not Path(f"{key_dir}/{key_file}.pub").is_file():
+        print(f"Error can't find SSH keys!")
+        print(f"Make sure \"{key_dir}/{key_file}\" and \"{key_dir}/{key_file}.pub\" exist")
+        sys.exit(1)
+
+    students = read_roster(args.roster)
+    Path(args.log_dir).mkdir(parents=True, exist_ok=True)
+    print(f"Grading {len(students)} repositories with {args.workers} workers")
+
+    start = time.time()
+    results = []
+    # max_tasks_per_child=1: every student gets a fresh interpreter
+    with ProcessPoolExecutor(max_workers=args.workers, max_tasks_per_child=1) as pool:
+        futures = {pool.submit(grade_one, u, r, args.work_dir, args.log_dir): (u, r) for u, r in students}
+        for future in as_completed(futures):
+            github_username, repo = futures[future]
+            try:
+                score, seconds, error = future.result()
+            except Exception as e:
+                score, seconds, error = 0, 0, f"worker crashed: {e}"
+            print(f"{github_username}/{repo}: {score} ({seconds:.0f}s) {error}")
+            results.append((github_username, repo, score, round(seconds, 1), error))
+
+    with open(args.out, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["github_username", "repository", "score", "seconds", "error"])
+        writer.writerows(sorted(results))
+    print(f"Graded {len(results)} repositories in {time.time() - start:.0f}s, results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,29 @@
 import sys
 import json
 import time
+import fcntl
 import random
+import hashlib
+import importlib.util
 import pandas as pd
 from web3 import Web3, constants
 from os import path
 from pathlib import Path
 from web3.middleware import geth_poa_middleware  # Necessary for POA chains
-from gen_keys import get_eth_keys
+from eth_abi import encode
+from eth_account.messages import SignableMessage
+from gen_keys import get_eth_keys, get_eth_keys_many
+from grader_lib import abi_artifact, chain_config, relay_verify
+from grader_lib.rpc_client import RPCClient
+from grader_lib.token_mapping import TokenIndex
 
 
 def connect_to(chain):
-    if chain == 'avax':
-        api_url = f"https://api.avax-test.network/ext/bc/C/rpc"  # AVAX C-chain testnet
-
-    if chain == 'bsc':
-        api_url = f"https://data-seed-prebsc-1-s1.binance.org:8545/"  # BSC testnet
-
-    if chain in ['avax', 'bsc']:
-        w3 = Web3(Web3.HTTPProvider(api_url))
+    """
+        chain (string) - a chain in chains.json (e.g. 'avax', 'bsc')
+    """
+    w3 = Web3(Web3.HTTPProvider(chain_config.rpc_url(chain)))
+    if chain_config.get_chain(chain)["poa"]:
         # inject the poa compatibility middleware to the innermost layer
         w3.middleware_onion.inject(geth_poa_middleware, layer=0)
     return w3
@@ -39,14 +44,101 @@ def connect_to(chain):
 
 ########################################
 contract_info = "contract_info.json"
-source_chain = 'avax'
-destination_chain = 'bsc'
+source_chain = chain_config.get_route().source
+destination_chain = chain_config.get_route().destination
 source_w3 = connect_to(source_chain)
 destination_w3 = connect_to(destination_chain)
 
 
+grader_nonces = Path(__file__).with_name("grader_nonces.json")
+event_timeout = 90  # seconds to wait for the student's relayer before giving up
+token_index_dir = Path(__file__).with_name("token_index")
+token_index = None  # TokenIndex of the student's contracts, set by validate()
+
+
 ########################################
 
+def load_student_bridge(dir_string):
+    """
+        Import the student's bridge.py from dir_string under a name unique to that directory,
+        so several students can be graded without sharing a cached 'bridge' module
+    """
+    bridge_path = Path(dir_string).resolve() / "bridge.py"
+    name = "student_bridge_" + hashlib.sha1(str(bridge_path).encode()).hexdigest()[:12]
+    spec = importlib.util.spec_from_file_location(name, bridge_path)
+    module = importlib.util.module_from_spec(spec)
+    # The student's own helper modules are imported relative to their repo
+    sys.path.insert(0, str(bridge_path.parent))
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(str(bridge_path.parent))
+    sys.modules[name] = module
+    return module
+
+
+def allocate_nonce(w3, address):
+    """
+        Next nonce for a grader account.
+        Grader accounts are shared by every grading process, so nonces are handed out under a file lock
+        (grader_nonces.json) instead of each process reading the same on-chain count
+    """
+    key = f"{w3.provider.endpoint_uri}:{address}"
+    with open(grader_nonces, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        data = json.loads(f.read() or "{}")
+        nonce = max(data.get(key) or 0, w3.eth.get_transaction_count(address, 'pending'))
+        data[key] = nonce + 1
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(data))
+    return nonce
+
+
+def reset_nonce(w3, address):
+    """
+        Forget the allocated nonce after a failed send so the next allocation re-reads it from the chain
+    """
+    key = f"{w3.provider.endpoint_uri}:{address}"
+    with open(grader_nonces, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        data = json.loads(f.read() or "{}")
+        data[key] = None
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(data))
+
+
+def wait_for_block(w3, block_number, timeout=event_timeout, poll=0.5):
+    """
+        Wait until the chain head has reached block_number
+    """
+    deadline = time.time() + timeout
+    while w3.eth.get_block_number() < block_number and time.time() < deadline:
+        time.sleep(poll)
+
+
+def wait_for_events(w3, check, done, timeout=event_timeout, poll=0.5):
+    """
+        w3 - web3 instance of the chain being searched
+        check - function returning the events found so far
+        done - function(events) returning True once every expected event has been found
+        Re-runs check() each time a new block arrives until done() or timeout, and returns the last events found
+    """
+    deadline = time.time() + timeout
+    last_block = w3.eth.get_block_number()
+    events = check()
+    while not done(events) and time.time() < deadline:
+        time.sleep(poll)
+        head = w3.eth.get_block_number()
+        if head != last_block:
+            last_block = head
+            events = check()
+    return events
+
+
 def get_erc20_abi():
     """
     Return the ABI for our ERC20 contract
@@ -95,13 +187,46 @@ def get_erc20s(w3, chain, n):
     return tokens
 
 
+PERMIT_ABI = [
+    {"inputs": [], "name": "DOMAIN_SEPARATOR", "outputs": [{"name": "", "type": "bytes32"}],
+     "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "owner", "type": "address"}], "name": "nonces", "outputs": [{"name": "", "type": "uint256"}],
+     "stateMutability": "view", "type": "function"},
+]
+PERMIT_TYPEHASH = Web3.keccak(text="Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)")
+
+
+def sign_permit(token, owner, spender, value, deadline):
+    """
+        token - (contract object) an EIP-2612 token
+        owner - (account object) the token holder
+        Returns (v, r, s) for token.permit(owner, spender, value, deadline, ...), or None if the token
+        doesn't support permit
+    """
+    permit_token = token.w3.eth.contract(abi=PERMIT_ABI, address=token.address)
+    try:
+        domain_separator = permit_token.functions.DOMAIN_SEPARATOR().call()
+        nonce = permit_token.functions.nonces(owner.address).call()
+    except Exception:
+        return None
+    struct_hash = Web3.keccak(encode(['bytes32', 'address', 'address', 'uint256', 'uint256', 'uint256'],
+                                     [PERMIT_TYPEHASH, owner.address, spender, value, nonce, deadline]))
+    signed = owner.sign_message(SignableMessage(b"\x01", domain_separator, struct_hash))
+    return signed.v, signed.r.to_bytes(32, 'big'), signed.s.to_bytes(32, 'big')
+
+
 def get_wrapped_token(token):
     """
         token - (contract object) underlying token on source chain
         Returns a contract object corresponding to the wrapped version of this asset on the destination chain
     """
     try:
-        wrapped_token_address = destination_contract.functions.wrapped_tokens(token.address).call()
+        wrapped_token_address = token_index.wrapped_token(token.address) or constants.ADDRESS_ZERO
+    except Exception:
+        wrapped_token_address = None
+    try:
+        if wrapped_token_address is None:
+            wrapped_token_address = destination_contract.functions.wrapped_tokens(token.address).call()
     except Exception as e:
         print(f"Failed to get wrapped token for {token.address} on contract {destination_contract.address}")
         print(e)
@@ -125,12 +250,11 @@ def sign_and_send(contract, function, signer, argdict, confirm=True, nonce_offse
         signer - (account object) the account that should initiate the transaction
         argdict - (dictionary) the function arguments as key-value pairs
         confirm - (boolean) whether to wait for confirmation from the chain
-        nonce_offset - (int) signAndSend gets the signer's nonce from on-chain, so if you call it multiple times
-        in rapid succession, the later transactions will fail.  This allow you to manually increment the nonce if
-        you know you're going to call the function repeatedly
+        nonce_offset - (int) kept for compatibility; nonces now come from allocate_nonce, so calling this
+        repeatedly (even from several grading processes) no longer needs a manual offset
     """
     w3 = contract.w3
-    nonce = w3.eth.get_transaction_count(signer.address)
+    nonce = allocate_nonce(w3, signer.address)
     nonce += nonce_offset
     contract_func = getattr(contract.functions, function)
     try:
@@ -148,10 +272,11 @@ def sign_and_send(contract, function, signer, argdict, confirm=True, nonce_offse
     except Exception as e:
         print(f"signAndSend: failed to send transaction (function = {function})")
         print(e)
+        reset_nonce(w3, signer.address)
         return None
 
     if confirm:
-        tx_receipt = w3.eth.wait_for_transaction_receipt(signed_tx.hash)
+        tx_receipt = w3.eth.wait_for_transaction_receipt(signed_tx.hash, poll_latency=0.2)
         if tx_receipt.status:
             print(f"Transaction confirmed for '{function}' at block {tx_receipt.blockNumber}")
         else:
@@ -161,6 +286,18 @@ def sign_and_send(contract, function, signer, argdict, confirm=True, nonce_offse
     return signed_tx.hash.hex()
 
 
+def block_of(w3, transaction_hash):
+    """
+        Block number a confirmed transaction was included in (None if it wasn't sent)
+    """
+    if transaction_hash is None:
+        return None
+    try:
+        return w3.eth.get_transaction_receipt(transaction_hash).blockNumber
+    except Exception:
+        return None
+
+
 def ensure_balance(token, user, bal):
     """
         token - (contract object) an ERC20 token
@@ -193,6 +330,26 @@ def ensure_balance(token, user, bal):
     sign_and_send(token, 'mint', minter, {'to': user, 'amount': bal - current_balance})
 
 
+def is_approved(token_address):
+    """
+        Source.approved(token_address), from the token index when possible
+    """
+    try:
+        return token_index.is_approved(token_address)
+    except Exception:
+        return source_contract.functions.approved(token_address).call()
+
+
+def underlying_token(wrapped_address):
+    """
+        Destination.underlying_tokens(wrapped_address), from the token index when possible
+    """
+    try:
+        return token_index.underlying_token(wrapped_address) or constants.ADDRESS_ZERO
+    except Exception:
+        return destination_contract.functions.underlying_tokens(wrapped_address).call()
+
+
 def check_token_registration(deposits, points):
     """
        check erc20s are registered on contracts
@@ -203,10 +360,11 @@ def check_token_registration(deposits, points):
         sender = d['sender']  # Account object (not address)
 
         ensure_balance(token, sender.address, 10 ** 6)
-        if not source_contract.functions.approved(token.address).call():
+        if not is_approved(token.address):
             print(f"Error: you need to call registerToken({token.address}) Before submitting your assignment")
             points -= points_per
-        if constants.ADDRESS_ZERO == destination_contract.functions.wrapped_tokens(token.address).call():
+        wrapped_token = get_wrapped_token(token)
+        if wrapped_token is None or wrapped_token.address == constants.ADDRESS_ZERO:
             print(f"Error: you need to call createToken({token.address}) Before submitting your assignment")
             points -= points_per
         return points
@@ -235,7 +393,8 @@ def check_contract_addresses(source, destination):
 def make_deposits(deposits):
     """
         deposits - (list of dictionaries)  
-        Make deposits on the source chain
+        Make deposits on the source chain, with depositWithPermit where possible
+        and approve + deposit otherwise
     """
 
     for d in deposits:
@@ -244,9 +403,31 @@ def make_deposits(deposits):
         receiver = d['receiver']  # address
         amount = d['amount']  # int
 
+        # Tokens that support EIP-2612 are deposited in a single transaction if the student's Source has depositWithPermit
+        permit = None
+        if any(f.get('name') == 'depositWithPermit' for f in source_contract.abi):
+            deadline = int(time.time()) + 3600
+            permit = sign_permit(token, sender, source_contract.address, amount, deadline)
+
+        if permit is not None:
+            v, r, s = permit
+            try:
+                transaction_hash = sign_and_send(source_contract, "depositWithPermit", sender,
+                                                 {'_token': token.address,
+                                                  '_recipient': receiver,
+                                                  '_amount': amount,
+                                                  '_deadline': deadline,
+                                                  'v': v, 'r': r, 's': s})
+                print(f"Deposit (with permit) transaction Hash = {transaction_hash}")
+                d['block_number'] = block_of(source_w3, transaction_hash)
+            except Exception as e:
+                print(f"Error: depositWithPermit transaction failed on source chain\n{e}")
+            continue
+
+        # The approval doesn't need to be confirmed first: the deposit uses the next nonce, so it's mined after it
         try:
             transaction_hash = sign_and_send(token, "approve", sender,
-                                             {'spender': source_contract.address, 'amount': amount})
+                                             {'spender': source_contract.address, 'amount': amount}, confirm=False)
             print(f"Approval at {transaction_hash}")
         except Exception as e:
             print(f"Error: Failed to approve token transfer\nContact your instructor\n{e}")
@@ -258,6 +439,7 @@ def make_deposits(deposits):
                                               '_recipient': receiver,
                                               '_amount': amount})
             print(f"Deposit transaction Hash = {transaction_hash}")
+            d['block_number'] = block_of(source_w3, transaction_hash)
         except Exception as e:
             print(f"Error: deposit transaction failed on source chain\n{e}")
 
@@ -282,14 +464,16 @@ def make_withdrawals(withdrawals):
                                               '_recipient': receiver,
                                               '_amount': amount})
             print(f"Unwrap transaction Hash = {transaction_hash}")
+            d['block_number'] = block_of(destination_w3, transaction_hash)
         except Exception as e:
             print(f"Error: unwrap transaction failed on destination chain")
             print(e)
 
 
-def check_for_wrap():
+def check_for_wrap(start_block=None):
     end_block = destination_w3.eth.get_block_number()
-    start_block = end_block - 5
+    if start_block is None:
+        start_block = end_block - 5
     print(f"Autograder scanning blocks {start_block} - {end_block} on destination")
     event_filter = destination_contract.events.Wrap.create_filter(fromBlock=start_block, toBlock=end_block,
                                                                   argument_filters={})
@@ -314,9 +498,10 @@ def check_for_wrap():
     return wrap_events
 
 
-def check_for_withdrawal():
+def check_for_withdrawal(start_block=None):
     end_block = source_w3.eth.get_block_number()
-    start_block = end_block - 5
+    if start_block is None:
+        start_block = end_block - 5
     print(f"Autograder scanning blocks {start_block} - {end_block} on source")
     event_filter = source_contract.events.Withdrawal.create_filter(fromBlock=start_block, toBlock=end_block,
                                                                    argument_filters={})
@@ -339,19 +524,80 @@ def check_for_withdrawal():
     return withdrawal_events
 
 
-def validate(dir_string):
-    sys.path.append(dir_string)
+def check_receipts(w3, contract, name, tx_hashes, start_block):
+    """
+        w3 - web3 instance of the chain the relays were sent to
+        contract - abi_artifact entry of the student's contract on that chain
+        name - relay event ('Wrap' or 'Withdrawal')
+        tx_hashes - relay transactions returned by the student's scanBlocks
+        start_block - head of that chain before scanBlocks was called
+        Decodes the relay events from the receipts of tx_hashes (one receipt batch, no block scan), in the same
+        format as check_for_wrap / check_for_withdrawal.  Receipts mined before start_block are rejected: they
+        can't be relays of this run's transfers (e.g. hashes from an earlier run)
+    """
+    client = RPCClient(w3.provider.endpoint_uri)
+    try:
+        outcomes = relay_verify.verify_hashes(client, contract, name, list(tx_hashes))
+    finally:
+        client.close()
+    relay_events = []
+    for tx_hash, (outcome, events) in outcomes.items():
+        print(f"Relay transaction {tx_hash}: {outcome.status}")
+        for evt in events:
+            if evt.blockNumber < start_block:
+                print(f"Relay transaction {tx_hash} was mined in block {evt.blockNumber}, before this run's "
+                      f"transfers (block {start_block}): ignored")
+                break
+            data = dict({'event': name, 'block_number': evt.blockNumber}, **evt.args,
+                        transactionHash=evt.transactionHash, address=evt.address)
+            print(json.dumps(data, indent=2))
+            relay_events.append(data)
+    return relay_events
+
+
+def check_relays(w3, contract, name, tx_hashes, start_block, scan_check, done):
+    """
+        Relay events from the receipts of the student's relay transactions when scanBlocks returned their hashes,
+        falling back to scanning blocks (scan_check) while those don't account for every transfer.  Only
+        receipts mined from start_block on count
+    """
+    if isinstance(tx_hashes, (list, tuple)) and tx_hashes:
+        events = check_receipts(w3, contract, name, tx_hashes, start_block)
+    else:
+        events = []
+    if done(events):
+        return events
+    return scan_check()
 
+
+def wrap_matches(d, w):
+    return d['receiver'] == w['to'] and d['amount'] == w['amount'] and d['token'].address == w['underlying_token']
+
+
+def withdrawal_matches(u, w):
+    return u['receiver'] == w['recipient'] and \
+        u['amount'] == w['amount'] and \
+        underlying_token(u['token'].address) == w['token']
+
+
+def validate(dir_string):
     # Define contract instances
     global source_contract
     global destination_contract
+    global token_index
     print("----- Calling student 'bridge.getContractInfo()' -----")
     try:
-        from bridge import getContractInfo
+        student_bridge = load_student_bridge(dir_string)
+        getContractInfo = student_bridge.getContractInfo
         source = getContractInfo('source')
         source_contract = source_w3.eth.contract(abi=source['abi'], address=source['address'])
         destination = getContractInfo('destination')
         destination_contract = destination_w3.eth.contract(abi=destination['abi'], address=destination['address'])
+        artifact = abi_artifact.build_artifact({'source': source, 'destination': destination})
+        clients = {'source': RPCClient(source_w3.provider.endpoint_uri),
+                   'destination': RPCClient(destination_w3.provider.endpoint_uri)}
+        token_index = TokenIndex(source['address'], destination['address'], clients,
+                                 token_index_dir / f"{source['address'].lower()}-{destination['address'].lower()}.json")
     except Exception as e:
         print(f"Error running getContractInfo")
         print(e)
@@ -362,8 +608,11 @@ def validate(dir_string):
     if not check_contract_addresses(source['address'], destination['address']):
         return 0
 
-    user_a = get_eth_keys(keyId=0)
-    user_b = get_eth_keys(keyId=3)
+    # Derive all the grader accounts up front (key 1 is the minter used by ensure_balance)
+    try:
+        user_a, _, user_b = get_eth_keys_many([0, 1, 3])
+    except Exception:
+        user_a, user_b = get_eth_keys(keyId=0), get_eth_keys(keyId=3)
 
     tokens = get_erc20s(source_w3, source_chain, 2)
     deposits = [{'token': tokens[0], 'sender': user_a, 'receiver': user_b.address, 'amount': random.randint(10, 1000)}]
@@ -387,28 +636,36 @@ def validate(dir_string):
 
     print("\n----- AutoGrader sending deposits to student Source contract -----")
     make_deposits(deposits)
-    time.sleep(5)
+    # Deposits are confirmed by now; make sure the head has caught up before the student scans the last blocks
+    start_block = min((d['block_number'] for d in deposits if d.get('block_number') is not None), default=None)
+    if start_block is not None:
+        wait_for_block(source_w3, start_block)
+    # Wraps can only appear after this point, however long the student's relayer takes
+    wrap_start = destination_w3.eth.get_block_number()
 
     print("\n----- Calling student 'bridge.scanBlocks()' -----")
     try:
-        from bridge import scanBlocks
-        scanBlocks('source')  # Run the student's code
+        wrap_hashes = student_bridge.scanBlocks('source')  # Run the student's code
     except Exception as e:
         print(f"Error running scanBlocks('source')")
         print(e)
         return 0
 
     print("\n----- AutoGrader searching for Wrap events on student Destination contract -----")
-    time.sleep(5)
-    # Now we search the destination chain for Wrap events
-    wrap_events = check_for_wrap()
-    if len(wrap_events) == 0:
-        time.sleep(5)
-        wrap_events = check_for_wrap()
+    # Now we search the destination chain for Wrap events, re-checking on every new block until all deposits
+    # have been wrapped (the student's relay transactions may still be pending when scanBlocks returns)
+    # If scanBlocks returned its relay transaction hashes, the Wrap events are read from their receipts instead
+    def wrapped(evts):
+        return all(any(wrap_matches(d, w) for w in evts) for d in deposits)
+
+    wrap_events = wait_for_events(destination_w3,
+                                  lambda: check_relays(destination_w3, artifact['destination'], 'Wrap', wrap_hashes,
+                                                       wrap_start, lambda: check_for_wrap(wrap_start), wrapped),
+                                  wrapped)
     score = 0
     for d in deposits:
         for w in wrap_events:
-            if d['receiver'] == w['to'] and d['amount'] == w['amount'] and d['token'].address == w['underlying_token']:
+            if wrap_matches(d, w):
                 score += 1
                 break
             else:
@@ -421,11 +678,13 @@ def validate(dir_string):
     # We make withdrawals on the destination chain and check if the message gets passed back to the source chain
     print("\n----- AutoGrader sending Unwrap to student Destination contract -----")
     make_withdrawals(withdrawals)
-    time.sleep(5)
+    start_block = min((u['block_number'] for u in withdrawals if u.get('block_number') is not None), default=None)
+    if start_block is not None:
+        wait_for_block(destination_w3, start_block)
+    withdrawal_start = source_w3.eth.get_block_number()
     print("\n----- Calling student 'bridge.scanBlocks()' -----")
     try:
-        from bridge import scanBlocks
-        scanBlocks('destination')  # Run the student's code
+        withdrawal_hashes = student_bridge.scanBlocks('destination')  # Run the student's code
     except Exception as e:
         print(f"Error running scanBlocks('destination')")
         print(e)
@@ -433,17 +692,19 @@ def validate(dir_string):
 
     # Now we search the source chain for Withdraw events
     print("\n----- AutoGrader searching for Withdraw events on student Source contract -----")
-    time.sleep(5)
-    withdrawal_events = check_for_withdrawal()
-    if len(withdrawal_events) == 0:
-        time.sleep(5)
-        withdrawal_events = check_for_wrap()
+    def withdrawn(evts):
+        return all(any(withdrawal_matches(u, w) for w in evts) for u in withdrawals)
+
+    withdrawal_events = wait_for_events(source_w3,
+                                        lambda: check_relays(source_w3, artifact['source'], 'Withdrawal',
+                                                             withdrawal_hashes, withdrawal_start,
+                                                             lambda: check_for_withdrawal(withdrawal_start),
+                                                             withdrawn),
+                                        withdrawn)
 
     for u in withdrawals:
         for w in withdrawal_events:
-            if u['receiver'] == w['recipient'] and \
-                    u['amount'] == w['amount'] and \
-                    destination_contract.functions.underlying_tokens(u['token'].address).call() == w['token']:
+            if withdrawal_matches(u, w):
                 score += 1
                 break
             else:
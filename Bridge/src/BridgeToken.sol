@@ -3,17 +3,49 @@ pragma solidity ^0.8.17;
 
 import "@openzeppelin/contracts/token/ERC20/ERC20.sol";
 import "@openzeppelin/contracts/token/ERC20/extensions/ERC20Burnable.sol";
+import "@openzeppelin/contracts/token/ERC20/extensions/draft-ERC20Permit.sol";
 import "@openzeppelin/contracts/access/AccessControl.sol";
 
-contract BridgeToken is ERC20, ERC20Burnable, AccessControl {
+contract BridgeToken is ERC20, ERC20Burnable, ERC20Permit, AccessControl {
     bytes32 public constant MINTER_ROLE = keccak256("MINTER_ROLE");
 	address public underlying;
+	string private _token_name;
+	string private _token_symbol;
+	bool private _initialized;
 
-    constructor( address _underlying, string memory name, string memory symbol, address admin ) ERC20(name,symbol) {
+    constructor( address _underlying, string memory name, string memory symbol, address admin ) ERC20(name,symbol) ERC20Permit("BridgeToken") {
+		/*
+		   The EIP-712 domain name is fixed to "BridgeToken" because clones share the implementation's immutables;
+		   the domain still separates tokens by verifyingContract (each clone's own address)
+		*/
+		_initialize(_underlying, name, symbol, admin);
+    }
+
+	function initialize( address _underlying, string memory name, string memory symbol, address admin ) public {
+		/*
+		   EIP-1167 clones (see Destination.createToken) don't run the constructor, so they are set up here instead.
+		   The implementation contract is initialized by its constructor and can't be re-initialized.
+		*/
+		_initialize(_underlying, name, symbol, admin);
+	}
+
+	function _initialize( address _underlying, string memory name, string memory symbol, address admin ) internal {
+		require( !_initialized, 'Already initialized' );
+		_initialized = true;
 		underlying = _underlying;
+		_token_name = name;
+		_token_symbol = symbol;
         _grantRole(DEFAULT_ADMIN_ROLE, admin);
         _grantRole(MINTER_ROLE, admin);
-    }
+	}
+
+	function name() public view override returns (string memory) {
+		return _token_name;
+	}
+
+	function symbol() public view override returns (string memory) {
+		return _token_symbol;
+	}
 
     function mint(address to, uint256 amount) public onlyRole(MINTER_ROLE) {
         _mint(to, amount);
@@ -3,46 +3,98 @@ pragma solidity ^0.8.17;
 
 import "@openzeppelin/contracts/token/ERC20/ERC20.sol";
 import "@openzeppelin/contracts/access/AccessControl.sol";
+import "@openzeppelin/contracts/proxy/Clones.sol";
+import "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
+import "@openzeppelin/contracts/utils/cryptography/EIP712.sol";
 import "./BridgeToken.sol";
 
-contract Destination is AccessControl {
+contract Destination is AccessControl, EIP712 {
     bytes32 public constant WARDEN_ROLE = keccak256("BRIDGE_WARDEN_ROLE");
     bytes32 public constant CREATOR_ROLE = keccak256("CREATOR_ROLE");
 	mapping( address => address) public underlying_tokens;
 	mapping( address => address) public wrapped_tokens;
 	address[] public tokens;
+	address public immutable token_implementation;
+	mapping( bytes32 => bool) public claimed;
+
+	bytes32 public constant WRAP_TYPEHASH = keccak256("Wrap(bytes32 transferId,address underlying_token,address recipient,uint256 amount)");
 
 	event Creation( address indexed underlying_token, address indexed wrapped_token );
 	event Wrap( address indexed underlying_token, address indexed wrapped_token, address indexed to, uint256 amount );
 	event Unwrap( address indexed underlying_token, address indexed wrapped_token, address frm, address indexed to, uint256 amount );
 
-    constructor( address admin ) {
+	error ZeroAmount();
+	error ZeroRecipient();
+	error UnregisteredToken( address token );
+	error AlreadyCreated( address token );
+	error NotWarden( address account );
+	error AlreadyClaimed( bytes32 transferId );
+
+    constructor( address admin ) EIP712("Bridge Destination", "1") {
         _grantRole(DEFAULT_ADMIN_ROLE, admin);
         _grantRole(CREATOR_ROLE, admin);
         _grantRole(WARDEN_ROLE, admin);
+		token_implementation = address(new BridgeToken(address(0), "", "", address(this)));
     }
 
-	function wrap(address _underlying_token, address _recipient, uint256 _amount ) public onlyRole(WARDEN_ROLE) {
-		require( _amount > 0, 'Cannot mint 0' );
-		require( _recipient != address(0), 'Cannot deposit to 0 address' );
-		require( wrapped_tokens[_underlying_token] != address(0), 'Cannot wrap an unregistered token' );
+	function wrap(bytes32 _transferId, address _underlying_token, address _recipient, uint256 _amount ) public {
+		/*
+		   Checked directly rather than with onlyRole, which builds a revert string on failure.
+		   _transferId is the same id claimWrap takes, so a Deposit settled here can't also be claimed (or the reverse)
+		*/
+		if( !hasRole(WARDEN_ROLE, msg.sender) ) revert NotWarden(msg.sender);
+		if( claimed[_transferId] ) revert AlreadyClaimed(_transferId);
+		claimed[_transferId] = true;
+		_wrap(_underlying_token, _recipient, _amount);
+	}
+
+	function claimWrap(bytes32 _transferId, address _underlying_token, address _recipient, uint256 _amount, bytes calldata _signature ) public {
+		/*
+		   Claim mode: instead of sending wrap() itself, a warden signs an EIP-712 Wrap attestation
+		   for the Deposit event and anyone (normally the recipient) submits it here.
+		   _transferId is keccak256(abi.encode(deposit tx hash, log index)) and can only be claimed once
+		*/
+		if( claimed[_transferId] ) revert AlreadyClaimed(_transferId);
+		bytes32 digest = _hashTypedDataV4(keccak256(abi.encode(WRAP_TYPEHASH, _transferId, _underlying_token, _recipient, _amount)));
+		address signer = ECDSA.recover(digest, _signature);
+		if( !hasRole(WARDEN_ROLE, signer) ) revert NotWarden(signer);
+		claimed[_transferId] = true;
+		_wrap(_underlying_token, _recipient, _amount);
+	}
+
+	function DOMAIN_SEPARATOR() external view returns (bytes32) {
+		return _domainSeparatorV4();
+	}
+
+	function _wrap(address _underlying_token, address _recipient, uint256 _amount ) internal {
+		if( _amount == 0 ) revert ZeroAmount();
+		if( _recipient == address(0) ) revert ZeroRecipient();
+		address wrapped_token = wrapped_tokens[_underlying_token];
+		if( wrapped_token == address(0) ) revert UnregisteredToken(_underlying_token);
 
-		BridgeToken(wrapped_tokens[_underlying_token]).mint(_recipient,_amount);
-		emit Wrap( _underlying_token, wrapped_tokens[_underlying_token], _recipient, _amount );
+		BridgeToken(wrapped_token).mint(_recipient,_amount);
+		emit Wrap( _underlying_token, wrapped_token, _recipient, _amount );
 	}
 
 	function unwrap(address _wrapped_token, address _recipient, uint256 _amount ) public {
-		require( _amount > 0, 'Cannot mint 0' );
-		require( _recipient != address(0), 'Cannot unwrap to 0 address' );
-		require( underlying_tokens[_wrapped_token] != address(0) , 'Cannot unwrap an unregistered token' );
+		if( _amount == 0 ) revert ZeroAmount();
+		if( _recipient == address(0) ) revert ZeroRecipient();
+		address underlying_token = underlying_tokens[_wrapped_token];
+		if( underlying_token == address(0) ) revert UnregisteredToken(_wrapped_token);
 
 		BridgeToken(_wrapped_token).burnFrom(msg.sender,_amount);
-		emit Unwrap( underlying_tokens[_wrapped_token],_wrapped_token,msg.sender, _recipient,_amount );
+		emit Unwrap( underlying_token,_wrapped_token,msg.sender, _recipient,_amount );
 
 	}
 
 	function createToken(address _underlying_token, string memory name, string memory symbol ) public onlyRole(CREATOR_ROLE) returns(address) {
-		BridgeToken token = new BridgeToken(_underlying_token,name,symbol,address(this));
+		/*
+		   Wrapped tokens are EIP-1167 minimal proxies of token_implementation deployed with CREATE2,
+		   salted by the underlying token, so their addresses can be computed off-chain (see predictWrappedToken)
+		*/
+		if( wrapped_tokens[_underlying_token] != address(0) ) revert AlreadyCreated(_underlying_token);
+		BridgeToken token = BridgeToken(Clones.cloneDeterministic(token_implementation, _salt(_underlying_token)));
+		token.initialize(_underlying_token,name,symbol,address(this));
 		underlying_tokens[address(token)] = _underlying_token;
 		wrapped_tokens[_underlying_token] = address(token);
 		tokens.push(address(token));
@@ -50,6 +102,14 @@ contract Destination is AccessControl {
 		return address(token);
 	}
 
+	function predictWrappedToken(address _underlying_token) public view returns(address) {
+		return Clones.predictDeterministicAddress(token_implementation, _salt(_underlying_token));
+	}
+
+	function _salt(address _underlying_token) internal pure returns(bytes32) {
+		return bytes32(uint256(uint160(_underlying_token)));
+	}
+
 }
 
 
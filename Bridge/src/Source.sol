@@ -2,38 +2,89 @@
 pragma solidity ^0.8.17;
 
 import "@openzeppelin/contracts/token/ERC20/ERC20.sol";
+import "@openzeppelin/contracts/token/ERC20/extensions/draft-IERC20Permit.sol";
 import "@openzeppelin/contracts/access/AccessControl.sol";
+import "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
+import "@openzeppelin/contracts/utils/cryptography/EIP712.sol";
 
-contract Source is AccessControl {
+contract Source is AccessControl, EIP712 {
     bytes32 public constant ADMIN_ROLE = keccak256("ADMIN_ROLE");
     bytes32 public constant WARDEN_ROLE = keccak256("BRIDGE_WARDEN_ROLE");
 	mapping( address => bool) public approved;
 	address[] public tokens;
+	mapping( bytes32 => bool) public claimed;
+
+	bytes32 public constant WITHDRAW_TYPEHASH = keccak256("Withdraw(bytes32 transferId,address token,address recipient,uint256 amount)");
 
 	event Deposit( address indexed token, address indexed recipient, uint256 amount );
 	event Withdrawal( address indexed token, address indexed recipient, uint256 amount );
 	event Registration( address indexed token );
 
-    constructor( address admin ) {
+	error ZeroAmount();
+	error ZeroRecipient();
+	error UnregisteredToken( address token );
+	error NotWarden( address account );
+	error AlreadyClaimed( bytes32 transferId );
+
+    constructor( address admin ) EIP712("Bridge Source", "1") {
         _grantRole(DEFAULT_ADMIN_ROLE, admin);
         _grantRole(ADMIN_ROLE, admin);
 		_grantRole(WARDEN_ROLE, admin);
     }
 
 	function deposit(address _token, address _recipient, uint256 _amount ) public {
-		require( _amount > 0, 'Cannot deposit 0' );
-		require( _recipient != address(0), 'Cannot deposit to 0 address' );
-		require( approved[_token], 'Cannot deposit an unregistered token' );
+		if( _amount == 0 ) revert ZeroAmount();
+		if( _recipient == address(0) ) revert ZeroRecipient();
+		if( !approved[_token] ) revert UnregisteredToken(_token);
 
 		ERC20(_token).transferFrom(msg.sender,address(this),_amount);
 		emit Deposit( _token, _recipient,_amount );
 
 	}
 
-	function withdraw(address _token, address _recipient, uint256 _amount ) onlyRole(WARDEN_ROLE) public {
-		require( _amount > 0, 'Cannot deposit 0' );
-		require( _recipient != address(0), 'Cannot deposit to 0 address' );
-		require( approved[_token], 'Cannot deposit an unregistered token' );
+	function depositWithPermit(address _token, address _recipient, uint256 _amount, uint256 _deadline, uint8 v, bytes32 r, bytes32 s ) public {
+		/*
+		   approve + deposit in one transaction for EIP-2612 tokens.
+		   A permit seen in the mempool can be submitted by anyone first, which makes ours revert;
+		   in that case the allowance is already in place, so the deposit goes ahead regardless
+		*/
+		try IERC20Permit(_token).permit(msg.sender, address(this), _amount, _deadline, v, r, s) {} catch {}
+		deposit(_token, _recipient, _amount);
+	}
+
+	function withdraw(bytes32 _transferId, address _token, address _recipient, uint256 _amount ) public {
+		/*
+		   Checked directly rather than with onlyRole, which builds a revert string on failure.
+		   _transferId is the same id claimWithdraw takes, so an Unwrap settled here can't also be claimed (or the reverse)
+		*/
+		if( !hasRole(WARDEN_ROLE, msg.sender) ) revert NotWarden(msg.sender);
+		if( claimed[_transferId] ) revert AlreadyClaimed(_transferId);
+		claimed[_transferId] = true;
+		_withdraw(_token, _recipient, _amount);
+	}
+
+	function claimWithdraw(bytes32 _transferId, address _token, address _recipient, uint256 _amount, bytes calldata _signature ) public {
+		/*
+		   Claim mode: instead of sending withdraw() itself, a warden signs an EIP-712 Withdraw attestation
+		   for the Unwrap event and anyone (normally the recipient) submits it here.
+		   _transferId is keccak256(abi.encode(unwrap tx hash, log index)) and can only be claimed once
+		*/
+		if( claimed[_transferId] ) revert AlreadyClaimed(_transferId);
+		bytes32 digest = _hashTypedDataV4(keccak256(abi.encode(WITHDRAW_TYPEHASH, _transferId, _token, _recipient, _amount)));
+		address signer = ECDSA.recover(digest, _signature);
+		if( !hasRole(WARDEN_ROLE, signer) ) revert NotWarden(signer);
+		claimed[_transferId] = true;
+		_withdraw(_token, _recipient, _amount);
+	}
+
+	function DOMAIN_SEPARATOR() external view returns (bytes32) {
+		return _domainSeparatorV4();
+	}
+
+	function _withdraw(address _token, address _recipient, uint256 _amount ) internal {
+		if( _amount == 0 ) revert ZeroAmount();
+		if( _recipient == address(0) ) revert ZeroRecipient();
+		if( !approved[_token] ) revert UnregisteredToken(_token);
 
 		ERC20(_token).transfer(_recipient,_amount);
 		emit Withdrawal( _token, _recipient,_amount );
@@ -0,0 +1,195 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.17;
+
+import "forge-std/Test.sol";
+import "../src/Source.sol";
+import "../src/Destination.sol";
+import "@openzeppelin/contracts/token/ERC20/ERC20.sol";
+
+contract CToken is ERC20 {
+	constructor(string memory name, string memory symbol,uint256 supply) ERC20(name,symbol) {
+		_mint(msg.sender, supply );
+	}
+}
+
+contract ClaimTest is Test {
+	Source public source;
+	Destination public destination;
+	ERC20 token;
+	address wtoken;
+
+	uint256 admin_sk = uint256(keccak256(abi.encodePacked("admin")));
+	address admin = vm.addr(admin_sk);
+	uint256 warden_sk = uint256(keccak256(abi.encodePacked("warden")));
+	address warden = vm.addr(warden_sk);
+	address user = address(0xCAFE);
+
+	event Wrap( address indexed underlying_token, address indexed wrapped_token, address indexed to, uint256 amount );
+	event Withdrawal( address indexed token, address indexed recipient, uint256 amount );
+
+	function setUp() public {
+		source = new Source(admin);
+		destination = new Destination(admin);
+
+		vm.prank(user);
+		token = new CToken('Velociraptor','VEL',1e24);
+
+		vm.startPrank(admin);
+		source.registerToken(address(token));
+		source.grantRole(source.WARDEN_ROLE(), warden);
+		wtoken = destination.createToken(address(token),"wVelociraptor","wVEL");
+		destination.grantRole(destination.WARDEN_ROLE(), warden);
+		vm.stopPrank();
+
+		vm.startPrank(user);
+		token.approve(address(source), type(uint256).max);
+		source.deposit(address(token), user, 1e21);
+		vm.stopPrank();
+	}
+
+	function _transferId( bytes32 tx_hash, uint256 log_index ) internal pure returns (bytes32) {
+		return keccak256(abi.encode(tx_hash, log_index));
+	}
+
+	function _signWrap( uint256 sk, bytes32 transferId, address underlying, address recipient, uint256 amount ) internal view returns (bytes memory) {
+		bytes32 structHash = keccak256(abi.encode(destination.WRAP_TYPEHASH(), transferId, underlying, recipient, amount));
+		(uint8 v, bytes32 r, bytes32 s) = vm.sign(sk, keccak256(abi.encodePacked("\x19\x01", destination.DOMAIN_SEPARATOR(), structHash)));
+		return abi.encodePacked(r, s, v);
+	}
+
+	function _signWithdraw( uint256 sk, bytes32 transferId, address _token, address recipient, uint256 amount ) internal view returns (bytes memory) {
+		bytes32 structHash = keccak256(abi.encode(source.WITHDRAW_TYPEHASH(), transferId, _token, recipient, amount));
+		(uint8 v, bytes32 r, bytes32 s) = vm.sign(sk, keccak256(abi.encodePacked("\x19\x01", source.DOMAIN_SEPARATOR(), structHash)));
+		return abi.encodePacked(r, s, v);
+	}
+
+	function testClaimWrap(address submitter, address recipient, uint256 amount) public {
+		vm.assume( recipient != address(0) );
+		vm.assume( amount > 0 );
+		vm.assume( amount < 1e30 );
+		bytes32 id = _transferId(keccak256("deposit tx"), 3);
+		bytes memory sig = _signWrap(warden_sk, id, address(token), recipient, amount);
+
+		vm.expectEmit(true,true,true,true);
+		emit Wrap(address(token), wtoken, recipient, amount);
+		vm.prank(submitter);
+		destination.claimWrap(id, address(token), recipient, amount, sig);
+
+		assertEq( ERC20(wtoken).balanceOf(recipient), amount );
+		assertTrue( destination.claimed(id) );
+	}
+
+	function testClaimWrapReplay() public {
+		bytes32 id = _transferId(keccak256("deposit tx"), 0);
+		bytes memory sig = _signWrap(warden_sk, id, address(token), user, 100);
+		destination.claimWrap(id, address(token), user, 100, sig);
+
+		vm.expectRevert(abi.encodeWithSelector(Destination.AlreadyClaimed.selector, id));
+		destination.claimWrap(id, address(token), user, 100, sig);
+		assertEq( ERC20(wtoken).balanceOf(user), 100 );
+	}
+
+	function testClaimWrapTamperedAmount() public {
+		bytes32 id = _transferId(keccak256("deposit tx"), 0);
+		bytes memory sig = _signWrap(warden_sk, id, address(token), user, 100);
+
+		vm.expectRevert();
+		destination.claimWrap(id, address(token), user, 1000, sig);
+	}
+
+	function testClaimWrapNotWarden(uint256 sk) public {
+		vm.assume( sk > 0 );
+		vm.assume( sk < 115792089237316195423570985008687907852837564279074904382605163141518161494337 );
+		vm.assume( sk != warden_sk && sk != admin_sk );
+		bytes32 id = _transferId(keccak256("deposit tx"), 0);
+		bytes memory sig = _signWrap(sk, id, address(token), user, 100);
+
+		vm.expectRevert(abi.encodeWithSelector(Destination.NotWarden.selector, vm.addr(sk)));
+		destination.claimWrap(id, address(token), user, 100, sig);
+	}
+
+	function testWrapAttestationNotValidOnSource() public {
+		// Same fields signed for the wrong contract don't verify
+		bytes32 id = _transferId(keccak256("unwrap tx"), 0);
+		bytes memory sig = _signWrap(warden_sk, id, address(token), user, 100);
+
+		vm.expectRevert();
+		source.claimWithdraw(id, address(token), user, 100, sig);
+	}
+
+	function testClaimWithdraw(address recipient, uint256 amount) public {
+		vm.assume( recipient != address(0) );
+		vm.assume( recipient != address(source) );
+		vm.assume( amount > 0 );
+		vm.assume( amount <= 1e21 );
+		bytes32 id = _transferId(keccak256("unwrap tx"), 1);
+		bytes memory sig = _signWithdraw(warden_sk, id, address(token), recipient, amount);
+		uint256 previous_balance = token.balanceOf(recipient);
+
+		vm.expectEmit(true,true,false,true);
+		emit Withdrawal(address(token), recipient, amount);
+		vm.prank(recipient);
+		source.claimWithdraw(id, address(token), recipient, amount, sig);
+
+		assertEq( token.balanceOf(recipient), previous_balance + amount );
+
+		vm.expectRevert(abi.encodeWithSelector(Source.AlreadyClaimed.selector, id));
+		source.claimWithdraw(id, address(token), recipient, amount, sig);
+	}
+
+	function testWrapThenClaimWrap() public {
+		// A Deposit the relayer already wrapped can't be claimed again from an attestation
+		bytes32 id = _transferId(keccak256("deposit tx"), 2);
+		vm.prank(warden);
+		destination.wrap(id, address(token), user, 100);
+		assertTrue( destination.claimed(id) );
+
+		bytes memory sig = _signWrap(warden_sk, id, address(token), user, 100);
+		vm.expectRevert(abi.encodeWithSelector(Destination.AlreadyClaimed.selector, id));
+		destination.claimWrap(id, address(token), user, 100, sig);
+		assertEq( ERC20(wtoken).balanceOf(user), 100 );
+	}
+
+	function testClaimWrapThenWrap() public {
+		bytes32 id = _transferId(keccak256("deposit tx"), 2);
+		bytes memory sig = _signWrap(warden_sk, id, address(token), user, 100);
+		destination.claimWrap(id, address(token), user, 100, sig);
+
+		vm.prank(warden);
+		vm.expectRevert(abi.encodeWithSelector(Destination.AlreadyClaimed.selector, id));
+		destination.wrap(id, address(token), user, 100);
+		assertEq( ERC20(wtoken).balanceOf(user), 100 );
+	}
+
+	function testWrapReplay() public {
+		bytes32 id = _transferId(keccak256("deposit tx"), 2);
+		vm.startPrank(warden);
+		destination.wrap(id, address(token), user, 100);
+		vm.expectRevert(abi.encodeWithSelector(Destination.AlreadyClaimed.selector, id));
+		destination.wrap(id, address(token), user, 100);
+		vm.stopPrank();
+	}
+
+	function testWithdrawThenClaimWithdraw() public {
+		bytes32 id = _transferId(keccak256("unwrap tx"), 4);
+		uint256 previous_balance = token.balanceOf(user);
+		vm.prank(warden);
+		source.withdraw(id, address(token), user, 100);
+		assertTrue( source.claimed(id) );
+
+		bytes memory sig = _signWithdraw(warden_sk, id, address(token), user, 100);
+		vm.expectRevert(abi.encodeWithSelector(Source.AlreadyClaimed.selector, id));
+		source.claimWithdraw(id, address(token), user, 100, sig);
+		assertEq( token.balanceOf(user), previous_balance + 100 );
+	}
+
+	function testClaimWithdrawThenWithdraw() public {
+		bytes32 id = _transferId(keccak256("unwrap tx"), 4);
+		bytes memory sig = _signWithdraw(warden_sk, id, address(token), user, 100);
+		source.claimWithdraw(id, address(token), user, 100, sig);
+
+		vm.prank(warden);
+		vm.expectRevert(abi.encodeWithSelector(Source.AlreadyClaimed.selector, id));
+		source.withdraw(id, address(token), user, 100);
+	}
+}
@@ -0,0 +1,164 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.17;
+
+import "forge-std/Test.sol";
+import "../src/Destination.sol";
+
+/*
+   Destination with the pre-clone createToken, which deployed a full BridgeToken per asset
+*/
+contract LegacyDestination is Destination {
+	constructor( address admin ) Destination(admin) {}
+
+	function createTokenLegacy(address _underlying_token, string memory name, string memory symbol ) public onlyRole(CREATOR_ROLE) returns(address) {
+		BridgeToken token = new BridgeToken(_underlying_token,name,symbol,address(this));
+		underlying_tokens[address(token)] = _underlying_token;
+		wrapped_tokens[_underlying_token] = address(token);
+		tokens.push(address(token));
+		emit Creation( _underlying_token, address(token) );
+		return address(token);
+	}
+}
+
+contract CreateTokenTest is Test {
+    LegacyDestination public destination;
+
+	uint256 admin_sk = uint256(keccak256(abi.encodePacked("admin")));
+	address admin = vm.addr(admin_sk);
+
+    function setUp() public {
+		destination = new LegacyDestination(admin);
+    }
+
+	function testCloneGasVsFullDeployment() public {
+		vm.startPrank(admin);
+		uint256 start = gasleft();
+		destination.createTokenLegacy(address(0xA11CE),"wAlice","wALC");
+		uint256 legacy_gas = start - gasleft();
+
+		start = gasleft();
+		destination.createToken(address(0xB0B),"wBob","wBOB");
+		uint256 clone_gas = start - gasleft();
+		vm.stopPrank();
+
+		emit log_named_uint("createToken gas, full BridgeToken deployment", legacy_gas);
+		emit log_named_uint("createToken gas, EIP-1167 clone", clone_gas);
+		assertLt( clone_gas, legacy_gas );
+	}
+
+	function testPredictWrappedToken(address underlying) public {
+		vm.assume( underlying != address(0) );
+		address predicted = destination.predictWrappedToken(underlying);
+
+		vm.prank(admin);
+		address wtoken = destination.createToken(underlying,"wToken","wTKN");
+
+		assertEq( wtoken, predicted );
+		assertEq( destination.wrapped_tokens(underlying), predicted );
+	}
+
+	function testCloneMetadataAndRoles() public {
+		vm.prank(admin);
+		address wtoken = destination.createToken(address(0xB0B),"wBob","wBOB");
+		BridgeToken token = BridgeToken(wtoken);
+
+		assertEq( token.name(), "wBob" );
+		assertEq( token.symbol(), "wBOB" );
+		assertEq( token.underlying(), address(0xB0B) );
+		assertTrue( token.hasRole(token.MINTER_ROLE(), address(destination)) );
+		assertTrue( token.hasRole(token.DEFAULT_ADMIN_ROLE(), address(destination)) );
+	}
+
+	function testCloneCannotBeReinitialized(address attacker) public {
+		vm.prank(admin);
+		address wtoken = destination.createToken(address(0xB0B),"wBob","wBOB");
+
+		vm.prank(attacker);
+		vm.expectRevert();
+		BridgeToken(wtoken).initialize(address(0xB0B),"evil","EVIL",attacker);
+
+		vm.prank(attacker);
+		vm.expectRevert();
+		BridgeToken(destination.token_implementation()).initialize(address(0xB0B),"evil","EVIL",attacker);
+	}
+
+	function _domain( address verifyingContract ) internal view returns (bytes32) {
+		/*
+		   The EIP-712 domain a wallet computes for a wrapped token, built here rather than read from the token
+		*/
+		return keccak256(abi.encode(
+			keccak256("EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"),
+			keccak256("BridgeToken"), keccak256("1"), block.chainid, verifyingContract));
+	}
+
+	function _permitDigest( bytes32 domain, address owner, address spender, uint256 value, uint256 nonce, uint256 deadline ) internal pure returns (bytes32) {
+		bytes32 structHash = keccak256(abi.encode(
+			keccak256("Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)"),
+			owner, spender, value, nonce, deadline));
+		return keccak256(abi.encodePacked("\x19\x01", domain, structHash));
+	}
+
+	function testClonePermit() public {
+		/*
+		   A clone runs the implementation's code, so EIP712's immutables (cached separator, cached address,
+		   hashed name) are the implementation's.  The cached separator must not be used for the clone, and the
+		   one built for it must name the clone as verifyingContract.
+		*/
+		uint256 owner_sk = uint256(keccak256(abi.encodePacked("owner")));
+		address owner = vm.addr(owner_sk);
+		address spender = address(0x5EED);
+		uint256 deadline = block.timestamp + 1 hours;
+
+		address predicted = destination.predictWrappedToken(address(0xB0B));
+		vm.prank(admin);
+		BridgeToken token = BridgeToken(destination.createToken(address(0xB0B),"wBob","wBOB"));
+		assertEq( address(token), predicted );
+		assertEq( token.DOMAIN_SEPARATOR(), _domain(address(token)) );
+
+		vm.prank(address(destination));
+		token.mint(owner, 1e18);
+
+		(uint8 v, bytes32 r, bytes32 s) = vm.sign(owner_sk, _permitDigest(_domain(address(token)), owner, spender, 1e18, 0, deadline));
+		token.permit(owner, spender, 1e18, deadline, v, r, s);
+		assertEq( token.allowance(owner, spender), 1e18 );
+		assertEq( token.nonces(owner), 1 );
+
+		vm.prank(spender);
+		token.transferFrom(owner, spender, 1e18);
+		assertEq( token.balanceOf(spender), 1e18 );
+	}
+
+	function testClonePermitIsBoundToItsClone() public {
+		uint256 owner_sk = uint256(keccak256(abi.encodePacked("owner")));
+		address owner = vm.addr(owner_sk);
+		uint256 deadline = block.timestamp + 1 hours;
+
+		vm.startPrank(admin);
+		BridgeToken bob = BridgeToken(destination.createToken(address(0xB0B),"wBob","wBOB"));
+		BridgeToken alice = BridgeToken(destination.createToken(address(0xA11CE),"wAlice","wALC"));
+		vm.stopPrank();
+
+		// Signed for the implementation's domain, or another clone's: rejected
+		(uint8 v, bytes32 r, bytes32 s) = vm.sign(owner_sk, _permitDigest(_domain(destination.token_implementation()), owner, address(this), 1, 0, deadline));
+		vm.expectRevert("ERC20Permit: invalid signature");
+		bob.permit(owner, address(this), 1, deadline, v, r, s);
+
+		(v, r, s) = vm.sign(owner_sk, _permitDigest(_domain(address(alice)), owner, address(this), 1, 0, deadline));
+		vm.expectRevert("ERC20Permit: invalid signature");
+		bob.permit(owner, address(this), 1, deadline, v, r, s);
+		alice.permit(owner, address(this), 1, deadline, v, r, s);
+		assertEq( alice.allowance(owner, address(this)), 1 );
+
+		// After a fork the domain follows the chain id
+		vm.chainId(block.chainid + 1);
+		assertEq( bob.DOMAIN_SEPARATOR(), _domain(address(bob)) );
+	}
+
+	function testCannotCreateTwice() public {
+		vm.startPrank(admin);
+		destination.createToken(address(0xB0B),"wBob","wBOB");
+		vm.expectRevert();
+		destination.createToken(address(0xB0B),"wBob","wBOB");
+		vm.stopPrank();
+	}
+}
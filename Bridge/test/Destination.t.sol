@@ -79,7 +79,7 @@ contract DestinationTest is Test {
 		vm.expectEmit(true,true,true,true);
 		emit Wrap(address(underlying_token),wtoken,d_recipient,amount);
 		vm.prank(admin);
-		destination.wrap(address(underlying_token),d_recipient, amount);
+		destination.wrap(keccak256("deposit tx"),address(underlying_token),d_recipient, amount);
 		assertEq( ERC20(wtoken).balanceOf(d_recipient), previous_balance + amount );
 
 		vm.expectEmit(true,true,true,true);
@@ -98,7 +98,7 @@ contract DestinationTest is Test {
 
 		vm.prank(user);
 		vm.expectRevert();
-		destination.wrap(address(underlying_token),d_recipient, amount);
+		destination.wrap(keccak256("deposit tx"),address(underlying_token),d_recipient, amount);
     }
 
     function testUnregisteredApprovedWrap(address token_address, address d_recipient, uint256 amount) public {
@@ -111,7 +111,7 @@ contract DestinationTest is Test {
 
 		vm.prank(admin);
 		vm.expectRevert();
-		destination.wrap(token_address,d_recipient, amount);
+		destination.wrap(keccak256("deposit tx"),token_address,d_recipient, amount);
     }
 
 	function testUnwrap(address user, address recipient, uint256 amount ) public {
@@ -121,7 +121,7 @@ contract DestinationTest is Test {
 		address wtoken = testCreation();
 
 		vm.prank(admin);
-		destination.wrap(address(underlying_token),user, amount);
+		destination.wrap(keccak256("deposit tx"),address(underlying_token),user, amount);
 
 		uint256 prev_balance = ERC20(wtoken).balanceOf( user );
 
@@ -0,0 +1,124 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.17;
+
+import "forge-std/Test.sol";
+import "../src/Source.sol";
+import "../src/Destination.sol";
+import "@openzeppelin/contracts/token/ERC20/ERC20.sol";
+
+contract GToken is ERC20 {
+	constructor(string memory name, string memory symbol,uint256 supply) ERC20(name,symbol) {
+		_mint(msg.sender, supply );
+	}
+}
+
+/*
+   Gas regression suite for the calls the relayer (and users) pay for on every transfer.
+
+   Each test makes exactly one call of interest and excludes its set-up from gas metering,
+   so the test's entry in .gas-snapshot is the gas of that one call.  Rejected relays get a
+   test per reason, since they should stay cheap to reject (custom errors, no revert strings).
+   The gate is the committed snapshot, not hard-coded budgets:
+
+       forge snapshot --check --tolerance 1     # fail if any call's gas moved by more than 1%
+
+   After an intended gas change, re-run `forge snapshot` and commit .gas-snapshot with it.
+*/
+contract GasTest is Test {
+	Source public source;
+	Destination public destination;
+	ERC20 token;
+	address wtoken;
+
+	uint256 admin_sk = uint256(keccak256(abi.encodePacked("admin")));
+	address admin = vm.addr(admin_sk);
+	address user = address(0xCAFE);
+	address recipient = address(0xBEEF);
+
+	function setUp() public {
+		source = new Source(admin);
+		destination = new Destination(admin);
+
+		vm.prank(user);
+		token = new GToken('Stegosaurus','STG',1e24);
+
+		vm.startPrank(admin);
+		source.registerToken(address(token));
+		wtoken = destination.createToken(address(token),"wStegosaurus","wSTG");
+		vm.stopPrank();
+
+		vm.prank(user);
+		token.approve(address(source), type(uint256).max);
+	}
+
+	function testGasDeposit() public {
+		vm.prank(user);
+		source.deposit(address(token), recipient, 1e18);
+	}
+
+	function testGasWithdraw() public {
+		vm.pauseGasMetering();
+		vm.prank(user);
+		source.deposit(address(token), recipient, 1e18);
+		vm.resumeGasMetering();
+
+		vm.prank(admin);
+		source.withdraw(keccak256("unwrap tx"), address(token), recipient, 1e18);
+	}
+
+	function testGasWrap() public {
+		vm.prank(admin);
+		destination.wrap(keccak256("deposit tx"), address(token), recipient, 1e18);
+	}
+
+	function testGasUnwrap() public {
+		vm.pauseGasMetering();
+		vm.prank(admin);
+		destination.wrap(keccak256("deposit tx"), address(token), recipient, 1e18);
+		vm.resumeGasMetering();
+
+		vm.prank(recipient);
+		destination.unwrap(wtoken, user, 1e18);
+	}
+
+	function testGasRejectedWrapNotWarden() public {
+		vm.prank(user);
+		vm.expectRevert(abi.encodeWithSelector(Destination.NotWarden.selector, user));
+		destination.wrap(keccak256("deposit tx"), address(token), recipient, 1e18);
+	}
+
+	function testGasRejectedWrapUnregistered() public {
+		vm.prank(admin);
+		vm.expectRevert(abi.encodeWithSelector(Destination.UnregisteredToken.selector, address(0xDEAD)));
+		destination.wrap(keccak256("deposit tx"), address(0xDEAD), recipient, 1e18);
+	}
+
+	function testGasRejectedWrapZeroAmount() public {
+		vm.prank(admin);
+		vm.expectRevert(Destination.ZeroAmount.selector);
+		destination.wrap(keccak256("deposit tx"), address(token), recipient, 0);
+	}
+
+	function testGasRejectedWrapReplay() public {
+		vm.pauseGasMetering();
+		vm.prank(admin);
+		destination.wrap(keccak256("deposit tx"), address(token), recipient, 1e18);
+		vm.resumeGasMetering();
+
+		vm.prank(admin);
+		vm.expectRevert(abi.encodeWithSelector(Destination.AlreadyClaimed.selector, keccak256("deposit tx")));
+		destination.wrap(keccak256("deposit tx"), address(token), recipient, 1e18);
+	}
+
+	function testGasRejectedWithdrawNotWarden() public {
+		vm.prank(user);
+		vm.expectRevert(abi.encodeWithSelector(Source.NotWarden.selector, user));
+		source.withdraw(keccak256("unwrap tx"), address(token), recipient, 1e18);
+	}
+
+	function testGasRejectedWithdrawZeroRecipient() public {
+		vm.prank(admin);
+		vm.expectRevert(Source.ZeroRecipient.selector);
+		source.withdraw(keccak256("unwrap tx"), address(token), address(0), 1e18);
+	}
+}
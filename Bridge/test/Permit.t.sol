@@ -0,0 +1,145 @@
+// SPDX-License-Identifier: UNLICENSED
+pragma solidity ^0.8.17;
+
+import "forge-std/Test.sol";
+import "../src/Source.sol";
+import "../src/Destination.sol";
+import "../src/BridgeToken.sol";
+
+contract PermitTest is Test {
+	Source public source;
+	Destination public destination;
+	BridgeToken token;
+
+	uint256 admin_sk = uint256(keccak256(abi.encodePacked("admin")));
+	address admin = vm.addr(admin_sk);
+	uint256 user_sk = uint256(keccak256(abi.encodePacked("user")));
+	address user = vm.addr(user_sk);
+
+	bytes32 constant PERMIT_TYPEHASH = keccak256("Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)");
+
+	event Deposit( address indexed token, address indexed recipient, uint256 amount );
+
+	function setUp() public {
+		source = new Source(admin);
+		destination = new Destination(admin);
+		token = new BridgeToken(address(0),"Triceratops","TRI",address(this));
+		token.mint(user, 1e24);
+
+		vm.prank(admin);
+		source.registerToken(address(token));
+	}
+
+	function _sign( BridgeToken _token, uint256 sk, address spender, uint256 amount, uint256 deadline ) internal view returns (uint8 v, bytes32 r, bytes32 s) {
+		address owner = vm.addr(sk);
+		bytes32 structHash = keccak256(abi.encode(PERMIT_TYPEHASH, owner, spender, amount, _token.nonces(owner), deadline));
+		bytes32 digest = keccak256(abi.encodePacked("\x19\x01", _token.DOMAIN_SEPARATOR(), structHash));
+		(v, r, s) = vm.sign(sk, digest);
+	}
+
+	function testDepositWithPermit(address recipient, uint256 amount) public {
+		vm.assume( recipient != address(0) );
+		vm.assume( amount > 0 );
+		vm.assume( amount <= 1e24 );
+
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, user_sk, address(source), amount, block.timestamp + 1 hours);
+
+		vm.expectEmit(true,true,false,true);
+		emit Deposit(address(token), recipient, amount);
+		vm.prank(user);
+		source.depositWithPermit(address(token), recipient, amount, block.timestamp + 1 hours, v, r, s);
+
+		assertEq( token.balanceOf(address(source)), amount );
+		assertEq( token.allowance(user, address(source)), 0 );
+		assertEq( token.nonces(user), 1 );
+	}
+
+	function testDepositWithFrontRunPermit() public {
+		uint256 deadline = block.timestamp + 1 hours;
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, user_sk, address(source), 100, deadline);
+
+		// Someone submits the permit from the mempool first, so ours reverts inside the try
+		vm.prank(address(0xF00D));
+		token.permit(user, address(source), 100, deadline, v, r, s);
+		assertEq( token.nonces(user), 1 );
+
+		vm.expectEmit(true,true,false,true);
+		emit Deposit(address(token), user, 100);
+		vm.prank(user);
+		source.depositWithPermit(address(token), user, 100, deadline, v, r, s);
+		assertEq( token.balanceOf(address(source)), 100 );
+		assertEq( token.allowance(user, address(source)), 0 );
+		assertEq( token.nonces(user), 1 );
+	}
+
+	function testFrontRunPermitOnlyCoversItsAmount() public {
+		uint256 deadline = block.timestamp + 1 hours;
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, user_sk, address(source), 100, deadline);
+		token.permit(user, address(source), 100, deadline, v, r, s);
+
+		// The failed permit isn't an approval of the amount asked for
+		vm.prank(user);
+		vm.expectRevert("ERC20: insufficient allowance");
+		source.depositWithPermit(address(token), user, 101, deadline, v, r, s);
+	}
+
+	function testDepositWithBadSignature() public {
+		uint256 deadline = block.timestamp + 1 hours;
+		uint256 other_sk = uint256(keccak256(abi.encodePacked("other")));
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, other_sk, address(source), 100, deadline);
+
+		vm.prank(user);
+		vm.expectRevert("ERC20: insufficient allowance");
+		source.depositWithPermit(address(token), user, 100, deadline, v, r, s);
+		assertEq( token.nonces(user), 0 );
+	}
+
+	function testBadSignatureFallsBackToAnExistingApproval() public {
+		uint256 deadline = block.timestamp + 1 hours;
+		uint256 other_sk = uint256(keccak256(abi.encodePacked("other")));
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, other_sk, address(source), 100, deadline);
+
+		vm.startPrank(user);
+		token.approve(address(source), 100);
+		source.depositWithPermit(address(token), user, 100, deadline, v, r, s);
+		vm.stopPrank();
+		assertEq( token.balanceOf(address(source)), 100 );
+		assertEq( token.nonces(user), 0 );
+	}
+
+	function testDepositWithBadPermit(address caller) public {
+		vm.assume( caller != user );
+		vm.assume( caller != address(0) );
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, user_sk, address(source), 100, block.timestamp + 1 hours);
+
+		// A permit signed by `user` doesn't give `caller` an allowance
+		vm.prank(caller);
+		vm.expectRevert();
+		source.depositWithPermit(address(token), caller, 100, block.timestamp + 1 hours, v, r, s);
+	}
+
+	function testDepositWithExpiredPermit() public {
+		uint256 deadline = block.timestamp + 1 hours;
+		(uint8 v, bytes32 r, bytes32 s) = _sign(token, user_sk, address(source), 100, deadline);
+		vm.warp(deadline + 1);
+
+		vm.prank(user);
+		vm.expectRevert();
+		source.depositWithPermit(address(token), user, 100, deadline, v, r, s);
+	}
+
+	function testWrappedTokenPermit(address spender, uint256 amount) public {
+		vm.assume( spender != address(0) );
+		vm.assume( amount > 0 );
+
+		vm.prank(admin);
+		BridgeToken wtoken = BridgeToken(destination.createToken(address(token),"wTriceratops","wTRI"));
+
+		// Clones get their own domain separator even though they share the implementation's immutables
+		assertTrue( wtoken.DOMAIN_SEPARATOR() != BridgeToken(destination.token_implementation()).DOMAIN_SEPARATOR() );
+
+		(uint8 v, bytes32 r, bytes32 s) = _sign(wtoken, user_sk, spender, amount, block.timestamp + 1 hours);
+		wtoken.permit(user, spender, amount, block.timestamp + 1 hours, v, r, s);
+		assertEq( wtoken.allowance(user, spender), amount );
+	}
+}
@@ -133,7 +133,7 @@ contract SourceTest is Test {
 		vm.prank(admin);
 		vm.expectEmit(true,true,false,true);
 		emit Withdrawal( token_address, depositor, withdraw_amount );
-		source.withdraw( token_address, depositor, withdraw_amount );
+		source.withdraw( keccak256("unwrap tx"), token_address, depositor, withdraw_amount );
 
 		assertEq( withdraw_amount, token.balanceOf(depositor) - previous_balance );
 		assertEq( withdraw_amount, previous_source_balance - token.balanceOf(address(source)) );
@@ -155,7 +155,7 @@ contract SourceTest is Test {
 
 		vm.prank(withdrawer);
 		vm.expectRevert();
-		source.withdraw( token_address, depositor, withdraw_amount );
+		source.withdraw( keccak256("unwrap tx"), token_address, depositor, withdraw_amount );
 
     }
 
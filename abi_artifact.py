@@ -0,0 +1,158 @@
+import json
+import os
+from pathlib import Path
+
+
+contract_info = "contract_info.json"
+artifact_file = "abi_artifact.json"
+ARTIFACT_VERSION = 1
+
+
+def keccak(data):
+    from Crypto.Hash import keccak as _keccak  # pycryptodome, already pulled in by eth-account
+
+    return _keccak.new(digest_bits=256, data=data).digest()
+
+
+def to_checksum_address(raw):
+    """
+    EIP-55 checksum of a 20-byte address.
+    """
+    hex_addr = raw.hex()
+    digest = keccak(hex_addr.encode()).hex()
+    return "0x" + "".join(c.upper() if int(d, 16) >= 8 else c for c, d in zip(hex_addr, digest))
+
+
+def canonical_type(inp):
+    """
+    Canonical ABI type of an input, expanding tuples.
+    """
+    typ = inp["type"]
+    if typ.startswith("tuple"):
+        return "(" + ",".join(canonical_type(c) for c in inp["components"]) + ")" + typ[len("tuple"):]
+    return typ
+
+
+def build_artifact(info):
+    """
+    Precompute event topics, function selectors and input layouts for every
+    contract in contract_info.json.
+    """
+    contracts = {}
+    for name, c in info.items():
+        events = {}
+        functions = {}
+        for item in c["abi"]:
+            if item["type"] not in ("event", "function"):
+                continue
+            types = [canonical_type(i) for i in item["inputs"]]
+            signature = f"{item['name']}({','.join(types)})"
+            if item["type"] == "event":
+                events[item["name"]] = {
+                    "topic": "0x" + keccak(signature.encode()).hex(),
+                    "inputs": [[i["name"], t, i.get("indexed", False)] for i, t in zip(item["inputs"], types)],
+                }
+            else:
+                functions[item["name"]] = {
+                    "selector": "0x" + keccak(signature.encode())[:4].hex(),
+                    "inputs": types,
+                    "outputs": [canonical_type(o) for o in item.get("outputs", [])],
+                }
+        contracts[name] = {"address": c["address"], "events": events, "functions": functions}
+    return contracts
+
+
+def load_artifact(rebuild=False):
+    """
+    Return the compiled artifact, rebuilding it if contract_info.json changed.
+    """
+    src = Path(__file__).with_name(contract_info)
+    dst = Path(__file__).with_name(artifact_file)
+    stat = src.stat()
+    key = [stat.st_mtime_ns, stat.st_size]
+
+    if not rebuild and dst.exists():
+        try:
+            with dst.open("r") as f:
+                data = json.load(f)
+            if data.get("version") == ARTIFACT_VERSION and data.get("source") == key:
+                return data["contracts"]
+        except (OSError, ValueError):
+            pass
+
+    with src.open("r") as f:
+        contracts = build_artifact(json.load(f))
+    tmp = dst.with_suffix(".tmp")
+    with tmp.open("w") as f:
+        json.dump({"version": ARTIFACT_VERSION, "source": key, "contracts": contracts}, f, separators=(",", ":"))
+    os.replace(tmp, dst)
+    return contracts
+
+
+class DecodedEvent:
+    """
+    A decoded log with the attributes the relayer uses from web3's event data.
+    """
+
+    __slots__ = ("event", "args", "address", "blockNumber", "blockHash", "transactionHash", "logIndex")
+
+    def __init__(self, event, args, log):
+        self.event = event
+        self.args = args
+        self.address = log["address"]
+        self.blockNumber = int(log["blockNumber"], 16)
+        self.blockHash = log["blockHash"]
+        self.transactionHash = log["transactionHash"]
+        self.logIndex = int(log["logIndex"], 16)
+
+    def __repr__(self):
+        return (f"DecodedEvent(event={self.event!r}, args={self.args!r}, blockNumber={self.blockNumber}, "
+                f"transactionHash={self.transactionHash!r}, logIndex={self.logIndex})")
+
+
+def _decode_static(typ, word):
+    if typ == "address":
+        return to_checksum_address(word[12:])
+    if typ == "bool":
+        return word[-1] == 1
+    if typ.startswith("uint"):
+        return int.from_bytes(word, "big")
+    if typ.startswith("int"):
+        return int.from_bytes(word, "big", signed=True)
+    if typ.startswith("bytes") and typ != "bytes":
+        return word[:int(typ[5:])]
+    raise TypeError(typ)
+
+
+def _is_static(typ):
+    return typ in ("address", "bool") or (typ.startswith(("uint", "int")) and "[" not in typ) or \
+        (typ.startswith("bytes") and typ != "bytes" and "[" not in typ)
+
+
+def decode_log(name, spec, log):
+    """
+    Decode a raw eth_getLogs entry using an artifact event spec.
+    Static types are decoded inline; anything else falls back to eth_abi.
+    """
+    topics = log["topics"][1:]
+    data = bytes.fromhex(log["data"][2:])
+    args = {}
+
+    indexed = [(n, t) for n, t, ix in spec["inputs"] if ix]
+    for (n, t), topic in zip(indexed, topics):
+        # Indexed dynamic types are stored as their hash
+        args[n] = _decode_static(t, bytes.fromhex(topic[2:])) if _is_static(t) else topic
+
+    plain = [(n, t) for n, t, ix in spec["inputs"] if not ix]
+    if all(_is_static(t) for _, t in plain):
+        for i, (n, t) in enumerate(plain):
+            args[n] = _decode_static(t, data[32 * i:32 * (i + 1)])
+    else:
+        from eth_abi import decode
+
+        for (n, _), value in zip(plain, decode([t for _, t in plain], data)):
+            args[n] = value
+
+    # Keep the ABI's argument order
+    args = {n: args[n] for n, _, _ in spec["inputs"]}
+    return DecodedEvent(name, args, log)
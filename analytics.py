@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+Reports over the bridge event history, computed on NumPy columns.
+
+    python analytics.py volume [bridge_events.csv]
+    python analytics.py latency --fetch-headers
+    python analytics.py unmatched --limit 20
+    python analytics.py top --event Deposit --token 0x... --limit 10
+
+The history is a bridge_events.csv-style file (Deposit and Unwrap rows, and
+Wrap and Withdrawal rows if it has them).  It is parsed once into columns
+and cached next to it as <name>.npz, so later runs load it in one read:
+
+    kind        int8      index into KINDS
+    block       int64
+    token       int32     underlying token (address id)
+    wrapped     int32     wrapped token, -1 for Deposit/Withdrawal
+    account     int32     recipient
+    amount      uint64    (n, 4) little-endian 64-bit limbs: any uint256
+    tx          uint8     (n, 32) transaction hash
+
+Addresses are interned to ids (History.addresses[id]).  Sums over amounts
+are exact: the limbs are split into 32-bit halves, summed per group with
+np.add.reduceat and carried, so nothing goes through floats or Python ints.
+
+Relay events are matched to the transfers that caused them the way
+`loadgen.py latency` does it: by (token, recipient, amount), first-in
+first-out in block order.  Latency is the relay block's timestamp minus the
+transfer block's, from the header cache (block_headers.npz, per chain name).
+--fetch-headers fills it with eth_getBlockByNumber batches.
+
+numpy is only needed here.
+"""
+import argparse
+import binascii
+import csv
+import json
+import os
+import sys
+import warnings
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import chain_config
+from rpc_client import RPCClient
+
+header_cache = "block_headers.npz"
+header_batch = 500  # blocks per eth_getBlockByNumber batch
+
+KINDS = ("Deposit", "Unwrap", "Wrap", "Withdrawal")
+SIDES = ("source", "destination", "destination", "source")  # chain side of each kind
+RELAYS = {"Deposit": "Wrap", "Unwrap": "Withdrawal"}  # transfer -> the relay event it causes
+
+M32 = 0xFFFFFFFF
+M64 = 0xFFFFFFFFFFFFFFFF
+# match() sorts on one int64 (group id << 40 | side << 39 | block) while group
+# ids fit the 23 bits left above the sign bit and blocks fit 39 bits
+PACKED_GROUPS = 1 << 23
+PACKED_BLOCKS = 1 << 39
+
+
+def _limbs(values):
+    """
+    Python ints -> (n, 4) uint64 limbs, least significant first.
+    """
+    out = np.empty((len(values), 4), dtype=np.uint64)
+    for i in range(4):
+        out[:, i] = [(v >> (64 * i)) & M64 for v in values]
+    return out
+
+
+def _decimal_limbs(values):
+    """
+    Decimal strings of uint256 values -> (n, 4) uint64 limbs, as _limbs, with
+    no Python ints: 9-digit groups are multiplied into eight 32-bit limbs
+    (each below 2**62 before its carry), most significant group first.
+    """
+    if not len(values):
+        return np.zeros((0, 4), dtype=np.uint64)
+    width = -(-int(np.char.str_len(values).max()) // 9)  # groups in the longest value
+    digits = np.frombuffer(np.char.zfill(values.astype(f"S{9 * width}"), 9 * width).tobytes(), dtype=np.uint8)
+    digits = digits.reshape(len(values), width, 9) - ord("0")
+    groups = np.zeros((len(values), width), dtype=np.uint64)
+    for d in range(9):
+        groups = groups * np.uint64(10) + digits[:, :, d]
+    halves = np.zeros((len(values), 8), dtype=np.uint64)
+    for g in range(width):
+        carry = groups[:, g]
+        for i in range(min(8, g + 1)):  # 9 * (g + 1) digits fit in g + 1 halves
+            v = halves[:, i] * np.uint64(10 ** 9) + carry
+            halves[:, i] = v & np.uint64(M32)
+            carry = v >> np.uint64(32)
+    return halves[:, 0::2] | halves[:, 1::2] << np.uint64(32)
+
+
+def _as_int(limbs):
+    """
+    One row of limbs (4 x 64 bit, or 8 x 32 bit as returned by _sum_by) -> int.
+    """
+    width = 64 if len(limbs) == 4 else 32
+    return sum(int(v) << (width * i) for i, v in enumerate(limbs))
+
+
+def _sum_by(amount, order, starts):
+    """
+    Exact per-group sums of `amount` rows.  `order` sorts the rows by group
+    and `starts` are the group boundaries in that order.  Returns (groups, 8)
+    uint64 32-bit limbs, carried (the top limb may exceed 32 bits).
+    """
+    out = np.empty((len(starts), 8), dtype=np.uint64)
+    if not len(starts):
+        return out
+    rows = amount[order]
+    for i in range(4):
+        out[:, 2 * i] = np.add.reduceat(rows[:, i] & np.uint64(M32), starts)
+        out[:, 2 * i + 1] = np.add.reduceat(rows[:, i] >> np.uint64(32), starts)
+    for i in range(7):
+        out[:, i + 1] += out[:, i] >> np.uint64(32)
+        out[:, i] &= np.uint64(M32)
+    return out
+
+
+def _groups(*keys):
+    """
+    Rows grouped by the key columns (the last key is the primary sort key, as
+    in np.lexsort).  Returns (order, starts): the rows sorted by group, and
+    the index in `order` where each group starts.
+    """
+    order = np.lexsort(keys)
+    if not len(order):
+        return order, np.zeros(0, dtype=np.int64)
+    new = np.zeros(len(order), dtype=bool)
+    new[0] = True
+    for key in keys:
+        k = key[order]
+        new[1:] |= k[1:] != k[:-1]
+    return order, np.flatnonzero(new)
+
+
+def _key_ids(keys):
+    """
+    Dense id per distinct row of the key columns.  Rows are grouped by a
+    64-bit hash of the key (one unstable sort instead of a stable sort per
+    column); if two keys share a hash, the exact np.lexsort grouping is
+    used instead.
+    """
+    n = len(keys[0])
+    h = np.zeros(n, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for key in keys:
+            h ^= key.astype(np.uint64)
+            h ^= h >> np.uint64(33)
+            h *= np.uint64(0xFF51AFD7ED558CCD)
+            h ^= h >> np.uint64(33)
+            h *= np.uint64(0xC4CEB9FE1A85EC53)
+            h ^= h >> np.uint64(33)
+    order = np.argsort(h)
+    new = np.ones(n, dtype=bool)
+    new[1:] = h[order][1:] != h[order][:-1]
+    ids = np.empty(n, dtype=np.int64)
+    ids[order] = np.cumsum(new) - 1
+    first = order[new]
+    if all((key == key[first][ids]).all() for key in keys):
+        return ids
+    order, starts = _groups(*keys)
+    new = np.zeros(n, dtype=bool)
+    new[starts] = True
+    ids[order] = np.cumsum(new) - 1
+    return ids
+
+
+class History:
+    """
+    The event history as columns, one row per event.
+    """
+
+    def __init__(self, kind, block, token, wrapped, account, amount, tx, addresses):
+        self.kind = kind
+        self.block = block
+        self.token = token
+        self.wrapped = wrapped
+        self.account = account
+        self.amount = amount
+        self.tx = tx
+        self.addresses = addresses
+        self._ids = None
+
+    def __len__(self):
+        return len(self.kind)
+
+    def address(self, i):
+        return self.addresses[i] if i >= 0 else None
+
+    def id_of(self, address):
+        if self._ids is None:
+            self._ids = {a: i for i, a in enumerate(self.addresses)}
+        return self._ids.get(address.lower(), -1)
+
+    def tx_hash(self, row):
+        return "0x" + self.tx[row].tobytes().hex()
+
+    def timestamps(self, headers, chains):
+        """
+        Block timestamp of every row (-1 where the header cache doesn't have
+        it).  `chains` maps "source"/"destination" to chain names.
+        """
+        out = np.full(len(self), -1, dtype=np.int64)
+        for side in ("source", "destination"):
+            rows = np.flatnonzero(np.isin(self.kind, [k for k, s in enumerate(SIDES) if s == side]))
+            out[rows] = headers.timestamps(chains[side], self.block[rows])
+        return out
+
+    def save(self, path):
+        np.savez(path, kind=self.kind, block=self.block, token=self.token, wrapped=self.wrapped,
+                 account=self.account, amount=self.amount, tx=self.tx,
+                 addresses=np.array(self.addresses, dtype="U42"))
+
+    @classmethod
+    def from_npz(cls, path):
+        with np.load(path) as data:
+            return cls(data["kind"], data["block"], data["token"], data["wrapped"], data["account"],
+                       data["amount"], data["tx"], data["addresses"].tolist())
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Parse the CSV with one np.loadtxt call into byte-string columns and
+        work on whole columns from there: addresses are interned with
+        np.unique, hashes hex-decoded in one call and amounts split into
+        limbs by _decimal_limbs.
+        """
+        with open(path, newline="") as f:
+            names = next(csv.reader(f))
+            widths = {"event": "S16", "block_number": np.int64, "amount": "S78", "transactionHash": "S66"}
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # a header with no events
+                rows = np.loadtxt(f, dtype=[(name, widths.get(name, "S42")) for name in names], delimiter=",",
+                                  quotechar='"', comments=None, ndmin=1)
+
+        kind = np.full(len(rows), -1, dtype=np.int8)
+        for k, name in enumerate(KINDS):
+            kind[rows["event"] == name.encode()] = k
+        keep = np.flatnonzero(kind >= 0)
+        kind = kind[keep]
+
+        def column(name):
+            return rows[name][keep]
+
+        # Deposit/Withdrawal rows have token and recipient; Unwrap/Wrap rows underlying/wrapped token and "to"
+        transfer = np.isin(kind, [KINDS.index("Deposit"), KINDS.index("Withdrawal")])
+        token = np.where(transfer, column("token"), column("underlying_token"))
+        wrapped = np.where(transfer, b"", column("wrapped_token"))
+        account = np.where(transfer, column("recipient"), column("to"))
+        spelled, ids = np.unique(np.concatenate([token, wrapped, account]).view("V42"), return_inverse=True)
+        addresses, lowered = np.unique(np.char.lower(spelled.view("S42")), return_inverse=True)
+        ids = lowered[ids].astype(np.int32)
+        if len(addresses) and addresses[0] == b"":  # sorts first: no address
+            addresses, ids = addresses[1:], ids - 1
+        n = len(keep)
+
+        tx = column("transactionHash")
+        digits = np.frombuffer(tx.tobytes(), dtype=np.uint8).reshape(n, 66)[:, 2:].copy()
+        digits[np.char.str_len(tx) != 66] = ord("0")  # no hash: all zeros
+        hashes = np.frombuffer(binascii.unhexlify(digits.tobytes()), dtype=np.uint8).reshape(n, 32)
+        return cls(kind, column("block_number"), ids[:n], ids[n:2 * n], ids[2 * n:], _decimal_limbs(column("amount")),
+                   hashes, np.char.decode(addresses, "ascii").tolist())
+
+
+def load(path, cache=True):
+    """
+    History from a CSV (through its .npz column cache when that is newer) or
+    from an .npz written by History.save.
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        return History.from_npz(path)
+    cached = path.with_suffix(".npz")
+    if cache and cached.exists() and cached.stat().st_mtime >= path.stat().st_mtime:
+        return History.from_npz(cached)
+    history = History.from_csv(path)
+    if cache:
+        history.save(cached)
+    return history
+
+
+class HeaderCache:
+    """
+    Block timestamps per chain name: sorted block numbers and their
+    timestamps, joined to event rows with np.searchsorted.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path or Path(__file__).with_name(header_cache))
+        self.chains = {}  # chain -> (blocks, timestamps)
+        if self.path.exists():
+            with np.load(self.path) as data:
+                for name in data.files:
+                    if name.endswith(".blocks"):
+                        chain = name[:-len(".blocks")]
+                        self.chains[chain] = (data[name], data[chain + ".timestamps"])
+
+    def _cached(self, chain):
+        return self.chains.get(chain, (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)))
+
+    def timestamps(self, chain, blocks):
+        cached, times = self._cached(chain)
+        if not len(cached):
+            return np.full(len(blocks), -1, dtype=np.int64)
+        i = np.minimum(np.searchsorted(cached, blocks), len(cached) - 1)
+        return np.where(cached[i] == blocks, times[i], -1)
+
+    def missing(self, chain, blocks):
+        return np.setdiff1d(np.unique(blocks), self._cached(chain)[0])
+
+    def add(self, chain, blocks, times):
+        cached, cached_times = self._cached(chain)
+        blocks = np.concatenate([cached, np.asarray(blocks, dtype=np.int64)])
+        times = np.concatenate([cached_times, np.asarray(times, dtype=np.int64)])
+        blocks, first = np.unique(blocks, return_index=True)
+        self.chains[chain] = (blocks, times[first])
+
+    def fetch(self, chain, client, blocks):
+        """
+        Fetch the headers of `blocks` that aren't cached yet.  Returns how many
+        were fetched.
+        """
+        missing = self.missing(chain, blocks)
+        for lo in range(0, len(missing), header_batch):
+            chunk = missing[lo:lo + header_batch]
+            headers = client.batch("eth_getBlockByNumber", [[hex(int(n)), False] for n in chunk])
+            self.add(chain, [int(h["number"], 16) for h in headers], [int(h["timestamp"], 16) for h in headers])
+        return len(missing)
+
+    def save(self):
+        arrays = {}
+        for chain, (blocks, times) in self.chains.items():
+            arrays[chain + ".blocks"] = blocks
+            arrays[chain + ".timestamps"] = times
+        tmp = self.path.with_suffix(".tmp.npz")
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.path)
+
+
+# Reports
+
+def volume(history):
+    """
+    Per token and event: number of events and exact total amount.
+    """
+    order, starts = _groups(history.kind, history.token)
+    sums = _sum_by(history.amount, order, starts)
+    counts = np.diff(np.append(starts, len(order)))
+    rows = order[starts]
+    return [{"token": history.address(history.token[r]), "event": KINDS[history.kind[r]],
+             "events": int(n), "amount": _as_int(total)}
+            for r, n, total in zip(rows, counts, sums)]
+
+
+def match(history, event):
+    """
+    Pair each `event` transfer (Deposit or Unwrap) with the relay event it
+    caused.  Returns (transfers, relays, unmatched transfers, unmatched relays)
+    as row indexes; transfers[i] was relayed by relays[i].
+    """
+    src, dst = KINDS.index(event), KINDS.index(RELAYS[event])
+    rows = np.flatnonzero((history.kind == src) | (history.kind == dst))
+    is_relay = (history.kind[rows] == dst).astype(np.int64)
+    amount = history.amount[rows]
+    holder = history.token[rows].astype(np.int64) << 32 | (history.account[rows].astype(np.int64) & M32)
+    keys = tuple(amount[:, i] for i in range(4) if amount[:, i].any()) + (holder,)
+    # Within each (token, recipient, amount) group, number the transfers and
+    # the relays separately in block order; the k-th transfer matches the k-th relay
+    ids = _key_ids(keys)
+    block = history.block[rows].astype(np.int64)
+    if len(rows) and (ids.max() >= PACKED_GROUPS or block.max() >= PACKED_BLOCKS):
+        order = np.lexsort((block, is_relay, ids))
+    else:
+        order = np.argsort(ids << 40 | is_relay << 39 | block)
+    gid = ids[order]
+    side = is_relay[order]
+    run = np.ones(len(order), dtype=bool)
+    run[1:] = (gid[1:] != gid[:-1]) | (side[1:] != side[:-1])
+    position = np.arange(len(order))
+    rank = position - np.maximum.accumulate(np.where(run, position, 0))
+    # Transfers sort before relays within a group, so the matched ones of each
+    # side come out in the same (group, rank) order and pair up elementwise
+    sent = np.bincount(gid[side == 0], minlength=len(rows))
+    relayed = np.bincount(gid[side == 1], minlength=len(sent))
+    matched = np.where(side == 0, rank < relayed[gid], rank < sent[gid])
+    transfers, relays = rows[order[matched & (side == 0)]], rows[order[matched & (side == 1)]]
+    unmatched, orphans = rows[order[~matched & (side == 0)]], rows[order[~matched & (side == 1)]]
+    return transfers, relays, unmatched, orphans
+
+
+def latency(history, event, times):
+    """
+    Transfer -> relay latency (s) per token and overall, from the block
+    timestamps `times` (History.timestamps).  Pairs missing a timestamp are
+    counted, not measured.
+    """
+    transfers, relays, unmatched, _ = match(history, event)
+    known = (times[transfers] >= 0) & (times[relays] >= 0)
+    delay = times[relays[known]] - times[transfers[known]]
+    tokens = history.token[transfers[known]]
+
+    def dist(values):
+        if not len(values):
+            return {"relayed": 0}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {"relayed": int(len(values)), "mean": float(values.mean()), "p50": float(p50), "p90": float(p90),
+                "p99": float(p99), "max": int(values.max())}
+
+    out = {"event": event, "relay": RELAYS[event], "matched": int(len(transfers)),
+           "no_timestamp": int((~known).sum()), "unmatched": int(len(unmatched)), "all": dist(delay), "tokens": {}}
+    for token in np.unique(tokens):
+        out["tokens"][history.address(token)] = dist(delay[tokens == token])
+    return out
+
+
+def unmatched(history, event, limit=20):
+    """
+    Transfers with no relay event in the history, oldest first, and the
+    number of relay events with no transfer (e.g. the history starts after it).
+    """
+    _, _, pending, orphans = match(history, event)
+    pending = pending[np.argsort(history.block[pending], kind="stable")]
+    rows = [{"event": event, "tx": history.tx_hash(r), "block": int(history.block[r]),
+             "token": history.address(history.token[r]), "recipient": history.address(history.account[r]),
+             "amount": _as_int(history.amount[r])} for r in pending[:limit]]
+    return {"event": event, "unmatched": int(len(pending)), "orphan_relays": int(len(orphans)), "oldest": rows}
+
+
+def top_recipients(history, event="Deposit", token=None, limit=10):
+    """
+    Recipients of `event` ranked by exact total amount, per token (amounts of
+    different tokens aren't comparable).
+    """
+    rows = np.flatnonzero(history.kind == KINDS.index(event))
+    if token is not None:
+        rows = rows[history.token[rows] == history.id_of(token)]
+    order, starts = _groups(history.account[rows], history.token[rows])
+    sums = _sum_by(history.amount[rows], order, starts)
+    counts = np.diff(np.append(starts, len(order)))
+    first = rows[order[starts]]
+    tokens = history.token[first]
+    out = {}
+    for t in np.unique(tokens):
+        mine = np.flatnonzero(tokens == t)
+        ranked = mine[np.lexsort(tuple(sums[mine, i] for i in range(8)))[::-1][:limit]]
+        out[history.address(t)] = [{"recipient": history.address(history.account[first[g]]),
+                                    "events": int(counts[g]), "amount": _as_int(sums[g])} for g in ranked]
+    return out
+
+
+# Command line
+
+def _chains(route):
+    route = chain_config.get_route(route)
+    return {"source": route.source, "destination": route.destination}
+
+
+def _headers(args, history):
+    headers = HeaderCache(args.headers)
+    chains = _chains(args.route)
+    if args.fetch_headers:
+        for side, chain in chains.items():
+            rows = np.isin(history.kind, [k for k, s in enumerate(SIDES) if s == side])
+            client = RPCClient(chain_config.rpc_url(chain))
+            fetched = headers.fetch(chain, client, history.block[rows])
+            client.close()
+            if fetched:
+                print(f"fetched {fetched} {chain} headers", file=sys.stderr)
+        headers.save()
+    return headers, chains
+
+
+def cmd_volume(args, history):
+    report = volume(history)
+    if args.json:
+        print(json.dumps(report, default=str, indent=1))
+        return
+    for r in report:
+        print(f"{r['token']}  {r['event']:<10} {r['events']:>10} events  {r['amount']}")
+
+
+def cmd_latency(args, history):
+    headers, chains = _headers(args, history)
+    times = history.timestamps(headers, chains)
+    report = [latency(history, event, times) for event in RELAYS]
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+    for r in report:
+        print(f"{r['event']} -> {r['relay']}: {r['matched']} matched, {r['unmatched']} not relayed, "
+              f"{r['no_timestamp']} without a cached timestamp")
+        for name, d in [("all", r["all"])] + sorted(r["tokens"].items()):
+            if d["relayed"]:
+                print(f"  {name:<42} n={d['relayed']:<8} p50 {d['p50']:.0f}s p90 {d['p90']:.0f}s "
+                      f"p99 {d['p99']:.0f}s max {d['max']}s")
+
+
+def cmd_unmatched(args, history):
+    report = [unmatched(history, event, args.limit) for event in RELAYS]
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+    for r in report:
+        print(f"{r['event']}: {r['unmatched']} not relayed, {r['orphan_relays']} {RELAYS[r['event']]} events "
+              f"with no {r['event']} in the history")
+        for row in r["oldest"]:
+            print(f"  {row['tx']} block {row['block']} {row['token']} -> {row['recipient']} {row['amount']}")
+
+
+def cmd_top(args, history):
+    report = top_recipients(history, args.event, args.token, args.limit)
+    if args.json:
+        print(json.dumps(report, indent=1))
+        return
+    for token, rows in report.items():
+        print(f"{token} ({args.event})")
+        for row in rows:
+            print(f"  {row['recipient']} {row['events']:>8} events  {row['amount']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bridge event history analytics")
+    parser.add_argument("--no-cache", action="store_true", help="don't read or write the .npz column cache")
+    parser.add_argument("--json", action="store_true")
+    sub = parser.add_subparsers(dest="command", required=True)
+    default_history = str(Path(__file__).with_name("bridge_events.csv"))
+
+    p = sub.add_parser("volume", help="events and total amount per token and event")
+    p.set_defaults(func=cmd_volume)
+
+    p = sub.add_parser("latency", help="transfer -> relay latency distributions")
+    p.add_argument("--headers", help=f"header cache (default: {header_cache})")
+    p.add_argument("--fetch-headers", action="store_true", help="fetch uncached block headers over RPC")
+    p.add_argument("--route", help="route whose chains the history is from (default: the first)")
+    p.set_defaults(func=cmd_latency)
+
+    p = sub.add_parser("unmatched", help="transfers with no relay event")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=cmd_unmatched)
+
+    p = sub.add_parser("top", help="top recipients by amount, per token")
+    p.add_argument("--event", choices=KINDS, default="Deposit")
+    p.add_argument("--token")
+    p.add_argument("--limit", type=int, default=10)
+    p.set_defaults(func=cmd_top)
+
+    for p in sub.choices.values():
+        p.add_argument("history", nargs="?", default=default_history, help="bridge_events.csv-style file or .npz")
+
+    args = parser.parse_args(argv)
+    if np is None:
+        sys.exit("analytics needs numpy (pip install numpy)")
+    args.func(args, load(args.history, cache=not args.no_cache))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Claim-mode settlement: signed attestations instead of relay transactions.
+
+In claim mode the relayer doesn't send wrap()/withdraw() for a Deposit/Unwrap.
+It signs an EIP-712 attestation of the transfer with the warden key, and the
+recipient (or anyone) submits it to Destination.claimWrap /
+Source.claimWithdraw.  The contracts check that a warden signed it and
+remember the transfer id, so each transfer can be claimed at most once.
+
+Signing is CPU-only, so it can be batched across a process pool (see
+signer.py).  Attestations are appended to attestations.jsonl, and serve()
+makes them available over HTTP:
+
+    GET /attestations/<transferId>
+    GET /attestations?recipient=0x...
+
+A transfer is settled in only one mode: wrap()/withdraw() take the same
+transfer id and the contracts reject an id that was already settled either
+way.  The attesting scanner also skips transfers the transfer index shows a
+relay was sent for, so it doesn't hand out attestations that can't be claimed.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import bridge_log
+import profiler
+import signer
+from abi_artifact import keccak
+from sharding import transfer_id
+
+
+attestation_file = "attestations.jsonl"
+log = bridge_log.get_logger("attestations")
+
+WRAP_TYPEHASH = keccak(b"Wrap(bytes32 transferId,address underlying_token,address recipient,uint256 amount)")
+WITHDRAW_TYPEHASH = keccak(b"Withdraw(bytes32 transferId,address token,address recipient,uint256 amount)")
+
+
+def word(value):
+    """
+    One 32-byte abi.encode word for a bytes32, address or uint256 value.
+    """
+    if isinstance(value, bytes):
+        return value.rjust(32, b"\x00")
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:]).rjust(32, b"\x00")
+    return value.to_bytes(32, "big")
+
+
+def tx_hash_of(evt):
+    tx_hash = evt.transactionHash if isinstance(evt.transactionHash, str) else evt.transactionHash.hex()
+    return tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+
+
+def claim_for(chain, evt):
+    """
+    (contract that settles the transfer, claim function, typehash, ordered claim args)
+    for an event seen on `chain`.
+    """
+    if chain == "source":
+        return "destination", "claimWrap", WRAP_TYPEHASH, [
+            ("underlying_token", evt.args["token"]),
+            ("recipient", evt.args["recipient"]),
+            ("amount", evt.args["amount"]),
+        ]
+    return "source", "claimWithdraw", WITHDRAW_TYPEHASH, [
+        ("token", evt.args["underlying_token"]),
+        ("recipient", evt.args["to"]),
+        ("amount", evt.args["amount"]),
+    ]
+
+
+def get_domain_separator(client, contract):
+    """
+    Read DOMAIN_SEPARATOR() from Source/Destination with a raw eth_call.
+    """
+    selector = "0x" + keccak(b"DOMAIN_SEPARATOR()")[:4].hex()
+    result = client.call("eth_call", [{"to": contract, "data": selector}, "latest"])
+    return bytes.fromhex(result[2:])
+
+
+class AttestationStore:
+    """
+    Append-only attestations.jsonl, indexed by transfer id and recipient.
+    refresh() picks up lines appended by another process (e.g. when the HTTP
+    server runs separately from the scanner).
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else Path(__file__).with_name(attestation_file)
+        self.lock = threading.Lock()
+        self.by_id = {}
+        self.by_recipient = {}
+        self.offset = 0
+        self.refresh()
+
+    def _index(self, record):
+        if record["transferId"] in self.by_id:
+            return False
+        self.by_id[record["transferId"]] = record
+        self.by_recipient.setdefault(record["args"]["recipient"].lower(), []).append(record)
+        return True
+
+    def refresh(self):
+        with self.lock:
+            if not self.path.exists():
+                return
+            with self.path.open("r") as f:
+                f.seek(self.offset)
+                for line in f:
+                    if not line.endswith("\n"):  # partially written, read it next time
+                        break
+                    self.offset += len(line.encode())
+                    self._index(json.loads(line))
+
+    def add(self, records):
+        with self.lock:
+            new = [r for r in records if self._index(r)]
+            if new:
+                with self.path.open("a") as f:
+                    f.write("".join(json.dumps(r) + "\n" for r in new))
+                    self.offset = f.tell()
+        return len(new)
+
+    def get(self, tid):
+        self.refresh()
+        return self.by_id.get(tid)
+
+    def for_recipient(self, address):
+        self.refresh()
+        return list(self.by_recipient.get(address.lower(), []))
+
+
+class Attestor:
+    """
+    Signs claim attestations for batches of Deposit/Unwrap events.
+
+    domain_separators maps "source"/"destination" to that contract's
+    DOMAIN_SEPARATOR().  With workers > 0 each batch is split across a
+    process pool; with workers=0 it is signed inline.
+    """
+
+    def __init__(self, private_key, contracts, domain_separators, store=None, workers=0):
+        self.account = signer.load_account(private_key)
+        self.contracts = contracts
+        self.domain_separators = domain_separators
+        self.store = store or AttestationStore()
+        self.workers = workers
+        self.pool = None
+        if workers:
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=signer._init_worker,
+                                            initargs=([private_key],))
+
+    def _sign(self, items):
+        if not self.pool:
+            return [signer.sign_typed(self.account, domain, struct_hash) for _, domain, struct_hash in items]
+        size = max(1, -(-len(items) // self.workers))
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        out = []
+        for result in [self.pool.submit(signer._sign_typed_batch, chunk) for chunk in chunks]:
+            out.extend(result.result())
+        return out
+
+    def attest(self, chain, events):
+        """
+        Sign and store attestations for events seen on `chain`.  Returns the
+        new records (events that were already attested are skipped).
+        """
+        pending = []
+        for evt in events:
+            tid = transfer_id(evt)
+            if "0x" + tid.hex() in self.store.by_id:
+                continue
+            target, function, typehash, args = claim_for(chain, evt)
+            struct_hash = keccak(word(typehash) + word(tid) + b"".join(word(v) for _, v in args))
+            pending.append((evt, tid, target, function, args, struct_hash))
+        if not pending:
+            return []
+
+        with profiler.stage("sign", chain):
+            signatures = self._sign([(self.account.address, self.domain_separators[p[2]], p[5]) for p in pending])
+        records = []
+        for (evt, tid, target, function, args, _), signature in zip(pending, signatures):
+            records.append({
+                "transferId": "0x" + tid.hex(),
+                "chain": chain,
+                "transactionHash": tx_hash_of(evt),
+                "logIndex": evt.logIndex,
+                "contract": self.contracts[target]["address"],
+                "function": function,
+                "args": dict(args),
+                "signature": "0x" + signature.hex(),
+                "signer": self.account.address,
+                "time": time.time(),
+            })
+        self.store.add(records)
+        log.info("signed %s %s attestations", len(records), records[0]["function"],
+                 extra=bridge_log.fields(chain=chain, stage="attest"))
+        return records
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+
+
+def serve(store, port=8547, host="127.0.0.1"):
+    """
+    Serve attestations over HTTP in a background thread.  Returns the server.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body):
+            out = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            if parts[0] != "attestations":
+                return self._reply(404, {"error": "not found"})
+            if len(parts) == 2:
+                record = store.get(parts[1].lower())
+                return self._reply(200, record) if record else self._reply(404, {"error": "unknown transfer"})
+            recipient = parse_qs(url.query).get("recipient")
+            if not recipient:
+                return self._reply(400, {"error": "pass a transfer id or ?recipient="})
+            return self._reply(200, store.for_recipient(recipient[0]))
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving attestations on http://{host}:{server.server_port}/attestations")
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve claim attestations from attestations.jsonl")
+    parser.add_argument("--port", type=int, default=8547)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--file", help=f"attestation file (default {attestation_file})")
+    args = parser.parse_args()
+    serve(AttestationStore(args.file), args.port, args.host)
+    while True:
+        time.sleep(3600)
@@ -0,0 +1,151 @@
+"""
+analytics.py reports over a large synthetic event history.
+
+    python benchmarks/bench_analytics.py [--events 10000000] [--csv-events 200000]
+
+Builds --events rows of columns directly (Deposits to 100k recipients over
+20 tokens with amounts up to 1e24, 95% of them wrapped a few blocks later,
+plus Unwraps and Withdrawals), with a header cache covering both chains.
+Times the .npz column cache and each report, then parses a --csv-events row
+CSV to give the one-time import rate.  A small history is checked against
+a plain-Python version of volume and matching first.
+"""
+import argparse
+import csv
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import analytics
+from analytics import KINDS, HeaderCache, History
+
+
+def synthetic(n, seed=1):
+    """
+    History of about n rows: transfers and the relays of 95% of them.
+    """
+    rng = np.random.default_rng(seed)
+    transfers = n // 2
+    n_tokens, n_accounts = 20, 100000
+    addresses = ["0x" + f"{i:040x}" for i in range(1, n_tokens * 2 + n_accounts + 1)]
+    kind = np.where(rng.random(transfers) < 0.8, KINDS.index("Deposit"), KINDS.index("Unwrap")).astype(np.int8)
+    source_block = np.sort(rng.integers(35_000_000, 36_000_000, transfers))
+    block = np.where(kind == 0, source_block, source_block // 2 + 20_000_000)
+    token = rng.integers(0, n_tokens, transfers).astype(np.int32)
+    account = (2 * n_tokens + rng.zipf(1.3, transfers) % n_accounts).astype(np.int32)
+    amount = np.zeros((transfers, 4), dtype=np.uint64)
+    amount[:, 0] = rng.integers(0, 2 ** 63, transfers, dtype=np.uint64)
+    amount[:, 1] = rng.integers(0, 54210, transfers, dtype=np.uint64)  # < 1e24
+    relayed = np.flatnonzero(rng.random(transfers) < 0.95)
+    relay_kind = np.where(kind[relayed] == 0, KINDS.index("Wrap"), KINDS.index("Withdrawal")).astype(np.int8)
+    # Relay blocks: Wraps on the destination (half the source's block rate), Withdrawals on the source
+    lag = rng.integers(1, 40, len(relayed))
+    relay_block = np.where(relay_kind == KINDS.index("Wrap"), block[relayed] // 2 + 20_000_000 + lag,
+                           (block[relayed] - 20_000_000) * 2 + 2 * lag)
+    tx = rng.integers(0, 256, (transfers + len(relayed), 32), dtype=np.uint8)
+    wrapped = (token + n_tokens).astype(np.int32)
+    is_wrapped = np.isin(kind, [KINDS.index("Unwrap")])
+    history = History(np.concatenate([kind, relay_kind]), np.concatenate([block, relay_block]),
+                      np.concatenate([token, token[relayed]]),
+                      np.concatenate([np.where(is_wrapped, wrapped, -1), np.where(relay_kind == 2, wrapped[relayed], -1)]).astype(np.int32),
+                      np.concatenate([account, account[relayed]]), np.concatenate([amount, amount[relayed]]), tx,
+                      addresses)
+    headers = HeaderCache("/nonexistent")
+    source = np.arange(35_000_000, 36_000_100)
+    headers.add("avax", source, 1_700_000_000 + 2 * (source - 35_000_000))
+    destination = np.arange(37_500_000, 38_000_100)
+    headers.add("bsc", destination, 1_700_000_000 + 4 * (destination - 37_500_000))
+    return history, headers
+
+
+def reference(history):
+    """
+    Volume and match counts the slow way.
+    """
+    volume, counts = {}, {}
+    for r in range(len(history)):
+        k, token, account = int(history.kind[r]), int(history.token[r]), int(history.account[r])
+        amount = analytics._as_int(history.amount[r])
+        count, total = volume.get((k, token), (0, 0))
+        volume[(k, token)] = (count + 1, total + amount)
+        # a transfer and its relay share (direction, token, recipient, amount)
+        key = (KINDS[k] in ("Deposit", "Wrap"), token, account, amount)
+        sent, relayed = counts.get(key, (0, 0))
+        counts[key] = (sent + 1, relayed) if KINDS[k] in analytics.RELAYS else (sent, relayed + 1)
+    matched = sum(min(sent, relayed) for sent, relayed in counts.values())
+    return volume, matched
+
+
+def check(seed=7):
+    history, _ = synthetic(20000, seed)
+    volume, matched = reference(history)
+    got = {(KINDS.index(r["event"]), history.id_of(r["token"])): (r["events"], r["amount"])
+           for r in analytics.volume(history)}
+    assert got == volume, "volume differs from the reference"
+    pairs = 0
+    for event in analytics.RELAYS:
+        transfers, relays, _, _ = analytics.match(history, event)
+        for column in (history.token, history.account, history.amount):
+            assert (column[transfers] == column[relays]).all(), "a pair doesn't share its key"
+        pairs += len(transfers)
+    assert pairs == matched, f"matched {pairs}, reference {matched}"
+    print(f"check: volume and {matched} matches agree with the reference")
+
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    print(f"  {label:<34} {time.perf_counter() - start:7.2f}s")
+    return out
+
+
+def write_csv(history, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["event", "block_number", "token", "recipient", "amount", "transactionHash", "address",
+                         "underlying_token", "wrapped_token", "to", "from"])
+        for r in range(len(history)):
+            event = KINDS[history.kind[r]]
+            token, account = history.address(history.token[r]), history.address(history.account[r])
+            amount = analytics._as_int(history.amount[r])
+            if event in ("Deposit", "Withdrawal"):
+                row = [token, account, amount, history.tx_hash(r), "", "", "", "", ""]
+            else:
+                row = ["", "", amount, history.tx_hash(r), "", token, history.address(history.wrapped[r]), account, ""]
+            writer.writerow([event, int(history.block[r])] + row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--csv-events", type=int, default=200_000)
+    args = parser.parse_args()
+
+    check()
+    history, headers = synthetic(args.events)
+    print(f"{len(history)} events")
+    with tempfile.TemporaryDirectory() as tmp:
+        timed("save .npz", history.save, f"{tmp}/history.npz")
+        history = timed("load .npz", History.from_npz, f"{tmp}/history.npz")
+    chains = {"source": "avax", "destination": "bsc"}
+    times = timed("timestamps (header join)", history.timestamps, headers, chains)
+    timed("volume", analytics.volume, history)
+    for event in analytics.RELAYS:
+        r = timed(f"latency {event}", analytics.latency, history, event, times)
+        print(f"    matched {r['matched']} unmatched {r['unmatched']} p50 {r['all']['p50']:.0f}s "
+              f"p99 {r['all']['p99']:.0f}s")
+    timed("unmatched", analytics.unmatched, history, "Deposit")
+    timed("top recipients (all tokens)", analytics.top_recipients, history)
+
+    small, _ = synthetic(args.csv_events)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_csv(small, f"{tmp}/events.csv")
+        start = time.perf_counter()
+        History.from_csv(f"{tmp}/events.csv")
+        elapsed = time.perf_counter() - start
+    print(f"  CSV import: {len(small) / elapsed:,.0f} rows/s (once; later runs load the .npz)")
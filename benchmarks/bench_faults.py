@@ -0,0 +1,100 @@
+"""
+Relayer scan loop behind fault_proxy, one run per fault profile.
+
+    python benchmarks/bench_faults.py [--duration 20] [--profiles clean,slow,throttled,flaky,stale,reorg]
+
+A live SyntheticNode produces a block every --block-time seconds.  The loop
+under test is bridge_cli's daemon loop: poll eth_blockNumber through an
+RPCClient (with rpc_limiter's retries), stream the new range with
+event_stream.EventStream and relay each batch, here at a simulated
+--relay-cost per event.  Reported per profile:
+
+    relays/s     events relayed per second
+    latency      from a block appearing on the node to its event being relayed
+    missed       events the loop never relayed (hidden by a reorg or a failed scan)
+    duplicates   events relayed twice (a range rescanned after a partial failure)
+    errors       scans that raised
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import abi_artifact
+import event_stream
+from fault_proxy import PROFILES, FaultProxy
+from rpc_client import RPCClient
+from synthetic_chain import SyntheticChain, SyntheticNode
+
+
+def percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def run(chain, contract, profile, args):
+    first = 1000
+    node = SyntheticNode(chain, rtt=0.005, scan_cost=0.00002, block_time=args.block_time, first_block=first)
+    proxy = FaultProxy(node.url, [(profile, float("inf"))])
+    client = RPCClient(proxy.url, timeout=args.timeout)
+    relayed, latency = {}, []
+    errors, cursor = 0, first - 1
+    end = time.time() + args.duration
+    while time.time() < end:
+        try:
+            head = client.block_number()
+            if head > cursor:
+                with event_stream.EventStream(client, contract, "Deposit", cursor + 1, head) as stream:
+                    for batch in stream.batches(32):
+                        time.sleep(args.relay_cost * len(batch))
+                        now = time.time()
+                        for evt in batch:
+                            key = (evt.transactionHash, evt.logIndex)
+                            relayed[key] = relayed.get(key, 0) + 1
+                            latency.append(now - node.appeared(evt.blockNumber))
+                cursor = head
+        except Exception:
+            errors += 1
+        time.sleep(args.poll)
+    elapsed = args.duration
+    expected = {(log["transactionHash"], int(log["logIndex"], 16))
+                for n in range(first, cursor + 1) for log in chain.logs.get(n, ())
+                if log["address"].lower() == contract["address"].lower()}
+    latency.sort()
+    proxy.close()
+    node.close()
+    return {
+        "relays/s": len(relayed) / elapsed,
+        "p50": percentile(latency, 0.5), "p95": percentile(latency, 0.95), "p99": percentile(latency, 0.99),
+        "max": percentile(latency, 1),
+        "missed": len(expected - set(relayed)),
+        "duplicates": sum(n - 1 for n in relayed.values()),
+        "errors": errors,
+        "faults": dict(proxy.stats),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=20, help="seconds per profile")
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--block-time", type=float, default=0.1)
+    parser.add_argument("--activity", type=float, default=0.5, help="fraction of blocks with a Deposit")
+    parser.add_argument("--relay-cost", type=float, default=0.002, help="simulated seconds per relay")
+    parser.add_argument("--poll", type=float, default=0.2, help="seconds between polls")
+    parser.add_argument("--timeout", type=float, default=1.0, help="RPC client timeout (s)")
+    args = parser.parse_args()
+
+    source = abi_artifact.load_artifact()["source"]
+    n_blocks = 1000 + int(2 * args.duration / args.block_time) + 100
+    chain = SyntheticChain(n_blocks, source["address"], source["events"]["Deposit"]["topic"], args.activity, 1)
+    print(f"{args.duration:.0f}s per profile, a block every {args.block_time}s, poll every {args.poll}s")
+    print(f"{'profile':<10} {'relays/s':>8} {'p50':>6} {'p95':>6} {'p99':>6} {'max':>6} {'missed':>6} "
+          f"{'dups':>5} {'errors':>6}  faults injected")
+    for name in args.profiles.split(","):
+        r = run(chain, source, PROFILES[name], args)
+        faults = " ".join(f"{k}={v}" for k, v in sorted(r["faults"].items()) if k != "requests")
+        print(f"{name:<10} {r['relays/s']:8.2f} {r['p50']:6.2f} {r['p95']:6.2f} {r['p99']:6.2f} {r['max']:6.2f} "
+              f"{r['missed']:6} {r['duplicates']:5} {r['errors']:6}  {r['faults'].get('requests', 0)} requests "
+              f"{faults}")
@@ -0,0 +1,95 @@
+"""
+Per-event cost in the calling thread of printing whole events (what
+scanBlocks used to do) vs. bridge_log's queue-backed JSON-lines records.
+
+    python benchmarks/bench_logging.py [--n 20000] [--sink pipe|devnull]
+
+With --sink pipe, output goes to a pipe drained by a deliberately slow
+reader, standing in for a terminal or a log shipper that falls behind.
+"""
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from web3.datastructures import AttributeDict
+
+import bridge_log
+
+
+def make_events(n):
+    """
+    web3-style event AttributeDicts, as returned by get_all_entries().
+    """
+    return [AttributeDict({
+        "args": AttributeDict({"token": "0x" + "11" * 20, "recipient": "0x" + "22" * 20, "amount": 10 ** 18 + i}),
+        "event": "Deposit",
+        "logIndex": i % 7,
+        "transactionIndex": 0,
+        "transactionHash": bytes.fromhex(f"{i:064x}"),
+        "address": "0x" + "33" * 20,
+        "blockHash": bytes.fromhex(f"{i // 5:064x}"),
+        "blockNumber": 1000 + i // 5,
+    }) for i in range(n)]
+
+
+def open_sink(kind):
+    if kind == "devnull":
+        return open(os.devnull, "w")
+    r, w = os.pipe()
+
+    def drain():
+        with os.fdopen(r, "rb") as f:
+            while f.read1(4096):
+                time.sleep(0.0005)
+
+    threading.Thread(target=drain, daemon=True).start()
+    return io.TextIOWrapper(os.fdopen(w, "wb"), write_through=False)
+
+
+def bench_print(events, sink):
+    stdout, sys.stdout = sys.stdout, sink
+    start = time.perf_counter()
+    try:
+        for evt in events:
+            print(f"Found {evt.event} event: {evt}")
+        sys.stdout.flush()
+    finally:
+        sys.stdout = stdout
+    return time.perf_counter() - start, 0.0
+
+
+def bench_log(events, sink, level, sample):
+    bridge_log.configure(level=level, levels={}, sample=sample, stream=sink)
+    log = bridge_log.get_logger("bench")
+    start = time.perf_counter()
+    for evt in events:
+        log.debug("found %r", evt, extra=bridge_log.fields("source", evt.event, evt.transactionHash, "scan"))
+    caller = time.perf_counter() - start
+    bridge_log.stop()  # wait for the writer to drain
+    return caller, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--sink", choices=["pipe", "devnull"], default="pipe")
+    args = parser.parse_args()
+
+    events = make_events(args.n)
+    runs = [
+        ("print every event", lambda sink: bench_print(events, sink)),
+        ("log, INFO (debug off)", lambda sink: bench_log(events, sink, "INFO", 1.0)),
+        ("log, DEBUG sampled 1%", lambda sink: bench_log(events, sink, "DEBUG", 0.01)),
+        ("log, DEBUG every event", lambda sink: bench_log(events, sink, "DEBUG", 1.0)),
+    ]
+    print(f"{args.n} events, sink={args.sink}")
+    for name, fn in runs:
+        caller, drained = fn(open_sink(args.sink))
+        drained = f"  (written after {drained:.2f}s)" if drained else ""
+        print(f"{name:<24} {1e6 * caller / args.n:8.1f} us/event in the caller{drained}")
@@ -0,0 +1,110 @@
+"""
+Relay ordering under a skewed workload: scan order (FIFO) vs. amount tiers
+with age SLAs vs. tiers plus per-recipient fair share.
+
+    python benchmarks/bench_scheduler.py [--relays 20000] [--spam 0.5] [--burst 500] [--service 1.0]
+
+One simulated relay thread sends a relay every --service seconds (virtual
+time).  200 recipients deposit amounts spread over the tiers as a Poisson
+stream using 45% of that capacity.  One more recipient sends --spam of all
+deposits, all tiny, in bursts of --burst.  Reported per policy: queue
+latency per class, SLA misses, and queue latency for the spammer vs.
+everyone else.
+
+Then push+pop cost at growing queue sizes, to check it stays O(log n).
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import relay_scheduler
+from relay_scheduler import Policy, RelayScheduler
+
+SPAMMER = "0x" + "5a" * 20
+
+
+def make_workload(n, spam, burst, service, seed=1):
+    """
+    [(arrival, amount, recipient)] sorted by arrival.
+    """
+    rng = random.Random(seed)
+    users = ["0x" + f"{i:040x}" for i in range(1, 201)]
+    out = []
+    t = 0.0
+    for _ in range(int(n * (1 - spam))):
+        t += rng.expovariate(0.45 / service)
+        out.append((t, int(10 ** rng.uniform(17, 23)), rng.choice(users)))
+    n_spam = n - len(out)
+    bursts = max(1, n_spam // burst)
+    for b in range(bursts):
+        at = t * (b + 0.5) / bursts
+        out += [(at + j * 1e-3, 10 ** 15, SPAMMER) for j in range(n_spam // bursts)]
+    return sorted(out)
+
+
+def simulate(workload, policy, service):
+    scheduler = RelayScheduler(policy)
+    latency = {"spammer": [], "others": []}
+    tiers = Policy()
+    by_class = {t.name: [] for t in tiers.tiers}
+    i, now = 0, 0.0
+    while i < len(workload) or len(scheduler):
+        while i < len(workload) and workload[i][0] <= now:
+            arrival, amount, recipient = workload[i]
+            scheduler.push((arrival, amount, recipient), amount, recipient, now=arrival)
+            i += 1
+        if not len(scheduler):
+            now = workload[i][0]
+            continue
+        arrival, amount, recipient = scheduler.pop(now=now)
+        latency["spammer" if recipient == SPAMMER else "others"].append(now - arrival)
+        by_class[tiers.classify(amount).name].append(now - arrival)
+        now += service
+    return scheduler, {k: sorted(v) for k, v in dict(by_class, **latency).items()}
+
+
+def bench_ops(sizes, policy, seed=2):
+    rng = random.Random(seed)
+    for size in sizes:
+        scheduler = RelayScheduler(policy)
+        for j in range(size):
+            scheduler.push(j, int(10 ** rng.uniform(15, 23)), rng.randrange(1000), now=0.0)
+        ops = 20000
+        start = time.perf_counter()
+        for j in range(ops):
+            scheduler.push(j, int(10 ** rng.uniform(15, 23)), rng.randrange(1000), now=0.0)
+            scheduler.pop(now=0.0)
+        print(f"  {size:>9} queued: {1e6 * (time.perf_counter() - start) / ops:6.2f} us per push+pop")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--relays", type=int, default=20000)
+    parser.add_argument("--spam", type=float, default=0.5, help="share of deposits from one recipient")
+    parser.add_argument("--burst", type=int, default=500, help="deposits per spam burst")
+    parser.add_argument("--service", type=float, default=1.0, help="seconds per relay")
+    args = parser.parse_args()
+
+    workload = make_workload(args.relays, args.spam, args.burst, args.service)
+    policies = [
+        ("fifo", Policy.fifo()),
+        ("tiers + SLA", Policy(fair_share=False)),
+        ("tiers + SLA + fair", Policy()),
+    ]
+    print(f"{args.relays} relays, {100 * args.spam:.0f}% from one recipient in bursts of {args.burst}, "
+          f"{args.service}s per relay; SLA misses use the default tiers")
+    for name, policy in policies:
+        scheduler, latency = simulate(workload, policy, args.service)
+        missed = sum(s["missed_sla"] for s in scheduler.stats().values())
+        print(f"\n{name}" + ("" if name == "fifo" else f" ({missed} SLA misses)"))
+        for who, samples in latency.items():
+            print(f"  {who:<8} n={len(samples):<6} latency p50={relay_scheduler._percentile(samples, 0.5):7.1f}s "
+                  f"p95={relay_scheduler._percentile(samples, 0.95):7.1f}s "
+                  f"max={relay_scheduler._percentile(samples, 1):7.1f}s")
+
+    print("\npush+pop cost")
+    bench_ops([1000, 10000, 100000, 1000000], Policy())
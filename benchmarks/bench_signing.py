@@ -0,0 +1,47 @@
+"""
+Signatures per second signing inline with the account bridge_keyring.load_account
+caches vs. parsing the warden key for every transaction.
+
+    python benchmarks/bench_signing.py [--n 2000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from eth_account import Account
+
+from bridge_keyring import load_account
+
+
+def make_txs(address, n):
+    return [{"nonce": i, "to": address, "value": 0, "gas": 21000, "gasPrice": 10 ** 9, "chainId": 43113}
+            for i in range(n)]
+
+
+def bench_cached(key, txs):
+    start = time.perf_counter()
+    for tx in txs:
+        load_account(key).sign_transaction(tx)
+    return len(txs) / (time.perf_counter() - start)
+
+
+def bench_parsed(key, txs):
+    start = time.perf_counter()
+    for tx in txs:
+        Account.from_key(key).sign_transaction(tx)
+    return len(txs) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    key = Account.create().key.hex()
+    txs = make_txs(load_account(key).address, args.n)
+
+    print(f"{'parsed':>10}: {bench_parsed(key, txs):8.0f} signatures/sec")
+    print(f"{'cached':>10}: {bench_cached(key, txs):8.0f} signatures/sec")
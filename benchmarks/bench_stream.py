@@ -0,0 +1,86 @@
+"""
+Collect-then-relay scanning vs. event_stream.EventStream on a synthetic
+chain: time to the first relay batch, total time with a simulated relay
+cost per batch, and peak Python heap while scanning.
+
+    python benchmarks/bench_stream.py [--blocks 200000] [--activity 0.05] [--relay-cost 0.01]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import abi_artifact
+import event_stream
+from rpc_client import RPCClient
+from synthetic_chain import SyntheticChain, SyntheticNode
+
+
+def relay(batch, cost):
+    # Stand-in for bridge.relay_events: fixed cost per batch, nothing kept
+    time.sleep(cost)
+
+
+def run(name, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first, events = fn(start)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<8} first relay {first:7.3f}s  total {elapsed:7.2f}s  peak heap {peak / 2 ** 20:7.2f} MiB  "
+          f"events={events}")
+
+
+def collect_then_relay(client, contract, end, batch_size, cost):
+    def fn(start):
+        events = list(event_stream.iter_logs(client, contract, "Deposit", 0, end))
+        first = None
+        for i in range(0, len(events), batch_size):
+            relay(events[i:i + batch_size], cost)
+            first = first or time.perf_counter() - start
+        return first or 0, len(events)
+
+    return fn
+
+
+def streamed(client, contract, end, batch_size, cost, buffer):
+    def fn(start):
+        first, n = None, 0
+        with event_stream.EventStream(client, contract, "Deposit", 0, end, buffer=buffer) as stream:
+            for batch in stream.batches(batch_size):
+                relay(batch, cost)
+                n += len(batch)
+                first = first or time.perf_counter() - start
+        return first or 0, n
+
+    return fn
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=200000)
+    parser.add_argument("--activity", type=float, default=0.05, help="fraction of blocks with a Deposit")
+    parser.add_argument("--noise", type=int, default=0, help="mean unrelated logs per block")
+    parser.add_argument("--batch", type=int, default=32, help="events per relay batch")
+    parser.add_argument("--buffer", type=int, default=event_stream.default_buffer)
+    parser.add_argument("--relay-cost", type=float, default=0.01, help="simulated seconds per relay batch")
+    parser.add_argument("--rtt", type=float, default=0.02, help="simulated round trip (s)")
+    parser.add_argument("--scan-cost", type=float, default=0.00002, help="node cost per block in eth_getLogs (s)")
+    args = parser.parse_args()
+
+    source = abi_artifact.load_artifact()["source"]
+    chain = SyntheticChain(args.blocks, source["address"], source["events"]["Deposit"]["topic"], args.activity,
+                           args.noise)
+    node = SyntheticNode(chain, rtt=args.rtt, scan_cost=args.scan_cost)
+    client = RPCClient(node.url)
+    end = args.blocks - 1
+
+    print(f"{args.blocks} blocks in {-(-args.blocks // event_stream.max_range)} pages, "
+          f"relay batches of {args.batch} at {args.relay_cost * 1000:.0f} ms")
+    run("collect", collect_then_relay(client, source, end, args.batch, args.relay_cost))
+    run("stream", streamed(client, source, end, args.batch, args.relay_cost, args.buffer))
+    node.close()
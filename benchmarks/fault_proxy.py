@@ -0,0 +1,251 @@
+"""
+Fault-injecting JSON-RPC proxy.
+
+Sits between the relayer and a local stand-in chain (a SyntheticNode, anvil,
+...) and misbehaves the way the public Fuji and BSC endpoints do:
+
+    python benchmarks/fault_proxy.py --upstream http://127.0.0.1:8545 --port 8546 \\
+        --schedule clean:30,throttled:10,flaky:10,reorg:20
+    BRIDGE_RPC_AVAX=http://127.0.0.1:8546 python bridge_cli.py daemon
+
+A FaultProfile sets, per request:
+
+    latency, sigma   added delay: fixed, or lognormal around `latency` if sigma > 0
+    throttle         share answered HTTP 429 (with Retry-After: retry_after if set)
+    timeout          share held for timeout_delay seconds, then closed unanswered
+    truncate         share whose response body is cut off halfway
+    drop             share whose connection is closed without a response
+    stale            share of eth_blockNumber answers stale_lag blocks behind
+    reorg_every      every reorg_every seconds the last reorg_depth blocks are
+                     replaced, for reorg_window seconds, by a fork that has
+                     none of their logs and different block hashes
+
+The schedule cycles through (profile, seconds) phases.  `stats` counts the
+requests and the faults injected.
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class FaultProfile:
+    def __init__(self, name, latency=0.0, sigma=0.0, throttle=0.0, retry_after=None, timeout=0.0,
+                 timeout_delay=5.0, truncate=0.0, drop=0.0, stale=0.0, stale_lag=5, reorg_every=None,
+                 reorg_depth=3, reorg_window=1.0):
+        self.name = name
+        self.latency = latency
+        self.sigma = sigma
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self.timeout_delay = timeout_delay
+        self.truncate = truncate
+        self.drop = drop
+        self.stale = stale
+        self.stale_lag = stale_lag
+        self.reorg_every = reorg_every
+        self.reorg_depth = reorg_depth
+        self.reorg_window = reorg_window
+
+
+PROFILES = {p.name: p for p in [
+    FaultProfile("clean"),
+    FaultProfile("slow", latency=0.15, sigma=0.8),
+    FaultProfile("throttled", latency=0.02, throttle=0.2),
+    FaultProfile("flaky", latency=0.02, timeout=0.02, truncate=0.05, drop=0.05),
+    FaultProfile("stale", stale=0.5, stale_lag=5),
+    FaultProfile("reorg", reorg_every=2.0, reorg_depth=3, reorg_window=0.5),
+]}
+
+
+def parse_schedule(spec):
+    """
+    "clean:30,throttled:10" -> [(PROFILES["clean"], 30.0), (PROFILES["throttled"], 10.0)]
+    """
+    schedule = []
+    for part in spec.split(","):
+        name, _, seconds = part.partition(":")
+        if name not in PROFILES:
+            raise ValueError(f"Unknown fault profile {name!r}, expected one of {', '.join(PROFILES)}")
+        schedule.append((PROFILES[name], float(seconds) if seconds else math.inf))
+    return schedule
+
+
+class FaultProxy:
+    def __init__(self, upstream, schedule, port=0, host="127.0.0.1", seed=1):
+        self.upstream = urlparse(upstream)
+        self.schedule = schedule
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stats = Counter()
+        self.head = 0  # highest head the upstream has reported
+        self.fork = None  # (first block, last block, until)
+        self.next_reorg = None
+        self.local = threading.local()
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                profile = proxy.profile()
+                fault = proxy.choose_fault(profile)
+                if fault in ("drop", "timeout"):
+                    if fault == "timeout":
+                        time.sleep(profile.timeout_delay)
+                    self.close_connection = True
+                    return
+                if fault == "throttle":
+                    out = json.dumps({"jsonrpc": "2.0", "id": None,
+                                      "error": {"code": 429, "message": "Too Many Requests"}}).encode()
+                    self.send_response(429)
+                    if profile.retry_after is not None:
+                        self.send_header("Retry-After", str(profile.retry_after))
+                    self.send_header("Content-Length", str(len(out)))
+                    self.end_headers()
+                    self.wfile.write(out)
+                    return
+                time.sleep(proxy.delay(profile))
+                out = proxy.forward(body, profile)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                if fault == "truncate":
+                    self.wfile.write(out[:len(out) // 2])
+                    self.close_connection = True
+                else:
+                    self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def profile(self, now=None):
+        elapsed = (now or time.time()) - self.started
+        total = sum(seconds for _, seconds in self.schedule)
+        if total < math.inf:
+            elapsed %= total
+        for profile, seconds in self.schedule:
+            if elapsed < seconds:
+                return profile
+            elapsed -= seconds
+        return self.schedule[-1][0]
+
+    def choose_fault(self, profile):
+        with self.lock:
+            self.stats["requests"] += 1
+            r = self.rng.random()
+            for fault, share in (("drop", profile.drop), ("timeout", profile.timeout),
+                                 ("throttle", profile.throttle), ("truncate", profile.truncate)):
+                if r < share:
+                    self.stats[fault] += 1
+                    return fault
+                r -= share
+        return None
+
+    def delay(self, profile):
+        if not profile.latency:
+            return 0.0
+        if not profile.sigma:
+            return profile.latency
+        with self.lock:
+            return profile.latency * math.exp(self.rng.gauss(0, profile.sigma))
+
+    def forward(self, body, profile):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.upstream.hostname, self.upstream.port,
+                                                                timeout=30)
+        try:
+            conn.request("POST", self.upstream.path or "/", body, {"Content-Type": "application/json"})
+            data = conn.getresponse().read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            raise
+        requests = json.loads(body)
+        responses = json.loads(data)
+        if isinstance(requests, list) and isinstance(responses, list):
+            by_id = {r.get("id"): r for r in requests}
+            responses = [self._rewrite(by_id.get(r.get("id"), {}), r, profile) for r in responses]
+        elif isinstance(requests, dict):
+            responses = self._rewrite(requests, responses, profile)
+        return json.dumps(responses).encode()
+
+    def _current_fork(self, profile):
+        now = time.time()
+        with self.lock:
+            if profile.reorg_every:
+                if self.next_reorg is None:
+                    self.next_reorg = now + profile.reorg_every
+                elif now >= self.next_reorg and self.head:
+                    self.fork = (max(0, self.head - profile.reorg_depth + 1), self.head, now + profile.reorg_window)
+                    self.next_reorg = now + profile.reorg_every
+                    self.stats["reorgs"] += 1
+            if self.fork is not None and now < self.fork[2]:
+                return self.fork
+        return None
+
+    def _rewrite(self, request, response, profile):
+        method = request.get("method")
+        result = response.get("result")
+        if result is None:
+            return response
+        if method == "eth_blockNumber":
+            head = int(result, 16)
+            with self.lock:
+                self.head = max(self.head, head)
+                stale = profile.stale and self.rng.random() < profile.stale
+                if stale:
+                    self.stats["stale"] += 1
+            if stale:
+                return dict(response, result=hex(max(0, head - profile.stale_lag)))
+            return response
+        fork = self._current_fork(profile)
+        if fork is None:
+            return response
+        lo, hi, _ = fork
+        if method == "eth_getLogs":
+            kept = [log for log in result if not lo <= int(log["blockNumber"], 16) <= hi]
+            with self.lock:
+                self.stats["reorged_logs"] += len(result) - len(kept)
+            return dict(response, result=kept)
+        if method == "eth_getBlockByNumber" and lo <= int(result["number"], 16) <= hi:
+            return dict(response, result=dict(result, hash="0x" + "f0" * 16 + result["hash"][34:]))
+        return response
+
+    def close(self):
+        self.server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fault-injecting JSON-RPC proxy")
+    parser.add_argument("--upstream", required=True, help="JSON-RPC endpoint of the stand-in chain")
+    parser.add_argument("--port", type=int, default=8546)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--schedule", default="clean", help=f"profile:seconds,... from {', '.join(PROFILES)}")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    proxy = FaultProxy(args.upstream, parse_schedule(args.schedule), args.port, args.host, args.seed)
+    print(f"Proxying {args.upstream} on {proxy.url} ({args.schedule})")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"[{proxy.profile().name}] " + " ".join(f"{k}={v}" for k, v in sorted(proxy.stats.items())))
+    except KeyboardInterrupt:
+        proxy.close()
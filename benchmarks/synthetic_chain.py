@@ -0,0 +1,171 @@
+"""
+A synthetic JSON-RPC node for benchmarks.
+
+Serves eth_blockNumber, eth_getBlockByNumber (with real logsBloom values) and
+eth_getLogs over a generated chain in which only a small fraction of blocks
+contain bridge events.  Each request pays a simulated round trip, and
+eth_getLogs pays a per-block cost for every block in its range, which is the
+work a node does when it can't skip blocks.
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bloom_scan import bloom_mask
+
+
+def random_hex(rng, nbytes):
+    return "0x" + rng.getrandbits(8 * nbytes).to_bytes(nbytes, "big").hex()
+
+
+class SyntheticChain:
+    """
+    n_blocks blocks; each contains a bridge event with probability `activity`
+    and on average `noise` unrelated logs from other contracts.
+    """
+
+    def __init__(self, n_blocks, address, topic, activity=0.002, noise=3, seed=1):
+        rng = random.Random(seed)
+        self.n_blocks = n_blocks
+        self.logs = {}
+        self.blooms = []
+        for n in range(n_blocks):
+            logs = []
+            if rng.random() < activity:
+                # Deposit(token, recipient) topics, amount in data
+                logs.append(self._log(n, address, [topic, random_hex(rng, 32), random_hex(rng, 32)], rng))
+            for _ in range(rng.randint(0, 2 * noise)):
+                logs.append(self._log(n, random_hex(rng, 20), [random_hex(rng, 32), random_hex(rng, 32)], rng))
+            bloom = 0
+            for log in logs:
+                bloom |= bloom_mask(bytes.fromhex(log["address"][2:]))
+                for t in log["topics"]:
+                    bloom |= bloom_mask(bytes.fromhex(t[2:]))
+            self.blooms.append("0x" + bloom.to_bytes(256, "big").hex())
+            if logs:
+                for i, log in enumerate(logs):
+                    log["logIndex"] = hex(i)
+                self.logs[n] = logs
+
+    @staticmethod
+    def _log(n, address, topics, rng):
+        return {"address": address, "topics": topics, "data": "0x" + "00" * 32,
+                "blockNumber": hex(n), "blockHash": random_hex(rng, 32),
+                "transactionHash": random_hex(rng, 32), "logIndex": "0x0"}
+
+    def header(self, n):
+        if n >= self.n_blocks:
+            return None
+        return {"number": hex(n), "logsBloom": self.blooms[n], "hash": "0x" + n.to_bytes(32, "big").hex()}
+
+    def get_logs(self, flt):
+        lo, hi = int(flt["fromBlock"], 16), int(flt["toBlock"], 16)
+        address = flt.get("address", "").lower()
+        topics = flt.get("topics") or []
+        out = []
+        for n in range(lo, hi + 1):
+            for log in self.logs.get(n, ()):
+                if address and log["address"].lower() != address:
+                    continue
+                if topics and topics[0] and log["topics"][0] != topics[0]:
+                    continue
+                out.append(log)
+        return out
+
+
+class SyntheticNode:
+    """
+    HTTP front end for a SyntheticChain with a simple cost model and counters.
+    """
+
+    def __init__(self, chain, rtt=0.02, scan_cost=0.0005, header_cost=0.00002, block_time=None, first_block=0):
+        self.chain = chain
+        self.rtt = rtt
+        self.scan_cost = scan_cost
+        self.header_cost = header_cost
+        # With block_time, the chain is "live": block first_block + k appears k * block_time after start
+        self.block_time = block_time
+        self.first_block = first_block
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stats = {"http_requests": 0, "calls": 0, "blocks_scanned": 0, "headers_served": 0}
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                out = json.dumps(node.handle(body)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def handle(self, body):
+        with self.lock:
+            self.stats["http_requests"] += 1
+        cost = self.rtt
+        calls = body if isinstance(body, list) else [body]
+        results = []
+        for call in calls:
+            result, c = self.call(call["method"], call.get("params", []))
+            cost += c
+            results.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+        time.sleep(cost)
+        return results if isinstance(body, list) else results[0]
+
+    def head(self):
+        if self.block_time is None:
+            return self.chain.n_blocks - 1
+        return min(self.chain.n_blocks - 1, self.first_block + int((time.time() - self.started) / self.block_time))
+
+    def appeared(self, n):
+        """
+        Wall-clock time block n appeared (live chains only).
+        """
+        return self.started + (n - self.first_block) * self.block_time
+
+    def call(self, method, params):
+        with self.lock:
+            self.stats["calls"] += 1
+        head = self.head()
+        if method == "eth_blockNumber":
+            return hex(head), 0
+        if method == "eth_getBlockByNumber":
+            with self.lock:
+                self.stats["headers_served"] += 1
+            n = head if params[0] == "latest" else int(params[0], 16)
+            return (self.chain.header(n) if n <= head else None), self.header_cost
+        if method == "eth_getLogs":
+            flt = dict(params[0])
+            if int(flt["toBlock"], 16) > head:
+                flt["toBlock"] = hex(head)
+            blocks = max(0, int(flt["toBlock"], 16) - int(flt["fromBlock"], 16) + 1)
+            with self.lock:
+                self.stats["blocks_scanned"] += blocks
+            return self.chain.get_logs(flt), blocks * self.scan_cost
+        return None, 0
+
+    def reset_stats(self):
+        with self.lock:
+            for k in self.stats:
+                self.stats[k] = 0
+
+    def close(self):
+        self.server.shutdown()
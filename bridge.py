@@ -1,41 +1,90 @@
-from web3 import Web3
-from web3.contract import Contract
-from web3.middleware import geth_poa_middleware  # Necessary for POA chains
+import argparse
 import json
 import sys
+import time
 from pathlib import Path
 
+import bridge_keyring
+import bridge_log
+import chain_config
+import profiler
+import rpc_limiter
+import sharding
+from preflight import HoldQueue
 
-source_chain = 'avax'
-destination_chain = 'bsc'
+
+# Chains of the default route in chains.json (avax -> bsc unless configured otherwise)
+source_chain = chain_config.get_route().source
+destination_chain = chain_config.get_route().destination
 contract_info = "contract_info.json"
-private_key = "f447cac1243f3e6eaa439a774c3fd4203166ff2859b115d40670b2da163a018a"
+transfers = None  # transfer_index.TransferIndex recording each relay's progress, if set
+relay_state = None  # snapshot.RelayState tracking pending relays for warm restarts, if set
+liquidity = None  # liquidity.LiquidityLedger checked before each withdraw, if set
+held = HoldQueue()  # relays pre-flight held, pre-flighted again by retry_held
+private_key = None  # relays are signed with this key if set, otherwise with warden_key()
+log = bridge_log.get_logger("relay")
+fields = bridge_log.fields
+
+
+# web3 and eth_account take over a second to import, so they are imported
+# inside the functions that need them.  Scanning for events (see bridge_cli.py)
+# doesn't need either.
+
+
+def warden_key():
+    """
+    The key relays are signed with: private_key, read from
+    bridge_keyring.warden_key (see there for the environment overrides) on
+    first use, so importing bridge neither reads the environment nor derives
+    a mnemonic.
+    """
+    global private_key
+    if private_key is None:
+        private_key = bridge_keyring.warden_key()
+    return private_key
+
+
+def get_rpc_url(chain):
+    """
+    RPC endpoint for a chain (see chains.json), overridable with BRIDGE_RPC_<CHAIN>
+    (e.g. a local chain for testing).
+    """
+    return chain_config.rpc_url(chain)
+
+
+_connections = {}  # rpc url -> Web3, shared by every route using that chain
 
 
 def connectTo(chain):
     """
-    Connects to the blockchain network.
+    Connects to the blockchain network.  One Web3 instance is kept per endpoint.
     """
-    if chain == 'avax':
-        api_url = f"https://api.avax-test.network/ext/bc/C/rpc"  # AVAX C-chain testnet
-    elif chain == 'bsc':
-        api_url = f"https://data-seed-prebsc-1-s1.binance.org:8545/"  # BSC testnet
-    else:
-        raise ValueError(f"Unsupported chain: {chain}")
+    from web3 import Web3
+    from web3.middleware import geth_poa_middleware  # Necessary for POA chains
+
+    api_url = get_rpc_url(chain)
+    if api_url in _connections:
+        return _connections[api_url]
 
     w3 = Web3(Web3.HTTPProvider(api_url))
-    w3.middleware_onion.inject(geth_poa_middleware, layer=0)  # Add middleware for POA compatibility
+    if chain_config.get_chain(chain)["poa"]:
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)  # Add middleware for POA compatibility
+    rpc_limiter.install(w3)  # Shared per-endpoint rate limit, retries reads on 429/5xx
 
     if not w3.is_connected():
         raise ConnectionError(f"Failed to connect to {chain} blockchain at {api_url}")
-    print(f"Successfully connected to {chain} blockchain.")
+    log.info("connected to %s at %s", chain, api_url, extra=fields(chain=chain, stage="connect"))
+    _connections[api_url] = w3
     return w3
 
 
-def getContractInfo(chain):
+def getContractInfo(chain, route=None):
     """
     Load the contract_info file into a dictionary.
+    With a route name, the addresses come from that route in chains.json.
     """
+    if route is not None:
+        return chain_config.get_route(route).contract_info(chain)
     p = Path(__file__).with_name(contract_info)
     try:
         with p.open('r') as f:
@@ -49,17 +98,26 @@ def getContractInfo(chain):
     return contracts[chain]
 
 
-def send_transaction(w3, contract_function, args, account, private_key, gas_limit=1500000):
+def send_transaction(w3, contract_function, args, account, private_key, gas_limit=1500000, on_signed=None,
+                     gas_estimate=None, on_receipt=None):
     """
     Sends a transaction to the blockchain.
+    Tags the gas/sign/submit/confirm profiler stages; callers restore their own tag.
+    on_signed(tx_hash, raw_tx) is called after signing and before broadcasting
+    on_receipt(receipt) is called with the receipt, reverted or not
+    gas_estimate skips estimating gas when pre-flight already did
     """
+    start = time.perf_counter()
     try:
         # Estimate gas
-        gas_estimate = contract_function(*args).estimate_gas({"from": account.address})
-        print(f"Estimated Gas: {gas_estimate}")
+        profiler.set_stage("gas")
+        if gas_estimate is None:
+            gas_estimate = contract_function(*args).estimate_gas({"from": account.address})
+        log.debug("estimated gas %s", gas_estimate, extra=fields(stage="estimate"))
 
         if gas_limit < gas_estimate:
-            print(f"Gas limit ({gas_limit}) is too low. Using estimated gas: {gas_estimate}")
+            log.debug("gas limit %s is too low, using the estimate %s", gas_limit, gas_estimate,
+                      extra=fields(stage="estimate"))
             gas_limit = gas_estimate + 10000  # Add a buffer for safety
 
         # Build and send transaction
@@ -71,23 +129,35 @@ def send_transaction(w3, contract_function, args, account, private_key, gas_limi
             "gas": gas_limit,
             "gasPrice": gas_price,
         })
-        signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-        tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        # Signed inline with the cached account (bridge_keyring.load_account):
+        # relays to a chain go out one at a time, as the nonce is the pending count
+        profiler.set_stage("sign")
+        signed_tx = account.sign_transaction(tx)
+        signed_hash, raw_tx = signed_tx.hash.hex(), signed_tx.rawTransaction
+        if on_signed is not None:
+            on_signed(signed_hash, raw_tx)
+        profiler.set_stage("submit")
+        tx_hash = w3.eth.send_raw_transaction(raw_tx)
+        profiler.set_stage("confirm")
         receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        if on_receipt is not None:
+            on_receipt(receipt)
+        done = fields(txHash=receipt.transactionHash.hex(), stage="confirm", duration=time.perf_counter() - start)
         if receipt.status == 1:
-            print(f"Transaction successful. TX Hash: {receipt.transactionHash.hex()}")
+            log.info("transaction successful (block %s, gas %s)", receipt.blockNumber, receipt.gasUsed, extra=done)
             return receipt.transactionHash.hex()
         else:
-            print(f"Transaction failed. Receipt: {receipt}")
+            log.warning("transaction reverted (block %s, gas %s)", receipt.blockNumber, receipt.gasUsed, extra=done)
             return None
     except Exception as e:
-        print(f"Transaction failed: {str(e)}")
+        log.warning("transaction failed: %s", e, extra=fields(stage="send", duration=time.perf_counter() - start))
         return None
 
 
-def scanBlocks(chain):
+def get_events(chain, start_block=None, end_block=None):
     """
-    Scan the last 5 blocks of the source and destination chains.
+    Return the Deposit (source) or Unwrap (destination) events in a block range.
+    Defaults to the last 5 blocks.
     """
     if chain == "source":
         w3 = connectTo(source_chain)
@@ -98,93 +168,424 @@ def scanBlocks(chain):
         contract_info = getContractInfo("destination")
         event_name = "Unwrap"
     else:
-        print(f"Invalid chain: {chain}")
-        return
+        raise ValueError(f"Invalid chain: {chain}")
 
     contract_address = contract_info["address"]
     contract_abi = contract_info["abi"]
     contract = w3.eth.contract(address=contract_address, abi=contract_abi)
 
-    end_block = w3.eth.get_block_number()
-    start_block = max(0, end_block - 4)  
-    print(f"Scanning {chain} chain for {event_name} events from blocks {start_block} to {end_block}...")
+    if end_block is None:
+        end_block = w3.eth.get_block_number()
+    if start_block is None:
+        start_block = max(0, end_block - 4)
+    log.info("scanning blocks %s to %s", start_block, end_block, extra=fields(chain=chain, event=event_name,
+                                                                               stage="scan"))
+
+    event_filter = contract.events[event_name].create_filter(fromBlock=start_block, toBlock=end_block)
+    return event_filter.get_all_entries()
+
+
+def relay_event(chain, evt, key=None, on_signed=None, gas_estimate=None, route=None, on_receipt=None, on_held=None):
+    """
+    Relay a single Deposit/Unwrap event to the other chain (of `route`, by
+    default the first route in chains.json).
+    Returns the relay transaction hash, or None if it failed or was held
+    (on_held(reason) is called, see handle_withdraw_on_source).
+    """
+    if chain == "source" and evt.event == "Deposit":
+        token = evt.args["token"]
+        recipient = evt.args["recipient"]
+        amount = evt.args["amount"]
+        return handle_wrap_on_destination(sharding.transfer_id(evt), token, recipient, amount, key=key,
+                                          on_signed=on_signed, gas_estimate=gas_estimate, route=route,
+                                          on_receipt=on_receipt)
+    elif chain == "destination" and evt.event == "Unwrap":
+        underlying_token = evt.args["underlying_token"]
+        wrapped_token = evt.args["wrapped_token"]
+        frm = evt.args["frm"]
+        to = evt.args["to"]
+        amount = evt.args["amount"]
+        return handle_withdraw_on_source(sharding.transfer_id(evt), underlying_token, to, amount, key=key,
+                                         on_signed=on_signed, gas_estimate=gas_estimate, route=route,
+                                         on_receipt=on_receipt, on_held=on_held)
+    return None
+
+
+def scanBlocks(chain):
+    """
+    Scan the last 5 blocks of the source and destination chains.
+    Events are relayed in batches as they are fetched (see event_stream).
+    Returns the hashes of the relay transactions that were mined, so their
+    outcome can be read from their receipts (see relay_verify).
+    """
+    relayed = []
+    if chain not in ("source", "destination"):
+        log.error("invalid chain %r", chain)
+        return relayed
 
     try:
-        event_filter = contract.events[event_name].create_filter(fromBlock=start_block, toBlock=end_block)
-        events = event_filter.get_all_entries()
+        import abi_artifact
+        import event_stream
+        from rpc_client import RPCClient
+
+        client = RPCClient(get_rpc_url(source_chain if chain == "source" else destination_chain))
+        end_block = client.block_number()
+        event_stream.scan_and_relay(chain, client, abi_artifact.load_artifact(),
+                                    max(0, end_block - 4), end_block, relayed=relayed)
+
+    except Exception as e:
+        log.error("error scanning blocks: %s", e, extra=fields(chain=chain, stage="scan"))
+    return [tx_hash for tx_hash in relayed if tx_hash]
+
+
+def relay_events(chain, events, key=None, route=None):
+    """
+    Simulate a batch of relays, hold the ones that would revert and relay the rest.
+    Events a relay was already sent for are skipped (see unrelayed).
+    """
+    return [relay_ready(chain, evt, gas, key=key, route=route)
+            for evt, gas in preflight_events(chain, unrelayed(chain, events), key=key, route=route)]
+
+
+def unrelayed(chain, events):
+    """
+    The events no relay has been sent for yet, going by the relay state's
+    pending relays and the transfer index (when set).  Blocks are rescanned
+    after a warm restart, or after a scan that failed part way, and their
+    relays must not be sent twice.
+    """
+    sent = relay_state.pending_ids() if relay_state is not None else set()
+    if transfers is not None:
+        sent |= transfers.relayed(chain, events)
+    if not sent:
+        return events
+    out = [evt for evt in events if sharding.event_id(chain, evt) not in sent]
+    if len(out) < len(events):
+        log.info("skipping %s events already relayed", len(events) - len(out), extra=fields(chain=chain,
+                                                                                              stage="relay"))
+    return out
 
+
+def retry_held(chain, key=None, route=None):
+    """
+    relay_events for the relays of `chain` that pre-flight held on an earlier
+    poll and that are due to be pre-flighted again (see preflight.HoldQueue).
+    """
+    events = held.retry(chain, chain_config.get_route(route).name)
+    if events:
+        log.info("pre-flighting %s held relays again", len(events), extra=fields(chain=chain, stage="preflight"))
+    return relay_events(chain, events, key=key, route=route)
+
+
+def preflight_events(chain, events, key=None, route=None):
+    """
+    Simulate a batch of relays in one RPC batch.  Returns (evt, gas_estimate)
+    for the ones that will succeed; the rest go to the hold queue (`held`).
+    """
+    from preflight import preflight
+    from rpc_client import RPCClient
+
+    if not events:
+        return []
+    key = key or warden_key()
+    r = chain_config.get_route(route)
+    try:
+        with profiler.stage("gas", r.target(chain)):
+            ready = preflight(chain, events, bridge_keyring.load_account(key).address,
+                              RPCClient(get_rpc_url(r.target(chain))), contracts=r.contracts(), hold_queue=held,
+                              route=r.name)
+    except Exception as e:
+        log.warning("pre-flight failed, relaying without it: %s", e, extra=fields(chain=chain, stage="preflight"))
+        ready = [(evt, None) for evt in events]
+    if transfers is not None:
+        transfers.seen(chain, events, r.name)
+        relaying = {id(evt) for evt, _ in ready}
         for evt in events:
-            print(f"Found {event_name} event: {evt}")
-
-            if chain == "source" and event_name == "Deposit":
-                token = evt.args["token"]
-                recipient = evt.args["recipient"]
-                amount = evt.args["amount"]
-                handle_wrap_on_destination(token, recipient, amount)
-            elif chain == "destination" and event_name == "Unwrap":
-                underlying_token = evt.args["underlying_token"]
-                wrapped_token = evt.args["wrapped_token"]
-                frm = evt.args["frm"]
-                to = evt.args["to"]
-                amount = evt.args["amount"]
-                handle_withdraw_on_source(underlying_token, to, amount)
+            if id(evt) not in relaying:
+                transfers.held(chain, evt, "pre-flight: would revert")
+    return ready
+
+
+def relay_ready(chain, evt, gas_estimate=None, key=None, route=None):
+    """
+    relay_event for an event that passed pre-flight.  The outcome is checked
+    against the relay receipt (see relay_verify) and recorded in the transfer
+    index and relay state when those are set.  A withdraw the liquidity
+    ledger refuses is held, and pre-flighted again by retry_held.
+    """
+    key = key or warden_key()
+    outcome = []
+    held_for = []
+    tx_hash = relay_event(chain, evt, key=key, gas_estimate=gas_estimate, route=route,
+                          on_signed=lambda h, raw: _relay_signed(chain, evt, h, raw),
+                          on_receipt=lambda receipt: outcome.append(_relay_verified(chain, evt, receipt, route)),
+                          on_held=held_for.append)
+    if held_for:
+        _relay_held(chain, evt, held_for[0], route)
+    else:
+        _relay_finished(chain, evt, tx_hash, outcome[0] if outcome else None)
+    return tx_hash
+
+
+def _relay_held(chain, evt, reason, route=None):
+    # Pre-flighted again by retry_held, once the ledger has synced more liquidity
+    held.add(chain, evt, "insufficient_liquidity", reason, chain_config.get_route(route).name)
+    if transfers is not None:
+        transfers.held(chain, evt, reason)
+
+
+def _relay_signed(chain, evt, tx_hash, raw_tx):
+    if transfers is not None:
+        transfers.submitted(chain, evt, tx_hash)
+    if relay_state is not None:
+        target = "destination" if chain == "source" else "source"
+        relay_state.signed(sharding.event_id(chain, evt), target, tx_hash, raw_tx, evt)
 
+
+def _relay_verified(chain, evt, receipt, route=None):
+    import relay_verify
+
+    try:
+        outcome = relay_verify.verify(evt, receipt, chain_config.get_route(route).contracts())
     except Exception as e:
-        print(f"Error scanning blocks on {chain}: {e}")
+        log.warning("couldn't check the relay receipt: %s", e, extra=fields(chain=chain, event=evt.event,
+                                                                            stage="verify"))
+        return None
+    if outcome.status == relay_verify.MISMATCHED:
+        log.error("relay of %s mined without its relay event: %s", evt.transactionHash, outcome.detail,
+                  extra=fields(chain=chain, event=evt.event, txHash=outcome.tx_hash, stage="verify"))
+    return outcome
+
+
+def _relay_finished(chain, evt, tx_hash, outcome=None):
+    if transfers is not None:
+        if outcome is not None:
+            transfers.verified(chain, evt, outcome)
+        else:
+            transfers.finished(chain, evt, tx_hash)
+    if relay_state is not None:
+        relay_state.finished(sharding.event_id(chain, evt), tx_hash)
 
 
-def handle_wrap_on_destination(token, recipient, amount):
+def handle_wrap_on_destination(transfer_id, token, recipient, amount, key=None, on_signed=None, gas_estimate=None,
+                               route=None, on_receipt=None):
     """
     Handles a Deposit event by calling the wrap function on the destination chain.
+    transfer_id is the Deposit's sharding.transfer_id; Destination refuses to settle it twice.
+    It is left out for a Destination deployed before it took one (see preflight.settle_args).
     """
-    print(f"Calling wrap on destination chain for token={token}, recipient={recipient}, amount={amount}...")
+    from preflight import settle_args
+
+    key = key or warden_key()
+    log.debug("calling wrap(%s, %s, %s)", token, recipient, amount, extra=fields(chain="destination",
+                                                                                  event="Deposit", stage="relay"))
     try:
-        destination_w3 = connectTo(destination_chain)
-        destination_contract_info = getContractInfo("destination")
+        destination_w3 = connectTo(chain_config.get_route(route).destination)
+        destination_contract_info = getContractInfo("destination", route)
         destination_contract = destination_w3.eth.contract(
             address=destination_contract_info["address"], abi=destination_contract_info["abi"]
         )
-        account = destination_w3.eth.account.from_key(private_key)
-
-        tx_hash = send_transaction(
-            destination_w3,
-            destination_contract.functions.wrap,
-            [token, recipient, amount],
-            account,
-            private_key
-        )
+        route_contracts = chain_config.get_route(route).contracts()
+        account = bridge_keyring.load_account(key)
+
+        with profiler.stage("relay", chain_config.get_route(route).destination):
+            tx_hash = send_transaction(
+                destination_w3,
+                destination_contract.functions.wrap,
+                settle_args(route_contracts["destination"]["functions"]["wrap"]["inputs"], transfer_id, [token, recipient, amount]),
+                account,
+                key,
+                on_signed=on_signed,
+                gas_estimate=gas_estimate,
+                on_receipt=on_receipt
+            )
         if tx_hash:
-            print(f"wrap() transaction successful. TX Hash: {tx_hash}")
+            log.info("wrap sent", extra=fields(chain="destination", event="Deposit", txHash=tx_hash, stage="relay"))
         else:
-            print("wrap() transaction failed.")
+            log.warning("wrap failed", extra=fields(chain="destination", event="Deposit", stage="relay"))
+        return tx_hash
     except Exception as e:
-        print(f"Error calling wrap on destination chain: {e}")
+        log.error("error calling wrap: %s", e, extra=fields(chain="destination", event="Deposit", stage="relay"))
+        return None
 
-def handle_withdraw_on_source(underlying_token, recipient, amount):
-    print(f"Calling withdraw on source chain for underlying_token={underlying_token}, recipient={recipient}, amount={amount}...")
+def handle_withdraw_on_source(transfer_id, underlying_token, recipient, amount, key=None, on_signed=None,
+                              gas_estimate=None, route=None, on_receipt=None, on_held=None):
+    """
+    Handles an Unwrap event by calling the withdraw function on the source chain,
+    with the Unwrap's sharding.transfer_id as handle_wrap_on_destination does.
+    If the liquidity ledger says Source can't pay it, nothing is sent and
+    on_held(reason) is called instead.
+    """
+    from preflight import settle_args
+
+    key = key or warden_key()
+    log.debug("calling withdraw(%s, %s, %s)", underlying_token, recipient, amount,
+              extra=fields(chain="source", event="Unwrap", stage="relay"))
+    ledger = liquidity
+    if ledger is not None and not ledger.reserve(underlying_token, amount, transfer_id):
+        reason = f"liquidity: Source has {ledger.available(underlying_token)} of {underlying_token} available"
+        log.warning("holding withdraw of %s %s until Source has the liquidity (%s)", amount, underlying_token, reason,
+                    extra=fields(chain="source", event="Unwrap", stage="liquidity"))
+        if on_held is not None:
+            on_held(reason)
+        return None
+    receipts = []  # the mined block ends the ledger's reservation
+
+    def receipt_seen(receipt):
+        receipts.append(receipt)
+        if on_receipt is not None:
+            on_receipt(receipt)
+
+    tx_hash = None
     try:
-        source_w3 = connectTo(source_chain)
-        source_contract_info = getContractInfo("source")
+        source_w3 = connectTo(chain_config.get_route(route).source)
+        source_contract_info = getContractInfo("source", route)
         source_contract = source_w3.eth.contract(
             address=source_contract_info["address"], abi=source_contract_info["abi"]
         )
-        account = source_w3.eth.account.from_key(private_key)
-
-        tx_hash = send_transaction(
-            source_w3,
-            source_contract.functions.withdraw,
-            [underlying_token, recipient, amount],
-            account,
-            private_key
-        )
+        route_contracts = chain_config.get_route(route).contracts()
+        account = bridge_keyring.load_account(key)
+
+        with profiler.stage("relay", chain_config.get_route(route).source):
+            tx_hash = send_transaction(
+                source_w3,
+                source_contract.functions.withdraw,
+                settle_args(route_contracts["source"]["functions"]["withdraw"]["inputs"], transfer_id, [underlying_token, recipient, amount]),
+                account,
+                key,
+                on_signed=on_signed,
+                gas_estimate=gas_estimate,
+                on_receipt=receipt_seen
+            )
         if tx_hash:
-            print(f"withdraw() transaction successful. TX Hash: {tx_hash}")
+            log.info("withdraw sent", extra=fields(chain="source", event="Unwrap", txHash=tx_hash, stage="relay"))
         else:
-            print("withdraw() transaction failed.")
+            log.warning("withdraw failed", extra=fields(chain="source", event="Unwrap", stage="relay"))
+        return tx_hash
     except Exception as e:
-        print(f"Error calling withdraw on source chain: {e}")
+        log.error("error calling withdraw: %s", e, extra=fields(chain="source", event="Unwrap", stage="relay"))
+        return None
+    finally:
+        if ledger is not None and tx_hash and receipts:
+            ledger.withdrawn(transfer_id, receipts[-1].blockNumber)
+        elif ledger is not None:
+            ledger.release(transfer_id)
+
+
+def rebroadcast(chain, raw_tx, on_receipt=None):
+    """
+    Re-send a relay a dead shard signed but may not have broadcast.
+    The nonce is already fixed, so this can't produce a second relay.
+    on_receipt(receipt) is called if the relay was mined, reverted or not
+    """
+    from web3 import Web3
+
+    w3 = connectTo(destination_chain if chain == "source" else source_chain)
+    tx_hash = Web3.keccak(raw_tx).hex()
+    try:
+        w3.eth.send_raw_transaction(raw_tx)
+    except Exception as e:
+        log.warning("rebroadcast rejected (%s), checking for an existing receipt", e,
+                    extra=fields(txHash=tx_hash, stage="rebroadcast"))
+    try:
+        receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=120)
+    except Exception as e:
+        log.warning("no receipt: %s", e, extra=fields(txHash=tx_hash, stage="rebroadcast"))
+        return None
+    if on_receipt is not None:
+        on_receipt(receipt)
+    return tx_hash if receipt.status == 1 else None
+
+
+def partition_key(chain, evt, partition_by):
+    if partition_by == "recipient":
+        return evt.args["recipient"] if chain == "source" else evt.args["to"]
+    return evt.args["token"] if chain == "source" else evt.args["underlying_token"]
+
+
+def run_shard(shard, num_shards, partition_by="token", poll_interval=5, lease_path=None):
+    """
+    Sharded relayer loop.  Each process relays the events whose partition key
+    hashes to a shard it holds a lease on; shards whose owner has stopped
+    heartbeating are adopted, starting from that shard's last cursor.
+
+    A shard's cursor only moves past blocks whose relays all finished: it
+    stops before the first relay that has to be retried (nothing was sent,
+    or it was signed but never seen mined) or that another live owner is
+    still relaying, so the next poll, or whoever adopts the shard if that
+    owner dies, picks it up.
+    """
+    if num_shards < 1 or not 0 <= shard < num_shards:
+        raise ValueError(f"shard must be in [0, {num_shards}), got {shard}")
+    leases = sharding.LeaseTable(lease_path)
+    # Leases are renewed from a background thread: a relay can wait up to
+    # 120s for its receipt, longer than the lease lasts
+    heartbeat = sharding.Heartbeat(leases.path, leases.owner).start()
+    log.info("shard %s/%s running as %s, partitioned by %s", shard, num_shards, leases.owner, partition_by)
+    try:
+        while True:
+            owned = leases.owned_shards(shard, num_shards)
+            for chain in ("source", "destination"):
+                try:
+                    head = connectTo(source_chain if chain == "source" else destination_chain).eth.get_block_number()
+                    start = min(leases.cursor(s, chain, head - 5) for s in owned) + 1
+                    events = get_events(chain, start, head)
+                except Exception as e:
+                    log.error("error scanning blocks: %s", e, extra=fields(chain=chain, stage="scan"))
+                    continue
+
+                retry = {}  # shard -> first block with a relay to retry
+                for evt in events:
+                    s = sharding.shard_for(partition_key(chain, evt, partition_by), num_shards)
+                    if s not in owned:
+                        continue
+                    eid = sharding.event_id(chain, evt)
+                    claimed, raw_tx = leases.claim(eid, s)
+                    if not claimed:
+                        if leases.status(eid) not in sharding.FINAL:  # a live owner's, which may still die
+                            retry[s] = min(retry.get(s, evt.blockNumber), evt.blockNumber)
+                        continue
+                    log.info("shard %s relaying %s", s, eid, extra=fields(chain=chain, event=evt.event, stage="relay"))
+                    receipts = []
+                    if raw_tx is not None:
+                        tx_hash = rebroadcast(chain, raw_tx, on_receipt=receipts.append)
+                    else:
+                        tx_hash = relay_event(chain, evt, on_signed=lambda h, raw: leases.record_signed(eid, h, raw),
+                                              on_receipt=receipts.append)
+                    status = leases.finish(eid, tx_hash, mined=bool(receipts))
+                    if status is None and raw_tx is not None:
+                        log.warning("signed relay of %s unmined after %s broadcasts, signing it again", eid,
+                                    sharding.max_rebroadcasts, extra=fields(chain=chain, stage="rebroadcast"))
+                    if status not in sharding.FINAL:
+                        retry[s] = min(retry.get(s, evt.blockNumber), evt.blockNumber)
+
+                for s in owned:
+                    leases.advance(s, chain, retry[s] - 1 if s in retry else head)
+            time.sleep(poll_interval)
+    finally:
+        heartbeat.stop()
+        leases.resign()
 
 
 if __name__ == "__main__":
-    scanBlocks("source")
-    scanBlocks("destination")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Bridge relayer")
+    parser.add_argument("--shard", type=int, help="run as one shard of a sharded relayer")
+    parser.add_argument("--num-shards", type=int, default=1)
+    parser.add_argument("--partition-by", choices=["token", "recipient"], default="token")
+    parser.add_argument("--profile", nargs="?", const=profiler.default_prefix, metavar="PREFIX",
+                        help="sample stacks per relay stage; writes PREFIX.collapsed/.svg/.txt at exit")
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler.start(args.profile)
+
+    try:
+        if args.shard is not None:
+            run_shard(args.shard, args.num_shards, args.partition_by)
+        else:
+            scanBlocks("source")
+            scanBlocks("destination")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        profiler.stop()
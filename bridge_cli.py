@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Relayer command line.
+
+    python bridge_cli.py scan [--chain source|destination] [--timings]
+    python bridge_cli.py daemon [--interval 5] [--claim-mode [--serve-attestations 8547]]
+    python bridge_cli.py backfill --chain source --from-block N [--to-block M] [--dry-run]
+    python bridge_cli.py register
+    python bridge_cli.py tokens [--lookback 10000]
+    python bridge_cli.py --profile [PREFIX] daemon    # stage-tagged sampling profile at exit
+    python bridge_cli.py routes [--route NAME ...] [--list] [--stats-interval 60]
+    python bridge_cli.py status TXHASH|RECIPIENT|TOKEN [--json]   # or --serve 8548
+
+Scanning only imports the standard library: topics and decoders come from
+abi_artifact.json (rebuilt when contract_info.json changes) and logs are
+fetched with rpc_client.  web3 is imported the first time an event actually
+has to be relayed.
+
+The daemon snapshots its state (scan cursors, token mappings, pending relays;
+see snapshot.py) every --snapshot-interval seconds and on exit, and resumes
+from the snapshot on restart unless --cold-start is given.  Rescanned events
+whose relay is still pending (or recorded as sent) are not relayed again, and
+the relays rebroadcast on a warm start are settled as their receipts arrive.
+It logs the time from start-up to the first confirmed relay.  Withdraws are checked against
+an in-memory ledger of Source's token balances (liquidity.py) before they
+are sent.  Relays held by pre-flight are pre-flighted again on later polls
+(bridge.retry_held).
+
+The daemon also keeps the token-mapping index (token_mapping.TokenIndex) in
+step with Creation/Registration events, so lookups against it never need an
+eth_call.
+
+Relaying commands record every transfer they see and each relay step in the
+transfer-status index (transfer_index.py, transfers.db); `status` answers
+from it without any RPC calls.  --no-transfer-index turns recording off.
+
+With --claim-mode, events are not relayed.  The warden instead signs claim
+attestations (see attestations.py) and recipients submit them.
+"""
+import time
+
+_t0 = time.perf_counter()
+
+import argparse
+import sys
+
+import abi_artifact
+import bridge
+import bridge_log
+import event_stream
+from event_stream import SCAN_EVENTS, iter_logs, max_range, range_logs
+from rpc_client import RPCClient
+
+log = bridge_log.get_logger("cli")
+
+
+class Timings:
+    """
+    Wall-clock marks since interpreter start-up of this module.
+    """
+
+    def __init__(self):
+        self.marks = [("start", _t0)]
+
+    def mark(self, name, once=False):
+        if once and any(n == name for n, _ in self.marks):
+            return
+        self.marks.append((name, time.perf_counter()))
+
+    def report(self, out=sys.stderr):
+        prev = self.marks[0][1]
+        for name, t in self.marks[1:]:
+            print(f"  {name:<12} {1000 * (t - prev):7.1f} ms", file=out)
+            prev = t
+        print(f"  {'total':<12} {1000 * (prev - _t0):7.1f} ms", file=out)
+
+
+timings = Timings()
+
+
+def chain_name(chain):
+    return bridge.source_chain if chain == "source" else bridge.destination_chain
+
+
+def scan(chain, client, contracts, start_block=None, end_block=None, relay=True, strategy="range", attestor=None):
+    """
+    scanBlocks() equivalent that only needs web3 once something is relayed.
+    Events are relayed in batches as their pages arrive (see event_stream).
+    If an attestor is given, events are attested instead of relayed.
+    Returns the last block scanned, or raises event_stream.PartialScan.
+    """
+    if end_block is None:
+        end_block = client.block_number()
+        timings.mark("first rpc", once=True)
+    if start_block is None:
+        start_block = max(0, end_block - 4)
+    event_stream.scan_and_relay(chain, client, contracts, start_block, end_block, relay, strategy, attestor)
+    return end_block
+
+
+def make_attestor(args, contracts):
+    """
+    An Attestor for --claim-mode (None otherwise), optionally serving its
+    attestations over HTTP.
+    """
+    if not args.claim_mode:
+        return None
+    import attestations
+
+    domains = {}
+    for side in ("source", "destination"):
+        client = RPCClient(bridge.get_rpc_url(chain_name(side)))
+        domains[side] = attestations.get_domain_separator(client, contracts[side]["address"])
+        client.close()
+    attestor = attestations.Attestor(bridge.warden_key(), contracts, domains, workers=args.attest_workers)
+    if args.serve_attestations:
+        attestations.serve(attestor.store, args.serve_attestations)
+    return attestor
+
+
+def cmd_scan(args, contracts):
+    attestor = make_attestor(args, contracts)
+    for chain in args.chain or ["source", "destination"]:
+        client = RPCClient(bridge.get_rpc_url(chain_name(chain)))
+        try:
+            scan(chain, client, contracts, attestor=attestor)
+        except Exception as e:
+            log.error("error scanning blocks: %s", e, extra=bridge_log.fields(chain=chain, stage="scan"))
+
+
+def token_index(contracts, clients=None):
+    from token_mapping import TokenIndex
+
+    clients = clients or {c: RPCClient(bridge.get_rpc_url(chain_name(c))) for c in SCAN_EVENTS}
+    return TokenIndex.for_contracts(contracts, clients)
+
+
+def cmd_daemon(args, contracts):
+    import snapshot
+
+    chains = args.chain or ["source", "destination"]
+    urls = {c: bridge.get_rpc_url(chain_name(c)) for c in SCAN_EVENTS}
+    clients = {c: RPCClient(url) for c, url in urls.items()}
+    attestor = make_attestor(args, contracts)
+    index = token_index(contracts, clients)
+    state = snapshot.RelayState(f"{contracts['source']['address']}/{contracts['destination']['address']}".lower(),
+                                started=_t0)
+    warm = None
+    if not args.cold_start:
+        try:
+            warm = snapshot.warm_start(state, clients, args.snapshot, index, bridge.transfers, contracts)
+        except Exception as e:
+            log.error("warm start failed, starting cold: %s", e, extra=bridge_log.fields(stage="snapshot"))
+            state = snapshot.RelayState(state.key, started=_t0)
+    timings.mark("warm start" if warm else "cold start")
+    state.token_index = index
+    bridge.relay_state = state
+    if not args.no_liquidity_check:
+        import liquidity
+
+        bridge.liquidity = liquidity.LiquidityLedger(clients["source"], contracts["source"]["address"],
+                                                     index.approved, verify_interval=args.verify_interval)
+    snapshotter = snapshot.Snapshotter(state, urls, args.snapshot, args.snapshot_interval).start()
+    try:
+        while True:
+            try:
+                new = index.sync()
+                if new:
+                    log.info("token index: %s new entries", new, extra=bridge_log.fields(stage="tokens"))
+            except Exception as e:
+                log.error("error syncing the token index: %s", e, extra=bridge_log.fields(stage="tokens"))
+            if state.rebroadcast:
+                try:
+                    snapshot.settle(state, clients, bridge.transfers, contracts)
+                except Exception as e:
+                    log.error("error settling rebroadcast relays: %s", e, extra=bridge_log.fields(stage="snapshot"))
+            if bridge.liquidity is not None:
+                try:
+                    bridge.liquidity.sync()
+                except Exception as e:
+                    log.error("error syncing the liquidity ledger: %s", e, extra=bridge_log.fields(stage="liquidity"))
+            for chain in chains:
+                try:
+                    head = clients[chain].block_number()
+                    start = state.cursors[chain] + 1 if chain in state.cursors else max(0, head - 4)
+                    if start <= head:
+                        state.advance(chain, scan(chain, clients[chain], contracts, start, head, attestor=attestor))
+                    if attestor is None:
+                        bridge.retry_held(chain)
+                except event_stream.PartialScan as e:
+                    # Resume after what was relayed, so the next poll doesn't relay it again
+                    state.advance(chain, e.block)
+                    log.error("error scanning blocks: %s", e, extra=bridge_log.fields(chain=chain, stage="scan"))
+                except Exception as e:
+                    log.error("error scanning blocks: %s", e, extra=bridge_log.fields(chain=chain, stage="scan"))
+            if state.first_relay is not None and not any(n == "first relay" for n, _ in timings.marks):
+                timings.mark("first relay")
+                log.info("first relay confirmed %.2fs after start (%s start)", state.first_relay,
+                         "warm" if warm else "cold", extra=bridge_log.fields(stage="relay", duration=state.first_relay))
+            time.sleep(args.interval)
+    finally:
+        snapshotter.stop()
+
+
+def cmd_backfill(args, contracts):
+    client = RPCClient(bridge.get_rpc_url(chain_name(args.chain)))
+    end_block = args.to_block if args.to_block is not None else client.block_number()
+    scan(args.chain, client, contracts, args.from_block, end_block, relay=not args.dry_run, strategy=args.strategy,
+         attestor=make_attestor(args, contracts))
+
+
+def cmd_register(args, contracts):
+    import register_and_create_tokens
+
+    register_and_create_tokens.main(args.route)
+
+
+def cmd_routes(args, contracts):
+    import chain_config
+
+    routes = chain_config.get_routes(args.route)
+    if args.list:
+        for r in routes:
+            print(f"{r.name:<20} {r.source} {r.contract_info('source')['address']} -> "
+                  f"{r.destination} {r.contract_info('destination')['address']}")
+        return
+    import relay_scheduler
+    import route_relayer
+
+    policy = relay_scheduler.Policy.fifo() if args.fifo else None
+    relayer = route_relayer.RouteRelayer(routes, relay=not args.dry_run, queue_size=args.queue, policy=policy)
+    relayer.run(args.stats_interval, args.duration)
+
+
+def cmd_tokens(args, contracts):
+    index = token_index(contracts)
+    index.sync(args.lookback)
+    print(f"{'underlying':42} {'wrapped':42} registered")
+    for underlying, wrapped in sorted(index.wrapped.items()):
+        print(f"{index.underlying[wrapped.lower()]:42} {wrapped:42} {underlying in index.approved}")
+    for token in sorted(index.approved - set(index.wrapped)):
+        print(f"{token:42} {'-':42} True")
+
+
+def cmd_status(args, contracts):
+    import json
+
+    import transfer_index
+
+    index = transfer_index.TransferIndex(args.transfer_db)
+    if args.serve:
+        transfer_index.serve(index, args.serve, args.host)
+        while True:
+            time.sleep(3600)
+    if args.query:
+        found = index.lookup(args.query, args.limit)
+    else:
+        found = index.search(args.recipient, args.token, args.from_block, args.to_block, args.state, args.limit)
+    if args.json:
+        print(json.dumps(found, indent=2))
+        return
+    if not found:
+        print("no transfers found")
+    for t in found:
+        print(transfer_index.format_transfer(t))
+
+
+def add_claim_args(p):
+    p.add_argument("--claim-mode", action="store_true",
+                   help="sign claim attestations instead of sending wrap/withdraw transactions")
+    p.add_argument("--attest-workers", type=int, default=0, help="processes used to sign attestations")
+    p.add_argument("--serve-attestations", type=int, metavar="PORT", help="serve attestations over HTTP")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bridge relayer")
+    parser.add_argument("--timings", action="store_true", help="print a start-up time breakdown to stderr")
+    parser.add_argument("--rebuild-artifact", action="store_true", help="recompile abi_artifact.json")
+    parser.add_argument("--log-level", help="default log level (BRIDGE_LOG_LEVEL, default INFO)")
+    parser.add_argument("--log-levels", help="per-module levels, e.g. event_stream=DEBUG,preflight=WARNING")
+    parser.add_argument("--log-sample", type=float, help="fraction of DEBUG records kept (BRIDGE_LOG_SAMPLE)")
+    parser.add_argument("--log-file", help="append JSON-lines logs here instead of stdout")
+    parser.add_argument("--profile", nargs="?", const="bridge_profile", metavar="PREFIX",
+                        help="sample stacks per relay stage; writes PREFIX.collapsed/.svg/.txt at exit")
+    parser.add_argument("--profile-interval", type=float, default=5, help="sampling interval (ms)")
+    parser.add_argument("--transfer-db", help="transfer-status index (default: transfers.db next to this file)")
+    parser.add_argument("--no-transfer-index", action="store_true", help="don't record relay progress")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scan", help="relay events from the last 5 blocks")
+    p.add_argument("--chain", choices=SCAN_EVENTS, action="append")
+    add_claim_args(p)
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("daemon", help="poll both chains and relay new events")
+    p.add_argument("--chain", choices=SCAN_EVENTS, action="append")
+    p.add_argument("--interval", type=float, default=5)
+    p.add_argument("--snapshot", help="state snapshot file (default: relayer.snapshot next to this file)")
+    p.add_argument("--snapshot-interval", type=float, default=30, help="seconds between snapshots")
+    p.add_argument("--cold-start", action="store_true", help="ignore the snapshot and rebuild state from RPC")
+    p.add_argument("--no-liquidity-check", action="store_true",
+                   help="send withdraws without checking Source's balance in the liquidity ledger")
+    p.add_argument("--verify-interval", type=float, default=300,
+                   help="seconds between liquidity ledger checks against balanceOf")
+    add_claim_args(p)
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("backfill", help="relay events from a block range")
+    p.add_argument("--chain", choices=SCAN_EVENTS, required=True)
+    p.add_argument("--from-block", type=int, required=True)
+    p.add_argument("--to-block", type=int)
+    p.add_argument("--dry-run", action="store_true", help="list events without relaying")
+    p.add_argument("--strategy", choices=["range", "bloom"], default="range",
+                   help="bloom: pre-filter blocks on header logsBloom (best for sparse activity)")
+    add_claim_args(p)
+    p.set_defaults(func=cmd_backfill)
+
+    p = sub.add_parser("register", help="register tokens on Source and create them on Destination")
+    p.add_argument("--route", help="route in chains.json (default: the first one)")
+    p.set_defaults(func=cmd_register)
+
+    p = sub.add_parser("routes", help="relay every route in chains.json from one process")
+    p.add_argument("--route", action="append", help="only these routes (default: all)")
+    p.add_argument("--list", action="store_true", help="print the configured routes and exit")
+    p.add_argument("--stats-interval", type=float, default=60, help="seconds between per-route stats")
+    p.add_argument("--queue", type=int, default=16, help="relay batches buffered per target chain")
+    p.add_argument("--duration", type=float, help="stop after this many seconds")
+    p.add_argument("--dry-run", action="store_true", help="list events without relaying")
+    p.add_argument("--fifo", action="store_true", help="relay in scan order instead of the scheduler policy")
+    p.set_defaults(func=cmd_routes)
+
+    p = sub.add_parser("tokens", help="update the token-mapping index and list it")
+    p.add_argument("--lookback", type=int, default=10000, help="blocks scanned when the index is first built")
+    p.set_defaults(func=cmd_tokens)
+
+    p = sub.add_parser("status", help="look up transfers in the local transfer-status index")
+    p.add_argument("query", nargs="?", help="source transaction hash, recipient or token address")
+    p.add_argument("--recipient")
+    p.add_argument("--token")
+    p.add_argument("--from-block", type=int)
+    p.add_argument("--to-block", type=int)
+    p.add_argument("--state", help="seen, held, submitted, confirmed, failed or attested")
+    p.add_argument("--limit", type=int, default=50)
+    p.add_argument("--json", action="store_true")
+    p.add_argument("--serve", type=int, metavar="PORT", help="serve GET /transfers lookups over HTTP")
+    p.add_argument("--host", default="127.0.0.1")
+    p.set_defaults(func=cmd_status)
+
+    args = parser.parse_args(argv)
+    if args.log_level or args.log_levels or args.log_sample is not None or args.log_file:
+        bridge_log.configure(args.log_level, bridge_log.parse_levels(args.log_levels) if args.log_levels else None,
+                             args.log_sample, args.log_file)
+    timings.mark("imports")
+    contracts = abi_artifact.load_artifact(rebuild=args.rebuild_artifact)
+    timings.mark("artifact")
+    if args.command in ("scan", "daemon", "backfill", "routes") and not args.no_transfer_index:
+        import transfer_index
+
+        bridge.transfers = transfer_index.TransferIndex(args.transfer_db)
+    if args.profile:
+        import profiler
+
+        profiler.start(args.profile, args.profile_interval / 1000)
+    try:
+        args.func(args, contracts)
+    except KeyboardInterrupt:
+        if not args.profile:
+            raise
+    finally:
+        if args.profile:
+            profiler.stop()
+        if args.timings:
+            timings.mark("done")
+            timings.report()
+
+
+if __name__ == "__main__":
+    main()
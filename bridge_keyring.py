@@ -0,0 +1,188 @@
+"""
+Account keyring shared by the relayer and the grading harness.
+
+Deriving an account from a mnemonic runs PBKDF2-HMAC-SHA512 (2048 rounds) and
+BIP-32 derivation, which is several times the cost of parsing a raw private
+key.  Keyring derives each account once and keeps it in memory.  Optionally
+it also keeps an encrypted on-disk cache of the derived private keys,
+indexed by the SHA-256 of the mnemonic, so new processes (e.g. grading
+workers) skip derivation entirely.  Cache entries are encrypted with
+AES-GCM under a key derived from the mnemonic itself, so the cache reveals
+nothing to anyone who doesn't already hold the mnemonic file.
+
+eth_account is imported lazily so that importing this module (bridge.py does
+at start-up) stays cheap.
+"""
+import base64
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import bridge_log
+
+log = bridge_log.get_logger("keyring")
+
+# Used when neither BRIDGE_WARDEN_KEY nor BRIDGE_WARDEN_MNEMONIC is set
+default_warden_key = "f447cac1243f3e6eaa439a774c3fd4203166ff2859b115d40670b2da163a018a"
+
+
+@lru_cache(maxsize=None)
+def load_account(private_key):
+    """
+    Parse a private key once per process.
+    """
+    from eth_account import Account
+
+    return Account.from_key(private_key)
+
+
+def derive_key(mnemonic):
+    """
+    Private key (bytes) of the default-path account of a mnemonic.
+    hashlib's PBKDF2 releases the GIL, so this parallelises across threads.
+    """
+    from eth_account import Account
+
+    Account.enable_unaudited_hdwallet_features()
+    return bytes(Account.from_mnemonic(mnemonic).key)
+
+
+def _mnemonic_id(mnemonic):
+    return hashlib.sha256(mnemonic.encode()).hexdigest()
+
+
+def _cache_cipher_key(mnemonic):
+    return hashlib.sha256(b"bridge-keyring:" + mnemonic.encode()).digest()
+
+
+class Keyring:
+    """
+    Accounts for the mnemonics in mnemonic_file (one per line), by line
+    number.  If cache_file is given (or BRIDGE_KEYRING_CACHE is set), derived
+    keys are also stored there encrypted.
+    """
+
+    def __init__(self, mnemonic_file, cache_file=None):
+        self.mnemonic_file = Path(mnemonic_file)
+        cache_file = cache_file or os.environ.get("BRIDGE_KEYRING_CACHE")
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.lock = threading.Lock()
+        self.accounts = {}  # mnemonic id -> LocalAccount
+        self._mnemonics = None
+        self._mtime = None
+
+    def mnemonics(self):
+        """
+        Lines of the mnemonic file, re-read only when the file changes.
+        """
+        mtime = self.mnemonic_file.stat().st_mtime_ns
+        if self._mnemonics is None or mtime != self._mtime:
+            with self.mnemonic_file.open("r") as f:
+                self._mnemonics = [line.rstrip() for line in f.read().splitlines()]
+            self._mtime = mtime
+        return self._mnemonics
+
+    def get(self, key_id):
+        """
+        The account for line key_id.  Raises IndexError if the file has fewer lines.
+        """
+        return self.get_many([key_id])[0]
+
+    def get_many(self, key_ids, workers=4):
+        """
+        Accounts for several key ids; the ones not cached yet are derived in parallel.
+        """
+        mnemonics = self.mnemonics()
+        wanted = [mnemonics[i] for i in key_ids]
+        with self.lock:
+            missing = [m for m in dict.fromkeys(wanted) if _mnemonic_id(m) not in self.accounts]
+        if missing:
+            disk = self._load_disk_cache(missing)
+            to_derive = [m for m in missing if m not in disk]
+            if len(to_derive) > 1 and workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    derived = dict(zip(to_derive, pool.map(derive_key, to_derive)))
+            else:
+                derived = {m: derive_key(m) for m in to_derive}
+            with self.lock:
+                for m, key in list(disk.items()) + list(derived.items()):
+                    self.accounts[_mnemonic_id(m)] = load_account(key)
+            if derived:
+                self._store_disk_cache(derived)
+        return [self.accounts[_mnemonic_id(m)] for m in wanted]
+
+    def _load_disk_cache(self, mnemonics):
+        if not self.cache_file or not self.cache_file.exists():
+            return {}
+        from Crypto.Cipher import AES
+
+        try:
+            with self.cache_file.open("r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        out = {}
+        for m in mnemonics:
+            entry = entries.get(_mnemonic_id(m))
+            if not entry:
+                continue
+            raw = base64.b64decode(entry)
+            try:
+                cipher = AES.new(_cache_cipher_key(m), AES.MODE_GCM, nonce=raw[:12])
+                out[m] = cipher.decrypt_and_verify(raw[28:], raw[12:28])
+            except ValueError:
+                log.warning("ignoring corrupt cache entry in %s", self.cache_file,
+                            extra=bridge_log.fields(stage="keyring"))
+        return out
+
+    def _store_disk_cache(self, derived):
+        if not self.cache_file:
+            return
+        from Crypto.Cipher import AES
+
+        with self.lock:
+            try:
+                with self.cache_file.open("r") as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+            for m, key in derived.items():
+                cipher = AES.new(_cache_cipher_key(m), AES.MODE_GCM, nonce=os.urandom(12))
+                ciphertext, tag = cipher.encrypt_and_digest(key)
+                entries[_mnemonic_id(m)] = base64.b64encode(cipher.nonce + tag + ciphertext).decode()
+            tmp = self.cache_file.with_suffix(".tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.cache_file)
+
+
+_keyrings = {}
+
+
+def get_keyring(mnemonic_file, cache_file=None):
+    """
+    One Keyring per mnemonic file per process.
+    """
+    path = str(Path(mnemonic_file).resolve())
+    if path not in _keyrings:
+        _keyrings[path] = Keyring(path, cache_file)
+    return _keyrings[path]
+
+
+def warden_key():
+    """
+    The relayer's private key: BRIDGE_WARDEN_KEY, or the account at line
+    BRIDGE_WARDEN_KEY_ID (default 0) of BRIDGE_WARDEN_MNEMONIC, or the
+    default development key.
+    """
+    if os.environ.get("BRIDGE_WARDEN_KEY"):
+        return os.environ["BRIDGE_WARDEN_KEY"]
+    if os.environ.get("BRIDGE_WARDEN_MNEMONIC"):
+        keyring = get_keyring(os.environ["BRIDGE_WARDEN_MNEMONIC"])
+        return keyring.get(int(os.environ.get("BRIDGE_WARDEN_KEY_ID", "0"))).key.hex()
+    return default_warden_key
@@ -0,0 +1,175 @@
+"""
+Structured, non-blocking logging for the relayer.
+
+Records are JSON lines with fixed fields:
+
+    {"ts": 1718000000.123, "level": "INFO", "logger": "bridge.relay", "msg": "wrap sent",
+     "chain": "destination", "event": "Deposit", "txHash": "0x...", "stage": "relay", "duration": 0.84}
+
+Fields that don't apply are left out.  Pass them with
+log.info("...", extra=fields(chain=..., txHash=...)).
+
+The calling thread only builds a LogRecord and puts it on a queue.  A
+background listener formats the message and writes it, so a slow stdout pipe
+or a large event never stalls scanning or relaying.  A message's %-arguments
+are also formatted by the listener, which means an event passed as an
+argument is only turned into a string if the record is actually written.
+
+Levels can be set per module:
+
+    BRIDGE_LOG_LEVEL=INFO                       # default level
+    BRIDGE_LOG_LEVELS=event_stream=DEBUG,preflight=WARNING
+    BRIDGE_LOG_SAMPLE=0.01                      # keep 1% of DEBUG records
+    BRIDGE_LOG_FILE=relayer.jsonl               # default: stdout
+
+configure() applies the same settings from code (bridge_cli does so for
+--log-level and friends).  get_logger() configures with the environment
+defaults the first time it is called.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+FIELDS = ("chain", "event", "txHash", "stage", "duration")
+ROOT = "bridge"
+
+_listener = None
+_lock = threading.Lock()
+_sample = 1.0  # fraction of DEBUG records kept
+
+
+def fields(chain=None, event=None, txHash=None, stage=None, duration=None):
+    """
+    `extra` dict for the fixed record fields; None values are omitted.
+    """
+    out = {}
+    for name, value in (("chain", chain), ("event", event), ("txHash", txHash), ("stage", stage),
+                        ("duration", duration)):
+        if value is not None:
+            out[name] = value
+    return out
+
+
+class JSONLineFormatter(logging.Formatter):
+    def format(self, record):
+        out = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+               "msg": record.getMessage()}
+        for name in FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                out[name] = round(value, 4) if name == "duration" else value
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+class BridgeLogger(logging.Logger):
+    """
+    Logger that samples DEBUG calls before a LogRecord is built and skips the
+    stack walk logging does to find the calling line (records don't carry it).
+    """
+
+    def debug(self, msg, *args, **kwargs):
+        if self.isEnabledFor(logging.DEBUG) and (_sample >= 1 or random.random() < _sample):
+            self._log(logging.DEBUG, msg, args, **kwargs)
+
+    def findCaller(self, stack_info=False, stacklevel=1):
+        return "(unknown file)", 0, "(unknown function)", None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue the record as is.  The stock prepare() formats the message in the
+    calling thread, which is the work this module moves off the hot path.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _LineHandler(logging.StreamHandler):
+    """
+    StreamHandler that flushes only when the queue is drained, not per record.
+    """
+
+    def __init__(self, stream, q):
+        super().__init__(stream)
+        self.q = q
+
+    def flush(self):
+        if self.q.empty():
+            super().flush()
+
+
+def parse_levels(spec):
+    levels = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, level = part.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure(level=None, levels=None, sample=None, path=None, stream=None):
+    """
+    (Re)install the queue handler on the "bridge" logger.  Arguments default
+    to the BRIDGE_LOG_* environment variables.  levels maps module names
+    (e.g. "event_stream") to level names.
+    """
+    global _listener, _sample
+    with _lock:
+        stop()
+        level = level or os.environ.get("BRIDGE_LOG_LEVEL", "INFO")
+        levels = levels if levels is not None else parse_levels(os.environ.get("BRIDGE_LOG_LEVELS"))
+        _sample = sample if sample is not None else float(os.environ.get("BRIDGE_LOG_SAMPLE", "1"))
+        path = path or os.environ.get("BRIDGE_LOG_FILE")
+
+        root = logging.getLogger(ROOT)
+        root.handlers.clear()
+        root.propagate = False
+        root.setLevel(level.upper())
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith(ROOT + "."):
+                logging.getLogger(name).setLevel(logging.NOTSET)
+        for name, module_level in levels.items():
+            logging.getLogger(f"{ROOT}.{name}").setLevel(module_level)
+
+        q = queue.SimpleQueue()
+        root.addHandler(_QueueHandler(q))
+
+        out = _LineHandler(stream or (open(path, "a") if path else sys.stdout), q)
+        out.setFormatter(JSONLineFormatter())
+        _listener = logging.handlers.QueueListener(q, out)
+        _listener.start()
+
+
+def stop():
+    """
+    Flush and stop the background writer.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            logging.StreamHandler.flush(h)
+        _listener = None
+
+
+def get_logger(module):
+    """
+    Logger "bridge.<module>"; the first call configures logging from the environment.
+    """
+    if _listener is None:
+        configure()
+    logger = logging.getLogger(f"{ROOT}.{module}")
+    logger.__class__ = BridgeLogger
+    return logger
+
+
+atexit.register(stop)
@@ -0,0 +1,166 @@
+"""
+Chains and bridge routes, read from chains.json.
+
+    {
+      "chains": {
+        "avax": {"rpc": "https://...", "chain_id": 43113, "poa": true, "confirmations": 1, "block_time": 2.0},
+        ...
+      },
+      "routes": [
+        {"name": "avax-bsc", "source": "avax", "destination": "bsc"},
+        {"name": "avax-sepolia", "source": "avax", "destination": "sepolia",
+         "source_address": "0x...", "destination_address": "0x..."}
+      ],
+      "scheduler": {...}    # optional relay ordering policy, see relay_scheduler.py
+    }
+
+A route is one Source/Destination contract pair.  Its contract addresses
+default to contract_info.json, and ABIs always come from there (every route
+runs the same contracts).  Adding a chain or a route only means editing
+chains.json.  BRIDGE_CHAINS points at a different file, and
+BRIDGE_RPC_<CHAIN> still overrides a chain's endpoint.  The first route is the
+default one, used by bridge.scanBlocks and the single-route commands.
+
+Only the standard library is imported here, so the scan path stays cheap.
+"""
+import copy
+import json
+import os
+from pathlib import Path
+
+config_file = "chains.json"
+
+# Used when chains.json is missing: the original avax -> bsc deployment
+DEFAULT_CONFIG = {
+    "chains": {
+        "avax": {"rpc": "https://api.avax-test.network/ext/bc/C/rpc", "chain_id": 43113, "poa": True,
+                 "confirmations": 1, "block_time": 2.0},
+        "bsc": {"rpc": "https://data-seed-prebsc-1-s1.binance.org:8545/", "chain_id": 97, "poa": True,
+                "confirmations": 1, "block_time": 3.0},
+    },
+    "routes": [{"name": "avax-bsc", "source": "avax", "destination": "bsc"}],
+}
+CHAIN_DEFAULTS = {"chain_id": None, "poa": False, "confirmations": 1, "block_time": 2.0}
+
+_cache = {}
+
+
+class Route:
+    """
+    One Source (on chains["source"]) / Destination (on chains["destination"]) pair.
+    """
+
+    def __init__(self, name, source, destination, source_address=None, destination_address=None):
+        self.name = name
+        self.chains = {"source": source, "destination": destination}
+        self.addresses = {"source": source_address, "destination": destination_address}
+
+    @property
+    def source(self):
+        return self.chains["source"]
+
+    @property
+    def destination(self):
+        return self.chains["destination"]
+
+    def target(self, side):
+        """
+        Chain name that events seen on `side` are relayed to.
+        """
+        return self.chains["destination" if side == "source" else "source"]
+
+    def contract_info(self, side):
+        """
+        {"address", "abi"} of this route's contract on `side` (as bridge.getContractInfo).
+        """
+        info = dict(_contract_info()[side])
+        if self.addresses[side]:
+            info["address"] = self.addresses[side]
+        return info
+
+    def contracts(self):
+        """
+        abi_artifact contracts dict with this route's addresses.
+        """
+        import abi_artifact
+
+        contracts = abi_artifact.load_artifact()
+        if not any(self.addresses.values()):
+            return contracts
+        contracts = copy.deepcopy(contracts)
+        for side, address in self.addresses.items():
+            if address:
+                contracts[side]["address"] = address
+        return contracts
+
+    def __repr__(self):
+        return f"Route({self.name}: {self.source} -> {self.destination})"
+
+
+def _contract_info():
+    with Path(__file__).with_name("contract_info.json").open("r") as f:
+        return json.load(f)
+
+
+def config_path():
+    return Path(os.environ.get("BRIDGE_CHAINS") or Path(__file__).with_name(config_file))
+
+
+def load_config():
+    """
+    {"chains": {name: settings}, "routes": {name: Route}, "scheduler": section or None},
+    re-read when chains.json changes.
+    """
+    path = config_path()
+    try:
+        key = (str(path), path.stat().st_mtime_ns)
+    except OSError:
+        key = None
+    if key not in _cache:
+        raw = DEFAULT_CONFIG
+        if key is not None:
+            with path.open("r") as f:
+                raw = json.load(f)
+        chains = {name: dict(CHAIN_DEFAULTS, **settings) for name, settings in raw["chains"].items()}
+        routes = {}
+        for r in raw["routes"]:
+            for side in ("source", "destination"):
+                if r[side] not in chains:
+                    raise ValueError(f"Route {r['name']}: unknown {side} chain {r[side]!r} in {path}")
+            routes[r["name"]] = Route(r["name"], r["source"], r["destination"], r.get("source_address"),
+                                      r.get("destination_address"))
+        if not routes:
+            raise ValueError(f"No routes in {path}")
+        _cache.clear()
+        _cache[key] = {"chains": chains, "routes": routes, "scheduler": raw.get("scheduler")}
+    return _cache[key]
+
+
+def get_chain(name):
+    chains = load_config()["chains"]
+    if name not in chains:
+        raise ValueError(f"Unsupported chain: {name}")
+    return chains[name]
+
+
+def rpc_url(name):
+    """
+    RPC endpoint for a chain, overridable with BRIDGE_RPC_<CHAIN> (e.g. a local chain for testing).
+    """
+    return os.environ.get(f"BRIDGE_RPC_{name.upper()}", get_chain(name)["rpc"])
+
+
+def get_route(name=None):
+    """
+    The named route, or the default (first) one.
+    """
+    routes = load_config()["routes"]
+    if name is None:
+        return next(iter(routes.values()))
+    if name not in routes:
+        raise ValueError(f"Unknown route {name!r}, expected one of {', '.join(routes)}")
+    return routes[name]
+
+
+def get_routes(names=None):
+    return [get_route(n) for n in names] if names else list(load_config()["routes"].values())
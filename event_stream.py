@@ -0,0 +1,282 @@
+"""
+Streaming event scans.
+
+iter_logs() fetches one eth_getLogs page at a time, but a scan used to
+collect every event of its range before relaying any of them, so memory and
+time-to-first-relay grew with the range.  EventStream runs the page fetches
+in a background thread and hands decoded events over through a bounded
+queue.  The next page downloads while the current batch is being relayed.
+Once `buffer` events are waiting, the fetcher blocks until the relay stage
+catches up (backpressure).  Memory therefore depends on the buffer and page
+size, not on the range.
+
+    with EventStream(client, contracts["source"], "Deposit", a, b) as stream:
+        for batch in stream.batches(32):
+            bridge.relay_events("source", batch)
+
+scan_events() / ascan_events() are the generator and async-iterator
+equivalents of bridge.scanBlocks' event lookup, and scan_and_relay() is the
+scan loop that bridge.scanBlocks and bridge_cli use.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+import abi_artifact
+import bridge
+import bridge_log
+import profiler
+from rpc_client import RPCClient
+from sharding import event_id
+
+# The event each side of the bridge emits for the relayer to pick up
+SCAN_EVENTS = {"source": "Deposit", "destination": "Unwrap"}
+max_range = 2048  # blocks per eth_getLogs request
+default_buffer = 1024  # decoded events held between the fetcher and the relay stage
+default_batch = 32  # events handed to one relay_events / attest call
+
+_DONE = object()
+log = bridge_log.get_logger("event_stream")
+
+
+def range_logs(client, address, topic, start_block, end_block):
+    """
+    Raw logs in [start_block, end_block], fetched max_range blocks at a time.
+    """
+    for lo in range(start_block, end_block + 1, max_range):
+        hi = min(end_block, lo + max_range - 1)
+        yield from client.get_logs(address, [topic], lo, hi)
+
+
+def iter_logs(client, contract, event, start_block, end_block, strategy="range", chain=None):
+    """
+    Decoded events in [start_block, end_block].  The "bloom" strategy checks
+    header logsBloom values first and only fetches logs for matching blocks.
+    Fetching and decoding are tagged as the scan and decode profiler stages.
+    """
+    spec = contract["events"][event]
+    if strategy == "bloom":
+        import bloom_scan
+
+        logs = bloom_scan.bloom_get_logs(client, contract["address"], spec["topic"], start_block, end_block)
+    else:
+        logs = range_logs(client, contract["address"], spec["topic"], start_block, end_block)
+    profiler.set_stage("scan", chain)
+    for log in logs:
+        profiler.set_stage("decode")
+        evt = abi_artifact.decode_log(event, spec, log)
+        profiler.set_stage("scan")
+        yield evt
+
+
+class PartialScan(Exception):
+    """
+    A scan stopped by a failed page fetch after relaying part of its range.
+    `block` is the last block whose events were all relayed (start_block - 1
+    if none were), so the next scan resumes after it instead of relaying the
+    earlier batches again.
+    """
+
+    def __init__(self, error, block):
+        super().__init__(f"{error} (relayed through block {block})")
+        self.error = error
+        self.block = block
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+class EventStream:
+    """
+    Decoded events of one contract/event in [start_block, end_block],
+    prefetched by a background thread into a queue of at most `buffer`
+    events.  Iterate it for single events, or use batches() to relay in
+    groups.  close() (or leaving the with block) stops the fetcher early.
+    """
+
+    def __init__(self, client, contract, event, start_block, end_block, strategy="range", buffer=default_buffer,
+                 chain=None):
+        self.queue = queue.Queue(maxsize=max(1, buffer))
+        self.stopped = threading.Event()
+        self.finished = False
+        self.failure = None
+        self.thread = threading.Thread(target=self._produce,
+                                       args=(client, contract, event, start_block, end_block, strategy, chain),
+                                       daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, client, contract, event, start_block, end_block, strategy, chain):
+        with profiler.stage("scan", chain):
+            try:
+                for evt in iter_logs(client, contract, event, start_block, end_block, strategy, chain):
+                    if not self._put(evt):
+                        return
+            except Exception as e:
+                self._put(_Failure(e))
+                return
+            self._put(_DONE)
+
+    def _check(self, item):
+        if item is _DONE:
+            self.finished = True
+            return False
+        if isinstance(item, _Failure):
+            self.finished = True
+            self.failure = item.error
+            return False
+        return True
+
+    def take(self, max_items):
+        """
+        Wait for at least one event and return up to max_items of the ones
+        already fetched.  Returns [] at the end of the range.
+        """
+        if self.finished:
+            if self.failure is not None:
+                failure, self.failure = self.failure, None
+                raise failure
+            return []
+        out = []
+        item = self.queue.get()
+        while self._check(item):
+            out.append(item)
+            if len(out) >= max_items:
+                break
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+        if not out and self.failure is not None:
+            failure, self.failure = self.failure, None
+            raise failure
+        return out
+
+    def batches(self, size=default_batch):
+        while True:
+            batch = self.take(size)
+            if not batch:
+                return
+            yield batch
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _chain_name(chain):
+    return bridge.source_chain if chain == "source" else bridge.destination_chain
+
+
+def _open(chain, client, contracts, start_block, end_block):
+    if chain not in SCAN_EVENTS:
+        raise ValueError(f"Invalid chain: {chain}")
+    client = client or RPCClient(bridge.get_rpc_url(_chain_name(chain)))
+    contracts = contracts or abi_artifact.load_artifact()
+    if end_block is None:
+        end_block = client.block_number()
+    if start_block is None:
+        start_block = max(0, end_block - 4)
+    return client, contracts, start_block, end_block
+
+
+def scan_events(chain, start_block=None, end_block=None, client=None, contracts=None, strategy="range",
+                buffer=default_buffer):
+    """
+    Generator of the Deposit (source) or Unwrap (destination) events in a
+    block range, yielded as pages arrive.  Defaults to the last 5 blocks.
+    """
+    client, contracts, start_block, end_block = _open(chain, client, contracts, start_block, end_block)
+    with EventStream(client, contracts[chain], SCAN_EVENTS[chain], start_block, end_block, strategy,
+                     buffer, chain) as stream:
+        yield from stream
+
+
+async def ascan_events(chain, start_block=None, end_block=None, client=None, contracts=None, strategy="range",
+                       buffer=default_buffer, chunk=256):
+    """
+    Async-iterator version of scan_events().  The fetcher still runs in its
+    own thread; the event loop only waits for chunks of decoded events.
+    """
+    client, contracts, start_block, end_block = await asyncio.to_thread(_open, chain, client, contracts,
+                                                                        start_block, end_block)
+    stream = EventStream(client, contracts[chain], SCAN_EVENTS[chain], start_block, end_block, strategy, buffer,
+                         chain)
+    try:
+        while True:
+            events = await asyncio.to_thread(stream.take, chunk)
+            if not events:
+                return
+            for evt in events:
+                yield evt
+    finally:
+        stream.close()
+
+
+def scan_and_relay(chain, client, contracts, start_block, end_block, relay=True, strategy="range", attestor=None,
+                   batch_size=default_batch, buffer=default_buffer, relayed=None):
+    """
+    Relay (or, with an attestor, attest) the events in [start_block,
+    end_block] batch by batch while later pages are still being fetched.
+    Returns the number of events found; the relay hashes (None for a failed
+    relay) are appended to `relayed` if given.  If a page fetch fails, raises
+    PartialScan with the last block that was fully relayed.
+    """
+    event = SCAN_EVENTS[chain]
+    log.info("scanning blocks %s to %s", start_block, end_block, extra=bridge_log.fields(chain, event, stage="scan"))
+    found = 0
+    done = start_block - 1  # pages arrive in block order, so every block up to the last relayed event is complete
+    start = time.perf_counter()
+    with EventStream(client, contracts[chain], event, start_block, end_block, strategy, buffer, chain) as stream:
+        batches = stream.batches(batch_size)
+        while True:
+            try:
+                batch = next(batches, None)
+            except Exception as e:
+                raise PartialScan(e, done) from e
+            if batch is None:
+                break
+            found += len(batch)
+            last = batch[-1].blockNumber
+            if log.isEnabledFor(logging.DEBUG):
+                for evt in batch:
+                    log.debug("found %r", evt, extra=bridge_log.fields(chain, event, evt.transactionHash, "scan"))
+            if relay and attestor is not None:
+                if bridge.transfers is not None:
+                    # Transfers a relaying scanner already sent are not attested as well
+                    sent = bridge.transfers.relayed(chain, batch)
+                    batch = [evt for evt in batch if event_id(chain, evt) not in sent]
+                attestor.attest(chain, batch)
+                if bridge.transfers is not None:
+                    bridge.transfers.seen(chain, batch)
+                    bridge.transfers.attested(chain, batch)
+            elif relay:
+                hashes = bridge.relay_events(chain, batch)
+                if relayed is not None:
+                    relayed.extend(hashes)
+            done = last
+    log.info("found %s events in blocks %s to %s", found, start_block, end_block,
+             extra=bridge_log.fields(chain, event, stage="scan", duration=time.perf_counter() - start))
+    return found
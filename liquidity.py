@@ -0,0 +1,179 @@
+"""
+Locked-liquidity ledger for Source.
+
+Source.withdraw(token, ...) reverts if Source holds less of `token` than the
+amount, and asking balanceOf per relay costs an RPC call.  LiquidityLedger
+keeps Source's balance of every token in memory instead:
+
+- sync() applies Deposit (+amount) and Withdrawal (-amount) events since the
+  last sync, in one eth_getLogs call per page.
+- verify() resets every balance from the chain with one batch of
+  balanceOf(Source) eth_calls, and logs any drift (e.g. tokens sent to
+  Source directly).  sync() runs it every `verify_interval` seconds.
+- reserve(token, amount, tid) is the O(1) check before submitting the
+  withdraw of transfer `tid`.  The amount is held against the balance, so
+  queued withdrawals can't oversubscribe a token, until withdrawn() reports
+  the block it was mined in and sync() has passed that block (or until
+  release() is called because the withdraw failed).  Withdrawal events
+  carry no transfer id, so a synced Withdrawal never settles another
+  relay's reservation.  A withdraw that would take the available liquidity
+  below `low_water` of the balance logs a warning; one that doesn't fit is
+  refused, for the caller to hold.
+
+A token the ledger hasn't seen yet costs one balanceOf call on first use.
+"""
+import threading
+import time
+
+import bridge_log
+from abi_artifact import keccak
+
+log = bridge_log.get_logger("liquidity")
+
+max_range = 2048  # blocks per eth_getLogs request
+default_verify_interval = 300  # seconds between balanceOf reconciliations
+default_low_water = 0.1  # warn when a withdraw leaves less than this share of the balance available
+DEPOSIT_TOPIC = "0x" + keccak(b"Deposit(address,address,uint256)").hex()
+WITHDRAWAL_TOPIC = "0x" + keccak(b"Withdrawal(address,address,uint256)").hex()
+BALANCE_OF = "0x" + keccak(b"balanceOf(address)")[:4].hex()
+
+
+def _topic_address(topic):
+    return "0x" + topic[-40:].lower()
+
+
+class LiquidityLedger:
+    def __init__(self, client, source, tokens=(), verify_interval=default_verify_interval,
+                 low_water=default_low_water):
+        self.client = client
+        self.source = source
+        self.verify_interval = verify_interval
+        self.low_water = low_water
+        self.lock = threading.Lock()
+        self.balances = {}  # token (lowercase) -> Source's balance
+        self.reserved = {}  # token -> total of its reservations
+        self.reservations = {}  # transfer id -> [token, amount, block its withdraw was mined in or None]
+        self.cursor = None  # last block synced
+        self.verified = 0.0
+        self.stats = {"checks": 0, "refused": 0, "balance_calls": 0}
+        for token in tokens:
+            self.balances.setdefault(token.lower(), 0)
+
+    def _balances_of(self, tokens, block="latest"):
+        params = [[{"to": t, "data": BALANCE_OF + "00" * 12 + self.source[2:].lower()}, block] for t in tokens]
+        self.stats["balance_calls"] += 1
+        return [int(r, 16) for r in self.client.batch("eth_call", params)]
+
+    # Following the chain
+
+    def verify(self):
+        """
+        Reset every balance from balanceOf at the head, in one batch.  Returns
+        {token: ledger - chain} for the tokens that had drifted.
+        """
+        head = self.client.block_number()
+        if self.cursor is not None and self.cursor < head:
+            self.sync(head, verify=False)
+        tokens = sorted(self.balances)
+        chain = dict(zip(tokens, self._balances_of(tokens, hex(head)))) if tokens else {}
+        with self.lock:
+            drift = {} if self.cursor is None else \
+                {t: self.balances.get(t, 0) - b for t, b in chain.items() if self.balances.get(t, 0) != b}
+            self.balances.update(chain)
+            self.cursor = head
+            self._settle()
+        self.verified = time.time()
+        for token, d in drift.items():
+            log.warning("ledger for %s was off by %s; reset from balanceOf", token, d,
+                        extra=bridge_log.fields(chain="source", stage="liquidity"))
+        return drift
+
+    def sync(self, head=None, verify=True):
+        """
+        Apply Deposit/Withdrawal events up to `head` (default: the chain head).
+        The first sync, and every verify_interval seconds, verifies instead.
+        """
+        if verify and (self.cursor is None or time.time() - self.verified >= self.verify_interval):
+            return self.verify()
+        head = self.client.block_number() if head is None else head
+        for lo in range(self.cursor + 1, head + 1, max_range):
+            hi = min(head, lo + max_range - 1)
+            self.apply(self.client.get_logs(self.source, [[DEPOSIT_TOPIC, WITHDRAWAL_TOPIC]], lo, hi))
+        with self.lock:
+            self.cursor = max(self.cursor, head)
+            self._settle()
+        return {}
+
+    def apply(self, logs):
+        with self.lock:
+            for entry in logs:
+                token = _topic_address(entry["topics"][1])
+                amount = int(entry["data"][:66], 16)
+                if entry["topics"][0] == DEPOSIT_TOPIC:
+                    self.balances[token] = self.balances.get(token, 0) + amount
+                else:
+                    self.balances[token] = self.balances.get(token, 0) - amount
+
+    def _settle(self):
+        # Withdraws mined by the cursor are in the balances now
+        for tid in [t for t, (_, _, block) in self.reservations.items() if block is not None and block <= self.cursor]:
+            self._drop(tid)
+
+    def _drop(self, tid):
+        token, amount, _ = self.reservations.pop(tid)
+        self.reserved[token] -= amount
+
+    # Before submitting a withdraw
+
+    def _load(self, token):
+        if token not in self.balances:
+            balance = self._balances_of([token])[0]
+            with self.lock:
+                self.balances.setdefault(token, balance)
+
+    def available(self, token):
+        token = token.lower()
+        self._load(token)
+        return self.balances[token] - self.reserved.get(token, 0)
+
+    def reserve(self, token, amount, tid):
+        """
+        Hold `amount` of `token` for the withdraw of transfer `tid` about to
+        be sent.  Returns False, and holds nothing, if Source doesn't have it.
+        """
+        token = token.lower()
+        self._load(token)
+        with self.lock:
+            self.stats["checks"] += 1
+            if tid in self.reservations:
+                return True
+            available = self.balances[token] - self.reserved.get(token, 0)
+            if amount > available:
+                self.stats["refused"] += 1
+                return False
+            self.reservations[tid] = [token, amount, None]
+            self.reserved[token] = self.reserved.get(token, 0) + amount
+            left, balance = available - amount, self.balances[token]
+        if left < self.low_water * balance:
+            log.warning("liquidity of %s low: %s of %s left after this withdraw", token, left, balance,
+                        extra=bridge_log.fields(chain="source", event="Unwrap", stage="liquidity"))
+        return True
+
+    def withdrawn(self, tid, block):
+        """
+        The withdraw of transfer `tid` was mined in `block`; its reservation
+        lasts until the ledger has synced that block.
+        """
+        with self.lock:
+            if tid in self.reservations:
+                self.reservations[tid][2] = block
+                if self.cursor is not None and block <= self.cursor:
+                    self._drop(tid)
+
+    def release(self, tid):
+        """
+        Undo reserve() for a withdraw that wasn't mined.
+        """
+        with self.lock:
+            if tid in self.reservations:
+                self._drop(tid)
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Load generator for sizing the relayer.
+
+    python loadgen.py setup --senders 50
+    python loadgen.py replay bridge_events.csv --speed 60
+    python loadgen.py synth --rate 20 --duration 300 --cv 2 --unwrap-fraction 0.3
+    python loadgen.py latency
+
+Meant for local stand-in chains running the Bridge/src contracts, with
+BRIDGE_RPC_AVAX / BRIDGE_RPC_BSC pointing at them and contract_info.json
+holding the local Source/Destination addresses.  The senders are
+deterministic accounts derived from --seed.  `setup` funds them from the
+funder key (gas, underlying tokens, Source approvals, plus wrapped tokens
+minted with Destination.wrap, so the warden key must be the funder).
+
+Each sender runs in its own thread with its own connection and local nonce
+counter, so many transfers can be in flight at once.  Every submission is
+appended to loadgen_submits.csv with the time it was scheduled, handed to
+the node and accepted.  `latency` matches those rows against the Wrap /
+Withdrawal events the relayer produced.
+"""
+import argparse
+import csv
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+import abi_artifact
+import bridge
+from abi_artifact import keccak, to_checksum_address
+from preflight import encode_static, settle_args
+from rpc_client import RPCClient
+from token_mapping import TokenIndex
+
+
+submit_log = "loadgen_submits.csv"
+ADDRESS_ZERO = "0x" + "00" * 20
+SUBMIT_FIELDS = ["scheduled", "submitted", "accepted", "chain", "event", "tx_hash", "sender", "nonce",
+                 "token", "wrapped_token", "recipient", "amount", "error"]
+
+# Average block times used to turn the block numbers in bridge_events.csv into a timeline
+BLOCK_TIMES = {"source": 2.0, "destination": 3.0}
+
+# The relay event each transfer produces on the other side
+RELAY_EVENTS = {"Deposit": ("destination", "Wrap"), "Unwrap": ("source", "Withdrawal")}
+
+
+def selector(signature):
+    return "0x" + keccak(signature.encode())[:4].hex()
+
+
+def call_data(signature, types, args):
+    return selector(signature) + encode_static(types, args).hex()
+
+
+def sender_keys(n, seed):
+    return ["0x" + keccak(f"loadgen-sender:{seed}:{i}".encode()).hex() for i in range(n)]
+
+
+def recipient_addresses(n, seed):
+    return [to_checksum_address(keccak(f"loadgen-recipient:{seed}:{i}".encode())[12:]) for i in range(n)]
+
+
+class Chain:
+    """
+    One side of the bridge: RPC endpoint, chain id and gas price.
+    """
+
+    def __init__(self, side):
+        self.side = side
+        self.url = bridge.get_rpc_url(bridge.source_chain if side == "source" else bridge.destination_chain)
+        client = RPCClient(self.url)
+        self.chain_id = int(client.call("eth_chainId"), 16)
+        self.gas_price = int(client.call("eth_gasPrice"), 16)
+        client.close()
+
+
+class SubmitLog:
+    """
+    Thread-safe CSV of submissions.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        new = not self.path.exists()
+        self.f = self.path.open("a", newline="")
+        self.writer = csv.DictWriter(self.f, fieldnames=SUBMIT_FIELDS)
+        if new:
+            self.writer.writeheader()
+        self.lock = threading.Lock()
+
+    def write(self, row):
+        with self.lock:
+            self.writer.writerow(row)
+            self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class Sender(threading.Thread):
+    """
+    A funded account submitting its jobs in order over its own connections.
+    Nonces are read once per chain and then counted locally.
+    """
+
+    def __init__(self, key, chains, log, gas=300000):
+        super().__init__(daemon=True)
+        from bridge_keyring import load_account
+
+        self.account = load_account(key)
+        self.chains = chains
+        self.log = log
+        self.gas = gas
+        self.clients = {side: RPCClient(c.url) for side, c in chains.items()}
+        self.nonces = {}
+        self.jobs = queue.Queue()
+
+    def nonce(self, side):
+        if side not in self.nonces:
+            self.nonces[side] = int(self.clients[side].call("eth_getTransactionCount",
+                                                            [self.account.address, "pending"]), 16)
+        return self.nonces[side]
+
+    def send(self, side, to, data, value=0):
+        """
+        Sign and submit one transaction.  Returns (tx_hash, nonce, submitted, accepted).
+        """
+        chain = self.chains[side]
+        nonce = self.nonce(side)
+        tx = {"nonce": nonce, "gasPrice": chain.gas_price, "gas": self.gas, "to": to, "value": value,
+              "data": data, "chainId": chain.chain_id}
+        signed = self.account.sign_transaction(tx)
+        tx_hash, raw = signed.hash.hex(), bytes(signed.rawTransaction)
+        self.nonces[side] = nonce + 1
+        submitted = time.time()
+        self.clients[side].call("eth_sendRawTransaction", ["0x" + raw.hex()])
+        return tx_hash, nonce, submitted, time.time()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            row = dict(job["meta"], scheduled=f"{job['scheduled']:.6f}", sender=self.account.address, error="")
+            try:
+                tx_hash, nonce, submitted, accepted = self.send(job["side"], job["to"], job["data"])
+                row.update(tx_hash=tx_hash, nonce=nonce, submitted=f"{submitted:.6f}", accepted=f"{accepted:.6f}")
+            except Exception as e:
+                # The nonce may or may not have been consumed; re-read it next time
+                self.nonces.pop(job["side"], None)
+                row.update(error=str(e)[:200])
+            self.log.write(row)
+            self.jobs.task_done()
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+
+
+def transfer_job(contracts, event, token, wrapped_token, recipient, amount):
+    """
+    The transaction a user sends for a Deposit or Unwrap.
+    """
+    meta = {"event": event, "token": token, "wrapped_token": wrapped_token or "", "recipient": recipient,
+            "amount": amount}
+    if event == "Deposit":
+        side, to = "source", contracts["source"]["address"]
+        data = call_data("deposit(address,address,uint256)", ["address", "address", "uint256"],
+                         [token, recipient, amount])
+    else:
+        side, to = "destination", contracts["destination"]["address"]
+        data = call_data("unwrap(address,address,uint256)", ["address", "address", "uint256"],
+                         [wrapped_token, recipient, amount])
+    return {"side": side, "to": to, "data": data, "meta": dict(meta, chain=side)}
+
+
+def wrapped_tokens(contracts, tokens):
+    """
+    Destination.wrapped_tokens(token) for each underlying token, from the
+    token-mapping index (eth_call only for tokens it doesn't know yet).
+    """
+    client = RPCClient(bridge.get_rpc_url(bridge.destination_chain))
+    index = TokenIndex.for_contracts(contracts, {"destination": client})
+    out = {token: index.wrapped_token(token) or ADDRESS_ZERO for token in tokens}
+    client.close()
+    return out
+
+
+def replay_schedule(path, speed, contracts):
+    """
+    (offset, job) pairs replaying a bridge_events.csv-style file.  Block
+    numbers are turned into times with BLOCK_TIMES, each chain relative to its
+    first event, and compressed by `speed`.
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    first = {}
+    for row in rows:
+        side = "source" if row["event"] == "Deposit" else "destination"
+        first[side] = min(first.get(side, int(row["block_number"])), int(row["block_number"]))
+    schedule = []
+    for row in rows:
+        side = "source" if row["event"] == "Deposit" else "destination"
+        offset = (int(row["block_number"]) - first[side]) * BLOCK_TIMES[side] / speed
+        if row["event"] == "Deposit":
+            job = transfer_job(contracts, "Deposit", row["token"], None, row["recipient"], int(row["amount"]))
+        else:
+            job = transfer_job(contracts, "Unwrap", row["underlying_token"], row["wrapped_token"], row["to"],
+                               int(row["amount"]))
+        schedule.append((offset, job))
+    return sorted(schedule, key=lambda s: s[0])
+
+
+def synthetic_schedule(contracts, rate, duration, cv, token_weights, wrapped, recipients, zipf, unwrap_fraction,
+                       amount_min, amount_max, seed):
+    """
+    (offset, job) pairs for synthetic traffic.
+
+    Inter-arrival times are gamma distributed with mean 1/rate and
+    coefficient of variation cv (cv=1 is a Poisson process, larger is
+    burstier).  Tokens are drawn by weight, recipients from a Zipf(zipf)
+    distribution and amounts log-uniformly from [amount_min, amount_max].
+    """
+    rng = random.Random(seed)
+    tokens = list(token_weights)
+    weights = [token_weights[t] for t in tokens]
+    recipient_weights = [1 / (k + 1) ** zipf for k in range(len(recipients))]
+    shape = 1 / cv ** 2
+    schedule = []
+    t = 0.0
+    while True:
+        t += rng.gammavariate(shape, 1 / (rate * shape))
+        if t > duration:
+            return schedule
+        token = rng.choices(tokens, weights)[0]
+        recipient = rng.choices(recipients, recipient_weights)[0]
+        amount = int(amount_min * (amount_max / amount_min) ** rng.random())
+        if rng.random() < unwrap_fraction:
+            job = transfer_job(contracts, "Unwrap", token, wrapped[token], recipient, amount)
+        else:
+            job = transfer_job(contracts, "Deposit", token, None, recipient, amount)
+        schedule.append((t, job))
+
+
+def run_schedule(schedule, senders):
+    """
+    Hand each job to the next sender at its scheduled time.
+    """
+    start = time.time()
+    lag = 0.0
+    for i, (offset, job) in enumerate(schedule):
+        delay = start + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            lag = max(lag, -delay)
+        job["scheduled"] = start + offset
+        senders[i % len(senders)].jobs.put(job)
+    for s in senders:
+        s.jobs.join()
+    elapsed = time.time() - start
+    print(f"Submitted {len(schedule)} transfers in {elapsed:.1f}s ({len(schedule) / max(elapsed, 1e-9):.1f}/s), "
+          f"max dispatch lag {1000 * lag:.0f} ms")
+
+
+def start_senders(args, chains, log):
+    senders = [Sender(k, chains, log, gas=args.gas) for k in sender_keys(args.senders, args.seed)]
+    for s in senders:
+        s.start()
+    return senders
+
+
+def stop_senders(senders):
+    for s in senders:
+        s.jobs.put(None)
+    for s in senders:
+        s.join()
+        s.close()
+
+
+def parse_tokens(spec):
+    """
+    "0xA:3,0xB:1" -> {"0xA": 3.0, "0xB": 1.0}; defaults to the source tokens in erc20s.csv.
+    """
+    if not spec:
+        with open(Path(__file__).with_name("erc20s.csv"), newline="") as f:
+            return {row["address"]: 1.0 for row in csv.DictReader(f) if row["chain"] == bridge.source_chain}
+    out = {}
+    for item in spec.split(","):
+        token, _, weight = item.partition(":")
+        out[to_checksum_address(bytes.fromhex(token[2:]))] = float(weight or 1)
+    return out
+
+
+def cmd_setup(args, contracts, chains):
+    """
+    Fund every sender from the funder key: gas on both chains, underlying
+    tokens, an unlimited Source approval and wrapped tokens for unwraps.
+    """
+    import bridge_keyring
+
+    tokens = list(parse_tokens(args.tokens))
+    wrapped = wrapped_tokens(contracts, tokens)
+    funder = Sender(args.funder_key or bridge.warden_key(), chains, None, gas=args.gas)
+    keys = sender_keys(args.senders, args.seed)
+    max_uint = 2 ** 256 - 1
+    for i, key in enumerate(keys):
+        address = bridge_keyring.load_account(key).address
+        for side in chains:
+            funder.send(side, address, "0x", value=int(args.fund_native * 10 ** 18))
+        for token in tokens:
+            funder.send("source", token, call_data("transfer(address,uint256)", ["address", "uint256"],
+                                                   [address, args.fund_tokens]))
+            # Each mint needs its own transfer id: Destination.wrap settles an id only once
+            mint_id = keccak(f"loadgen-fund:{address}:{token}:{time.time()}".encode())
+            wrap = contracts["destination"]["functions"]["wrap"]
+            funder.send("destination", contracts["destination"]["address"],
+                        wrap["selector"] + encode_static(wrap["inputs"], settle_args(
+                            wrap["inputs"], mint_id, [token, address, args.fund_tokens])).hex())
+        print(f"Funded sender {i} {address}")
+
+    # Approvals are sent by the senders themselves once they have gas
+    for key in keys:
+        sender = Sender(key, chains, None, gas=args.gas)
+        for token in tokens:
+            sender.send("source", token, call_data("approve(address,uint256)", ["address", "uint256"],
+                                                   [contracts["source"]["address"], max_uint]))
+        sender.close()
+    funder.close()
+    print(f"Set up {len(keys)} senders for {len(tokens)} tokens")
+
+
+def cmd_replay(args, contracts, chains):
+    schedule = replay_schedule(args.file, args.speed, contracts)
+    log = SubmitLog(args.out)
+    senders = start_senders(args, chains, log)
+    try:
+        run_schedule(schedule, senders)
+    finally:
+        stop_senders(senders)
+        log.close()
+
+
+def cmd_synth(args, contracts, chains):
+    token_weights = parse_tokens(args.tokens)
+    wrapped = wrapped_tokens(contracts, list(token_weights)) if args.unwrap_fraction > 0 else {}
+    schedule = synthetic_schedule(contracts, args.rate, args.duration, args.cv, token_weights, wrapped,
+                                  recipient_addresses(args.recipients, args.seed), args.zipf, args.unwrap_fraction,
+                                  args.amount_min, args.amount_max, args.seed)
+    log = SubmitLog(args.out)
+    senders = start_senders(args, chains, log)
+    try:
+        run_schedule(schedule, senders)
+    finally:
+        stop_senders(senders)
+        log.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+def cmd_latency(args, contracts, chains):
+    """
+    Match submitted transfers to the relay events they caused and report
+    submit -> relay-block latency.  Transfers with the same (token,
+    recipient, amount) are matched first-in first-out.
+    """
+    with open(args.out, newline="") as f:
+        rows = [r for r in csv.DictReader(f) if not r["error"]]
+    pending = {}
+    for r in sorted(rows, key=lambda r: float(r["submitted"])):
+        relay_side, relay_event = RELAY_EVENTS[r["event"]]
+        key = (relay_event, r["token"].lower(), r["recipient"].lower(), int(r["amount"]))
+        pending.setdefault(key, []).append(float(r["submitted"]))
+
+    latencies = {"Wrap": [], "Withdrawal": []}
+    for relay_side, relay_event in RELAY_EVENTS.values():
+        client = RPCClient(chains[relay_side].url)
+        spec = contracts[relay_side]["events"][relay_event]
+        end = client.block_number()
+        logs = client.get_logs(contracts[relay_side]["address"], [spec["topic"]], max(0, end - args.blocks), end)
+        blocks = sorted({int(log["blockNumber"], 16) for log in logs})
+        headers = client.batch("eth_getBlockByNumber", [[hex(b), False] for b in blocks]) if blocks else []
+        timestamps = {int(h["number"], 16): int(h["timestamp"], 16) for h in headers}
+        for log in logs:
+            evt = abi_artifact.decode_log(relay_event, spec, log)
+            if relay_event == "Wrap":
+                key = (relay_event, evt.args["underlying_token"].lower(), evt.args["to"].lower(), evt.args["amount"])
+            else:
+                key = (relay_event, evt.args["token"].lower(), evt.args["recipient"].lower(), evt.args["amount"])
+            if pending.get(key):
+                latencies[relay_event].append(timestamps[evt.blockNumber] - pending[key].pop(0))
+        client.close()
+
+    unmatched = sum(len(v) for v in pending.values())
+    for relay_event, values in latencies.items():
+        if values:
+            print(f"{relay_event}: {len(values)} relayed, latency p50 {percentile(values, 50):.1f}s "
+                  f"p90 {percentile(values, 90):.1f}s p99 {percentile(values, 99):.1f}s max {max(values):.1f}s")
+    print(f"{unmatched} submitted transfers not relayed yet (in the last {args.blocks} blocks)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bridge load generator")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--gas", type=int, default=300000)
+    parser.add_argument("--out", default=submit_log, help="submission log")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("setup", help="fund the sender accounts")
+    p.add_argument("--funder-key", help="defaults to the warden key")
+    p.add_argument("--tokens", help="token:weight list (default: erc20s.csv)")
+    p.add_argument("--fund-native", type=float, default=1.0, help="native coin per sender per chain")
+    p.add_argument("--fund-tokens", type=int, default=10 ** 24, help="underlying and wrapped tokens per sender")
+    p.set_defaults(func=cmd_setup)
+
+    p = sub.add_parser("replay", help="replay a bridge_events.csv-style file")
+    p.add_argument("file", nargs="?", default=str(Path(__file__).with_name("bridge_events.csv")))
+    p.add_argument("--speed", type=float, default=1.0, help="time compression factor")
+    p.set_defaults(func=cmd_replay)
+
+    p = sub.add_parser("synth", help="generate synthetic traffic")
+    p.add_argument("--rate", type=float, default=10, help="transfers per second")
+    p.add_argument("--duration", type=float, default=60, help="seconds")
+    p.add_argument("--cv", type=float, default=1.0, help="inter-arrival coefficient of variation (burstiness)")
+    p.add_argument("--tokens", help="token:weight list (default: erc20s.csv, equal weights)")
+    p.add_argument("--recipients", type=int, default=100)
+    p.add_argument("--zipf", type=float, default=1.0, help="recipient popularity skew (0 = uniform)")
+    p.add_argument("--unwrap-fraction", type=float, default=0.0)
+    p.add_argument("--amount-min", type=int, default=10)
+    p.add_argument("--amount-max", type=int, default=10 ** 6)
+    p.set_defaults(func=cmd_synth)
+
+    p = sub.add_parser("latency", help="match submissions to relay events")
+    p.add_argument("--blocks", type=int, default=5000, help="how far back to look for relay events")
+    p.set_defaults(func=cmd_latency)
+
+    args = parser.parse_args(argv)
+    contracts = abi_artifact.load_artifact()
+    chains = {side: Chain(side) for side in ("source", "destination")}
+    args.func(args, contracts, chains)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Pre-flight simulation of queued relays.
+
+Before anything is signed, every queued wrap/withdraw is simulated with one
+batched eth_estimateGas against pending state.  Relays that would revert are
+classified from the custom errors and revert reasons in Source.sol /
+Destination.sol and moved to a hold queue instead of burning gas and a nonce;
+the gas estimate of the ones that pass is handed to send_transaction, so a
+valid relay makes no extra round trip compared to estimating gas itself.
+
+Each relay is simulated alone, so withdraws of one token that fit Source's
+balance one at a time could still overdraw it together.  For a batch of
+withdraws, Source's balance of each token is read in one more batch of
+balanceOf calls and drawn down in batch order; a withdraw that no longer
+fits is held as insufficient_liquidity.
+
+Held relays that may pass later (liquidity arriving, a token being
+registered) are handed back by HoldQueue.retry after `retry_after` seconds
+and pre-flighted again on a later poll.
+"""
+import json
+import threading
+import time
+from pathlib import Path
+
+import abi_artifact
+import bridge_log
+from sharding import event_id, transfer_id
+
+
+held_relays = "held_relays.jsonl"
+retry_after = 60  # seconds before a held relay is pre-flighted again
+BALANCE_OF = "0x" + abi_artifact.keccak(b"balanceOf(address)")[:4].hex()
+log = bridge_log.get_logger("preflight")
+
+# Revert reasons from Bridge/src and the OpenZeppelin contracts they call
+REVERT_REASONS = {
+    "Cannot wrap an unregistered token": "unregistered_token",
+    "Cannot deposit an unregistered token": "unregistered_token",
+    "Cannot unwrap an unregistered token": "unregistered_token",
+    "Cannot deposit to 0 address": "zero_recipient",
+    "Cannot unwrap to 0 address": "zero_recipient",
+    "Cannot mint 0": "zero_amount",
+    "Cannot deposit 0": "zero_amount",
+    "ERC20: transfer amount exceeds balance": "insufficient_liquidity",
+    "is missing role": "not_warden",
+}
+
+ERROR_STRING_SELECTOR = "08c379a0"  # Error(string)
+
+# Custom errors raised by Source.withdraw / Destination.wrap
+CUSTOM_ERRORS = {
+    "ZeroAmount()": "zero_amount",
+    "ZeroRecipient()": "zero_recipient",
+    "UnregisteredToken(address)": "unregistered_token",
+    "NotWarden(address)": "not_warden",
+    "AlreadyClaimed(bytes32)": "already_settled",
+}
+CUSTOM_ERROR_SELECTORS = {abi_artifact.keccak(sig.encode())[:4].hex(): sig for sig in CUSTOM_ERRORS}
+
+# Holds no later pre-flight can lift; relays held for anything else are retried
+FINAL_CATEGORIES = {"zero_amount", "zero_recipient", "already_settled"}
+
+
+def settle_args(inputs, tid, args):
+    """
+    wrap/withdraw arguments for a function with these ABI input types: the
+    transfer id goes first on contracts that settle each transfer once
+    (Bridge/src), and is left out on ones deployed before that.
+    """
+    if len(inputs) == len(args) + 1 and inputs[0] == "bytes32":
+        return [tid] + args
+    return args
+
+
+def relay_call(chain, evt, contracts):
+    """
+    The (target contract, function, args) that relays a Deposit/Unwrap event.
+    """
+    if chain == "source":
+        target, function, args = "destination", "wrap", [evt.args["token"], evt.args["recipient"], evt.args["amount"]]
+    else:
+        target, function, args = "source", "withdraw", [evt.args["underlying_token"], evt.args["to"],
+                                                        evt.args["amount"]]
+    return target, function, settle_args(contracts[target]["functions"][function]["inputs"], transfer_id(evt), args)
+
+
+def encode_static(types, args):
+    out = []
+    for typ, value in zip(types, args):
+        if typ == "address":
+            out.append(bytes(12) + bytes.fromhex(value[2:]))
+        elif typ.startswith("uint"):
+            out.append(value.to_bytes(32, "big"))
+        elif typ == "bytes32":
+            out.append(bytes(value))
+        else:
+            raise TypeError(f"Unsupported relay argument type {typ}")
+    return b"".join(out)
+
+
+def revert_data(error):
+    data = error.get("data")
+    if isinstance(data, dict):  # some nodes nest it
+        data = data.get("data")
+    return data if isinstance(data, str) else ""
+
+
+def decode_revert(error):
+    """
+    Best-effort revert reason from a JSON-RPC error: the Error(string) message,
+    or the signature of a known custom error.
+    """
+    data = revert_data(error)
+    if data[2:10] in CUSTOM_ERROR_SELECTORS:
+        return CUSTOM_ERROR_SELECTORS[data[2:10]]
+    if data[2:10] == ERROR_STRING_SELECTOR:
+        raw = bytes.fromhex(data[10:])
+        length = int.from_bytes(raw[32:64], "big")
+        return raw[64:64 + length].decode(errors="replace")
+    return error.get("message", "")
+
+
+def is_revert(error):
+    message = str(error.get("message", "")).lower()
+    selector = revert_data(error)[2:10]
+    return error.get("code") == 3 or "revert" in message or \
+        selector == ERROR_STRING_SELECTOR or selector in CUSTOM_ERROR_SELECTORS
+
+
+def classify(reason):
+    if reason in CUSTOM_ERRORS:
+        return CUSTOM_ERRORS[reason]
+    for text, category in REVERT_REASONS.items():
+        if text in reason:
+            return category
+    return "reverted"
+
+
+class HoldQueue:
+    """
+    Relays that failed pre-flight, appended to held_relays.jsonl for review.
+    The ones a later pre-flight may pass also wait in memory for retry().
+    """
+
+    def __init__(self, path=None, retry_after=retry_after):
+        self.path = Path(path) if path else Path(__file__).with_name(held_relays)
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.waiting = {}  # (route, chain) -> {event id: (evt, held at)}
+
+    def add(self, chain, evt, category, reason, route=None):
+        tx_hash = evt.transactionHash if isinstance(evt.transactionHash, str) else evt.transactionHash.hex()
+        record = {
+            "time": time.time(),
+            "chain": chain,
+            "event": evt.event,
+            "transactionHash": tx_hash,
+            "logIndex": evt.logIndex,
+            "args": {k: v for k, v in evt.args.items()},
+            "category": category,
+            "reason": reason,
+        }
+        with self.lock:
+            with self.path.open("a") as f:
+                f.write(json.dumps(record) + "\n")
+            if category not in FINAL_CATEGORIES:
+                self.waiting.setdefault((route, chain), {})[event_id(chain, evt)] = (evt, record["time"])
+
+    def retry(self, chain, route=None, now=None):
+        """
+        Take back the held relays of `chain` (on `route`) that have waited
+        retry_after seconds, oldest first, to be pre-flighted again.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            waiting = self.waiting.get((route, chain), {})
+            due = [eid for eid, (_, at) in waiting.items() if now - at >= self.retry_after]
+            return [waiting.pop(eid)[0] for eid in due]
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(w) for w in self.waiting.values())
+
+    def load(self):
+        if not self.path.exists():
+            return []
+        with self.path.open("r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def source_balances(client, source, tokens):
+    """
+    {token: Source's balance at pending state}, in one batch of balanceOf calls.
+    """
+    tokens = sorted(tokens)
+    params = [[{"to": t, "data": BALANCE_OF + "00" * 12 + source[2:].lower()}, "pending"] for t in tokens]
+    return dict(zip(tokens, (int(r, 16) for r in client.batch("eth_call", params)))) if tokens else {}
+
+
+def preflight(chain, events, warden, client, contracts=None, hold_queue=None, route=None):
+    """
+    Simulate relaying `events` (all seen on `chain`) in one batch.
+
+    Returns a list of (evt, gas_estimate) for relays that will succeed; the
+    rest are added to the hold queue.  If a simulation fails for a reason other
+    than a revert (e.g. the node is struggling) the relay is passed through with
+    gas_estimate None and send_transaction estimates gas itself.  Withdraws
+    are also held once the ones before them in the batch have used up
+    Source's balance of their token.
+    """
+    if not events:
+        return []
+    contracts = contracts or abi_artifact.load_artifact()
+    hold_queue = HoldQueue() if hold_queue is None else hold_queue
+
+    def hold(evt, category, reason):
+        log.warning("holding %s %s (%s: %s)", evt.event, evt.args, category, reason,
+                    extra=bridge_log.fields(chain=chain, event=evt.event, txHash=evt.transactionHash,
+                                            stage="preflight"))
+        hold_queue.add(chain, evt, category, reason, route)
+
+    params = []
+    for evt in events:
+        target, function, args = relay_call(chain, evt, contracts)
+        spec = contracts[target]["functions"][function]
+        data = spec["selector"] + encode_static(spec["inputs"], args).hex()
+        params.append([{"from": warden, "to": contracts[target]["address"], "data": data}, "pending"])
+
+    balances = None
+    if chain == "destination":
+        balances = source_balances(client, contracts["source"]["address"],
+                                   {evt.args["underlying_token"].lower() for evt in events})
+
+    ready = []
+    for evt, response in zip(events, client.batch("eth_estimateGas", params, raise_errors=False)):
+        if "error" in response and is_revert(response["error"]):
+            reason = decode_revert(response["error"])
+            hold(evt, classify(reason), reason)
+            continue
+        if balances is not None:
+            token, amount = evt.args["underlying_token"].lower(), evt.args["amount"]
+            if amount > balances[token]:
+                hold(evt, "insufficient_liquidity",
+                     f"Source has {balances[token]} left after the withdraws before it in the batch")
+                continue
+            balances[token] -= amount
+        ready.append((evt, None if "error" in response else int(response["result"], 16)))
+    return ready
@@ -0,0 +1,270 @@
+"""
+Sampling profiler with relay-stage tags.
+
+A background thread samples every thread's stack (sys._current_frames) every
+`interval` seconds.  Each sample is tagged with the stage and chain that
+thread last entered:
+
+    with profiler.stage("sign", chain):
+        ...
+
+Stages used by the relayer are scan (eth_getLogs), decode, gas (pre-flight
+and estimate_gas), sign, submit (send_raw_transaction) and confirm (waiting
+for the receipt).  Outside a stage, a thread is tagged "other".  Entering a
+stage is one dict write, so the tags stay in place when the profiler is off.
+
+At stop() the profiler writes:
+
+    <prefix>.collapsed   "stage:chain;outer;...;inner count" lines (flamegraph.pl,
+                         speedscope and inferno all read this format)
+    <prefix>.svg         a flame graph of the same stacks, one tower per stage
+    <prefix>.txt         the summary table, which is also printed to stderr
+
+Profile a relayer run with `bridge_cli.py --profile PREFIX ...` or
+`bridge.py --profile PREFIX`.  For reproducible comparisons, profile a single
+scan of a fixed block range:
+
+    python profiler.py source --from-block 100 --to-block 600 [--no-relay] [--out scan_profile]
+
+Without --from-block, this runs bridge.scanBlocks(chain) itself.
+"""
+import html
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+
+default_prefix = "bridge_profile"
+default_interval = 0.005
+
+_tags = {}  # thread id -> (stage, chain)
+
+# An untagged thread whose innermost Python frame is in one of these is
+# blocked (log writer, queue consumers, HTTP servers); it is counted as "idle"
+# and left out of the shares in the summary.
+IDLE_FILES = {"threading.py", "queue.py", "selectors.py", "socketserver.py", "handlers.py"}
+
+
+class stage:
+    """
+    Tag the current thread's samples with (name, chain) until the block exits.
+    Without a chain, the chain of the enclosing stage is kept.
+    """
+
+    __slots__ = ("name", "chain", "previous", "ident")
+
+    def __init__(self, name, chain=None):
+        self.name = name
+        self.chain = chain
+
+    def __enter__(self):
+        self.ident = threading.get_ident()
+        self.previous = _tags.get(self.ident)
+        chain = self.chain if self.chain is not None or self.previous is None else self.previous[1]
+        _tags[self.ident] = (self.name, chain)
+        return self
+
+    def __exit__(self, *exc):
+        if self.previous is None:
+            _tags.pop(self.ident, None)
+        else:
+            _tags[self.ident] = self.previous
+
+
+def set_stage(name, chain=None):
+    """
+    Tag the current thread without a with block (e.g. inside a generator loop).
+    Without a chain, the current chain is kept.  Returns the previous tag.
+    """
+    ident = threading.get_ident()
+    previous = _tags.get(ident)
+    _tags[ident] = (name, chain if chain is not None or previous is None else previous[1])
+    return previous
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    def __init__(self, interval=default_interval, prefix=default_prefix):
+        self.interval = interval
+        self.prefix = prefix
+        self.stacks = Counter()  # (tag, frames...) -> samples
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        self.started = None
+        self.elapsed = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        labels = {}
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                tag = _tags.get(ident)
+                if tag is not None:
+                    tag = f"{tag[0]}:{tag[1]}" if tag[1] else tag[0]
+                elif stack and stack[0].rsplit("(", 1)[1].split(":")[0] in IDLE_FILES:
+                    tag = "idle"
+                else:
+                    tag = "other"
+                self.stacks[(tag,) + tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self, write=True):
+        self.stopped.set()
+        self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        if write:
+            self.write()
+        return self
+
+    def summary(self):
+        """
+        Samples per stage tag and the functions with the most self samples.
+        """
+        by_stage = Counter()
+        self_time = Counter()
+        for stack, n in self.stacks.items():
+            by_stage[stack[0]] += n
+            if len(stack) > 1 and stack[0] != "idle":
+                self_time[stack[-1]] += n
+        idle = by_stage.pop("idle", 0)
+        total = max(1, self.samples - idle)
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms over {self.elapsed:.2f}s "
+                 f"(all threads, {idle} idle)", "", f"{'stage':<28} {'samples':>8} {'share':>7} {'~seconds':>9}"]
+        for tag, n in by_stage.most_common():
+            lines.append(f"{tag:<28} {n:>8} {100 * n / total:6.1f}% {n * self.interval:9.2f}")
+        lines += ["", f"{'top self time':<60} {'samples':>8} {'share':>7}"]
+        for label, n in self_time.most_common(15):
+            lines.append(f"{label[:60]:<60} {n:>8} {100 * n / total:6.1f}%")
+        return "\n".join(lines)
+
+    def write(self):
+        prefix = Path(self.prefix)
+        with open(f"{prefix}.collapsed", "w") as f:
+            for stack, n in sorted(self.stacks.items()):
+                f.write(";".join(s.replace(";", ",") for s in stack) + f" {n}\n")
+        with open(f"{prefix}.svg", "w") as f:
+            f.write(flamegraph_svg(self.stacks))
+        text = self.summary()
+        with open(f"{prefix}.txt", "w") as f:
+            f.write(text + "\n")
+        print(text, file=sys.stderr)
+        print(f"Profile written to {prefix}.collapsed, {prefix}.svg and {prefix}.txt", file=sys.stderr)
+
+
+def flamegraph_svg(stacks, width=1200, row=16):
+    """
+    Minimal flame graph (root at the bottom) of collapsed stacks.
+    """
+    tree = {}
+    for stack, n in stacks.items():
+        node = tree
+        for frame in stack:
+            entry = node.setdefault(frame, [0, {}])
+            entry[0] += n
+            node = entry[1]
+    total = sum(entry[0] for entry in tree.values()) or 1
+
+    def depth(node):
+        return 1 + max((depth(child) for _, child in node.values()), default=0)
+
+    height = (depth(tree) + 1) * row
+    rects = []
+
+    def draw(node, x, level, parent=None):
+        for name, (n, children) in sorted(node.items()):
+            w = width * n / total
+            if w >= 0.5:
+                y = height - (level + 1) * row
+                hue = zlib.crc32((name if parent else name.split(":")[0]).encode()) % 40 + 10
+                title = html.escape(f"{name}: {n} samples ({100 * n / total:.1f}%)")
+                text = html.escape(name[:int(w / 7)]) if w > 21 else ""
+                rects.append(f'<g><title>{title}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" '
+                              f'height="{row - 1}" fill="hsl({hue},90%,60%)"/>'
+                              f'<text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>')
+                draw(children, x, level + 1, name)
+            x += w
+
+    draw(tree, 0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+            f'font-family="monospace" font-size="11">\n' + "\n".join(rects) + "\n</svg>\n")
+
+
+_active = None
+
+
+def start(prefix=default_prefix, interval=default_interval):
+    """
+    Start the process-wide profiler (bridge_cli/bridge.py --profile).
+    """
+    global _active
+    _active = Profiler(interval, prefix).start()
+    return _active
+
+
+def stop():
+    global _active
+    if _active is not None:
+        _active.stop()
+        _active = None
+
+
+def profile_scan(chain, start_block=None, end_block=None, relay=True, prefix="scan_profile",
+                 interval=default_interval):
+    """
+    Profile one scan: bridge.scanBlocks(chain), or a fixed block range when
+    start_block is given (the same range gives comparable profiles).
+    """
+    import abi_artifact
+    import bridge
+    import event_stream
+    from rpc_client import RPCClient
+
+    profiler = Profiler(interval, prefix).start()
+    try:
+        if start_block is None:
+            bridge.scanBlocks(chain)
+        else:
+            client = RPCClient(bridge.get_rpc_url(event_stream._chain_name(chain)))
+            end_block = client.block_number() if end_block is None else end_block
+            event_stream.scan_and_relay(chain, client, abi_artifact.load_artifact(), start_block, end_block,
+                                        relay=relay)
+    finally:
+        profiler.stop()
+    return profiler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile a single scan")
+    parser.add_argument("chain", choices=["source", "destination"])
+    parser.add_argument("--from-block", type=int, help="scan a fixed range instead of the last 5 blocks")
+    parser.add_argument("--to-block", type=int)
+    parser.add_argument("--no-relay", action="store_true", help="scan and decode only")
+    parser.add_argument("--out", default="scan_profile", help="output file prefix")
+    parser.add_argument("--interval", type=float, default=default_interval * 1000, help="sampling interval (ms)")
+    args = parser.parse_args()
+    profile_scan(args.chain, args.from_block, args.to_block, not args.no_relay, args.out, args.interval / 1000)
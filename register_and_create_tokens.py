@@ -3,19 +3,19 @@ from web3 import Web3
 from web3.middleware import geth_poa_middleware
 from eth_utils import decode_hex
 
+import bridge_keyring
+import chain_config
+import rpc_limiter
+
 def connect_to(chain):
     """
     Connects to the blockchain network.
     """
-    rpc_urls = {
-        "bsc": "https://data-seed-prebsc-1-s1.binance.org:8545/",
-        "avax": "https://api.avax-test.network/ext/bc/C/rpc",
-    }
-    if chain not in rpc_urls:
-        raise ValueError(f"Unsupported chain: {chain}")
-    rpc_url = rpc_urls[chain]
+    rpc_url = chain_config.rpc_url(chain)
     w3 = Web3(Web3.HTTPProvider(rpc_url))
-    w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    if chain_config.get_chain(chain)["poa"]:
+        w3.middleware_onion.inject(geth_poa_middleware, layer=0)
+    rpc_limiter.install(w3)
     if not w3.is_connected():
         raise ConnectionError(f"Failed to connect to {chain} at {rpc_url}")
     print(f"Successfully connected to {chain} blockchain.")
@@ -77,12 +77,12 @@ def send_transaction(w3, contract_function, args, account, private_key, gas_limi
 
 
 
-def register_tokens_on_source(tokens, source_contract, w3, account, private_key):
+def register_tokens_on_source(tokens, source_contract, w3, account, private_key, source_chain="avax"):
     """
     Registers tokens on the Source contract.
     """
     for token in tokens:
-        if token["chain"].lower() == "avax":
+        if token["chain"].lower() == source_chain:
             token_address = token["address"]
             print(f"Registering token {token_address} on Source contract...")
             try:
@@ -91,12 +91,12 @@ def register_tokens_on_source(tokens, source_contract, w3, account, private_key)
                 print(f"Failed to register token {token_address}: {str(e)}")
 
 
-def create_tokens_on_destination(tokens, destination_contract, w3, account, private_key):
+def create_tokens_on_destination(tokens, destination_contract, w3, account, private_key, source_chain="avax"):
     """
     Creates wrapped tokens on the Destination contract.
     """
     for token in tokens:
-        if token["chain"].lower() == "avax":
+        if token["chain"].lower() == source_chain:
             token_address = token["address"]
             token_name = f"Wrapped-{token_address[-4:]}"
             token_symbol = f"W{token_address[-4:]}"
@@ -116,26 +116,30 @@ def create_tokens_on_destination(tokens, destination_contract, w3, account, priv
                 print(f"Failed to create token {token_address}: {str(e)}")
 
 
-def main():
-    json_file = "contract_info.json"
+def main(route=None):
+    """
+    Register and create the erc20s.csv tokens of a route's source chain
+    (default: the first route in chains.json).
+    """
     csv_file = "erc20s.csv"
+    route = chain_config.get_route(route)
 
     # Load token data
     tokens = load_erc20_tokens(csv_file)
 
-    private_key = "f447cac1243f3e6eaa439a774c3fd4203166ff2859b115d40670b2da163a018a"
-    w3_bsc = connect_to("bsc")
-    w3_avax = connect_to("avax")
-    account = w3_avax.eth.account.from_key(private_key)
+    private_key = bridge_keyring.warden_key()
+    w3_destination = connect_to(route.destination)
+    w3_source = connect_to(route.source)
+    account = bridge_keyring.load_account(private_key)
 
-    source_address, source_abi = get_contract_info(json_file, "source")
-    destination_address, destination_abi = get_contract_info(json_file, "destination")
+    source = route.contract_info("source")
+    destination = route.contract_info("destination")
 
-    source_contract = w3_avax.eth.contract(address=source_address, abi=source_abi)
-    destination_contract = w3_bsc.eth.contract(address=destination_address, abi=destination_abi)
+    source_contract = w3_source.eth.contract(address=source["address"], abi=source["abi"])
+    destination_contract = w3_destination.eth.contract(address=destination["address"], abi=destination["abi"])
 
-    register_tokens_on_source(tokens, source_contract, w3_avax, account, private_key)
-    create_tokens_on_destination(tokens, destination_contract, w3_bsc, account, private_key)
+    register_tokens_on_source(tokens, source_contract, w3_source, account, private_key, route.source)
+    create_tokens_on_destination(tokens, destination_contract, w3_destination, account, private_key, route.source)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+"""
+Relay scheduling: which pending relay goes out next.
+
+Relays used to go out in the order eth_getLogs returned them, so one user
+sending many small deposits delayed everyone queued behind them.
+RelayScheduler orders the pending relays to one target chain by a Policy:
+
+- amount tiers: a relay's amount puts it in a class (e.g. large, medium,
+  small), each with an age SLA and a weight
+- per-recipient fair share: recipients take turns, weighted by class
+  (weighted fair queueing over virtual finish tags).  A recipient with 500
+  queued deposits gets one turn per round, not 500 in a row.
+- age SLA: relays that have waited past their class's SLA go before the
+  rest.  Among overdue relays recipients still take turns, so a flood of
+  overdue spam can't starve other recipients once theirs are overdue too.
+
+push() and pop() are O(log n): a fair-tag heap and a deadline heap over the
+same entries, plus a fair-tag heap of overdue entries that pop() moves
+expired deadlines into.  An entry taken from one heap is skipped when it
+surfaces in another.  stats() gives per-class SLA misses and the queue
+latency (push to pop) of recent relays.
+
+The policy is the optional "scheduler" section of chains.json.  Amounts are
+raw token units:
+
+    "scheduler": {
+      "fair_share": true,
+      "tiers": [
+        {"name": "large", "min_amount": 1000000000000000000000, "sla": 30, "weight": 4},
+        {"name": "medium", "min_amount": 1000000000000000000, "sla": 120, "weight": 2},
+        {"name": "small", "min_amount": 0, "sla": 600, "weight": 1}
+      ]
+    }
+
+Policy.fifo() keeps the old first-come, first-served order.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+latency_samples = 4096  # most recent queue latencies kept per class
+
+DEFAULT_TIERS = [
+    {"name": "large", "min_amount": 10 ** 21, "sla": 30, "weight": 4},
+    {"name": "medium", "min_amount": 10 ** 18, "sla": 120, "weight": 2},
+    {"name": "small", "min_amount": 0, "sla": 600, "weight": 1},
+]
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+class Tier:
+    __slots__ = ("name", "min_amount", "sla", "weight")
+
+    def __init__(self, name, min_amount=0, sla=math.inf, weight=1):
+        self.name = name
+        self.min_amount = int(min_amount)
+        self.sla = float(sla)
+        self.weight = float(weight)
+
+
+class Policy:
+    def __init__(self, tiers=None, fair_share=True):
+        tiers = [t if isinstance(t, Tier) else Tier(**t) for t in (tiers or DEFAULT_TIERS)]
+        self.tiers = sorted(tiers, key=lambda t: t.min_amount, reverse=True)
+        if self.tiers[-1].min_amount > 0:
+            raise ValueError("the lowest scheduler tier must have min_amount 0")
+        self.fair_share = fair_share
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Policy from a chains.json "scheduler" section (None: the defaults).
+        """
+        config = config or {}
+        return cls(config.get("tiers"), config.get("fair_share", True))
+
+    @classmethod
+    def fifo(cls):
+        return cls([Tier("all")], fair_share=False)
+
+    def classify(self, amount):
+        for tier in self.tiers:
+            if amount >= tier.min_amount:
+                return tier
+        return self.tiers[-1]
+
+
+class _Entry:
+    __slots__ = ("tag", "seq", "deadline", "pushed", "tier", "recipient", "item", "done")
+
+    def __init__(self, tag, seq, deadline, pushed, tier, recipient, item):
+        self.tag = tag
+        self.seq = seq
+        self.deadline = deadline
+        self.pushed = pushed
+        self.tier = tier
+        self.recipient = recipient
+        self.item = item
+        self.done = False
+
+
+class RelayScheduler:
+    """
+    Pending relays to one chain.  Thread-safe: scan/pre-flight threads push,
+    the relay thread pops.  With maxsize, push() blocks while the scheduler
+    is full (backpressure).
+    """
+
+    def __init__(self, policy=None, maxsize=0, clock=time.monotonic):
+        self.policy = policy or Policy()
+        self.maxsize = maxsize
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.fair = []  # (tag, seq, entry)
+        self.deadlines = []  # (deadline, seq, entry)
+        self.overdue = []  # (tag, seq, entry) past their deadline
+        self.seq = itertools.count()
+        self.size = 0
+        self.vtime = 0.0  # start tag of the last relay popped
+        self.finish = {}  # recipient -> finish tag of its last queued relay
+        self.backlog = {}  # recipient -> relays queued
+        self.latency = {t.name: deque(maxlen=latency_samples) for t in self.policy.tiers}
+        self.counts = {t.name: [0, 0] for t in self.policy.tiers}  # relayed, missed SLA
+
+    def __len__(self):
+        return self.size
+
+    def push(self, item, amount, recipient, now=None):
+        tier = self.policy.classify(amount)
+        with self.cond:
+            while self.maxsize and self.size >= self.maxsize:
+                self.cond.wait()
+            now = self.clock() if now is None else now
+            seq = next(self.seq)
+            deadline = now + tier.sla
+            if self.policy.fair_share:
+                tag = max(self.vtime, self.finish.get(recipient, 0.0)) + 1 / tier.weight
+                self.finish[recipient] = tag
+                self.backlog[recipient] = self.backlog.get(recipient, 0) + 1
+            else:
+                tag = deadline
+            entry = _Entry(tag, seq, deadline, now, tier, recipient, item)
+            heapq.heappush(self.fair, (tag, seq, entry))
+            if deadline < math.inf:
+                heapq.heappush(self.deadlines, (deadline, seq, entry))
+            self.size += 1
+            self.cond.notify_all()
+
+    @staticmethod
+    def _pop_live(heap):
+        while heap:
+            entry = heapq.heappop(heap)[2]
+            if not entry.done:
+                return entry
+        return None
+
+    def _take(self, now):
+        while self.deadlines and self.deadlines[0][0] <= now:
+            entry = heapq.heappop(self.deadlines)[2]
+            if not entry.done:
+                heapq.heappush(self.overdue, (entry.tag, entry.seq, entry))
+        entry = self._pop_live(self.overdue) or self._pop_live(self.fair)
+        entry.done = True
+        self.size -= 1
+        if self.policy.fair_share:
+            self.vtime = max(self.vtime, entry.tag - 1 / entry.tier.weight)
+            left = self.backlog[entry.recipient] - 1
+            if left:
+                self.backlog[entry.recipient] = left
+            else:
+                del self.backlog[entry.recipient]
+                del self.finish[entry.recipient]
+        counts = self.counts[entry.tier.name]
+        counts[0] += 1
+        counts[1] += now > entry.deadline
+        self.latency[entry.tier.name].append(now - entry.pushed)
+        return entry.item
+
+    def pop(self, timeout=None, now=None):
+        """
+        Next relay, or None if nothing was pushed within `timeout` seconds.
+        """
+        with self.cond:
+            if not self.size and not self.cond.wait_for(lambda: self.size, timeout):
+                return None
+            item = self._take(self.clock() if now is None else now)
+            self.cond.notify_all()
+            return item
+
+    def stats(self):
+        """
+        Per class: relays popped, SLA misses, relays queued and queue latency
+        percentiles (s) over the last `latency_samples` relays.
+        """
+        out = {}
+        with self.cond:
+            for tier in self.policy.tiers:
+                samples = sorted(self.latency[tier.name])
+                relayed, missed = self.counts[tier.name]
+                out[tier.name] = {"relayed": relayed, "missed_sla": missed, "queued": 0,
+                                  "p50": _percentile(samples, 0.5), "p95": _percentile(samples, 0.95),
+                                  "max": _percentile(samples, 1)}
+            for _, _, entry in self.fair:
+                if not entry.done:
+                    out[entry.tier.name]["queued"] += 1
+        return out
+
+    def report(self):
+        return "\n".join(f"  {name:<8} relayed={s['relayed']:<6} queued={s['queued']:<5} missed_sla={s['missed_sla']:<4} "
+                         f"recent latency p50={s['p50']:.1f}s p95={s['p95']:.1f}s max={s['max']:.1f}s"
+                         for name, s in self.stats().items())
+
+
+def relay_amount(evt):
+    return evt.args["amount"]
+
+
+def relay_recipient(chain, evt):
+    return evt.args["recipient"] if chain == "source" else evt.args["to"]
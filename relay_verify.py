@@ -0,0 +1,133 @@
+"""
+Relay outcomes read from the relay transaction's receipt.
+
+A relay has worked when its receipt holds the event it was sent to cause:
+a Wrap from Destination for a Deposit, or a Withdrawal from Source for an
+Unwrap, with the same token, recipient and amount.  verify() decodes that
+log from the receipt the relayer already waited for, so checking an
+outcome costs no block scans, and it finds the outcome however many
+blocks confirmation took.
+
+    verified     the receipt has the matching relay event
+    reverted     the relay transaction reverted
+    mismatched   it succeeded but emitted no matching relay event (another
+                 amount or recipient, or a contract that doesn't emit it)
+    pending      no receipt yet (verify_hashes only)
+
+verify_hashes() checks relays by hash alone with one eth_getTransactionReceipt
+batch.  The grader uses it on the hashes scanBlocks returns.
+"""
+from abi_artifact import decode_log
+
+VERIFIED = "verified"
+REVERTED = "reverted"
+MISMATCHED = "mismatched"
+PENDING = "pending"
+
+# The relay event each transfer causes, and on which side
+RELAY_EVENTS = {"Deposit": ("destination", "Wrap"), "Unwrap": ("source", "Withdrawal")}
+
+
+def _hex(value):
+    if isinstance(value, str):
+        return value if value.startswith("0x") else "0x" + value
+    if isinstance(value, int):
+        return hex(value)
+    return "0x" + bytes(value).hex()
+
+
+def _raw_log(entry):
+    """
+    A receipt log (raw JSON, or web3's AttributeDict) in eth_getLogs form.
+    """
+    return {"address": entry["address"], "topics": [_hex(t).lower() for t in entry["topics"]],
+            "data": _hex(entry["data"]), "blockNumber": _hex(entry["blockNumber"]),
+            "blockHash": _hex(entry["blockHash"]), "transactionHash": _hex(entry["transactionHash"]),
+            "logIndex": _hex(entry["logIndex"])}
+
+
+def expected(evt):
+    """
+    (relay side, relay event, {arg: value}) that relaying `evt` must emit.
+    """
+    side, name = RELAY_EVENTS[evt.event]
+    if evt.event == "Deposit":
+        return side, name, {"underlying_token": evt.args["token"], "to": evt.args["recipient"],
+                            "amount": evt.args["amount"]}
+    return side, name, {"token": evt.args["underlying_token"], "recipient": evt.args["to"],
+                        "amount": evt.args["amount"]}
+
+
+def _same(a, b):
+    if isinstance(a, str) and isinstance(b, str):
+        return a.lower() == b.lower()
+    return a == b
+
+
+class Outcome:
+    __slots__ = ("status", "tx_hash", "event", "detail")
+
+    def __init__(self, status, tx_hash, event=None, detail=None):
+        self.status = status
+        self.tx_hash = tx_hash
+        self.event = event  # the decoded relay event, if found
+        self.detail = detail
+
+    def __repr__(self):
+        return f"Outcome({self.status!r}, {self.tx_hash!r}, {self.detail!r})"
+
+
+def relay_events(receipt, contract, name):
+    """
+    The `name` events `contract` emitted in a receipt, decoded.
+    """
+    spec = contract["events"][name]
+    address = contract["address"].lower()
+    return [decode_log(name, spec, entry) for entry in map(_raw_log, receipt["logs"])
+            if entry["address"].lower() == address and entry["topics"][:1] == [spec["topic"].lower()]]
+
+
+def verify(evt, receipt, contracts):
+    """
+    Outcome of relaying the Deposit/Unwrap `evt` from its relay receipt.
+    """
+    side, name, want = expected(evt)
+    tx_hash = _hex(receipt["transactionHash"])
+    block = int(_hex(receipt["blockNumber"]), 16)
+    if int(_hex(receipt["status"]), 16) != 1:
+        return Outcome(REVERTED, tx_hash, detail=f"reverted in block {block}")
+    found = relay_events(receipt, contracts[side], name)
+    for relay in found:
+        if all(_same(relay.args[k], v) for k, v in want.items()):
+            return Outcome(VERIFIED, tx_hash, relay, f"{name} log {relay.logIndex} in block {block}")
+    if found:
+        got = ", ".join(f"{k}={found[0].args[k]}" for k in want)
+        return Outcome(MISMATCHED, tx_hash, found[0], f"{name} in block {block} has {got}")
+    return Outcome(MISMATCHED, tx_hash, detail=f"no {name} event from {contracts[side]['address']} in block {block}")
+
+
+def verify_hashes(client, contract, name, tx_hashes):
+    """
+    {tx_hash: (Outcome, [decoded `name` events])} for relay transactions
+    known only by hash (no source event to match against), from one
+    receipt batch on the relay side's `client`.
+    """
+    receipts = client.batch("eth_getTransactionReceipt", [[h] for h in tx_hashes], raise_errors=False) \
+        if tx_hashes else []
+    out = {}
+    for tx_hash, reply in zip(tx_hashes, receipts):
+        receipt = reply.get("result")
+        if not receipt:
+            out[tx_hash] = (Outcome(PENDING, tx_hash, detail="no receipt yet"), [])
+        elif int(receipt["status"], 16) != 1:
+            out[tx_hash] = (Outcome(REVERTED, tx_hash, detail=f"reverted in block {int(receipt['blockNumber'], 16)}"),
+                            [])
+        else:
+            events = relay_events(receipt, contract, name)
+            block = int(receipt["blockNumber"], 16)
+            if events:
+                out[tx_hash] = (Outcome(VERIFIED, tx_hash, events[0], f"{name} in block {block}"), events)
+            else:
+                out[tx_hash] = (Outcome(MISMATCHED, tx_hash, detail=f"no {name} event from {contract['address']} in "
+                                                                      f"block {block}"), [])
+    return out
@@ -0,0 +1,213 @@
+"""
+One relayer process for every route in chains.json.
+
+    python bridge_cli.py routes [--route avax-bsc ...] [--stats-interval 60] [--dry-run]
+
+Resources are shared across routes:
+
+- Each chain has one RPCClient for scanning, used by every route with a
+  contract on that chain.  Relays use one Web3 connection per chain
+  (bridge.connectTo caches them).
+- Each target chain has one bounded queue of scanned batches, drained by a
+  pre-flight thread into that chain's relay_scheduler.RelayScheduler, which
+  one relay thread pops from in policy order (amount tiers, age SLA,
+  per-recipient fair share; see relay_scheduler.py, or --fifo for scan
+  order).  Relays to different chains proceed in parallel.  Relays from the
+  warden key to one chain go out one at a time, because send_transaction
+  takes its nonce from the pending count.  A full queue or scheduler blocks
+  scanning (backpressure).
+- Relays are signed inline with the warden key parsed once per process
+  (bridge_keyring.load_account).
+
+Each chain is polled every `block_time` seconds, up to `confirmations`
+blocks behind its head.  Relays held by pre-flight are queued again with a
+later poll once they are due (preflight.HoldQueue.retry).  Per-route
+counters (events found, relayed, held by pre-flight, failed, and
+found-to-relayed latency) and per-class relay queue latency are printed
+every --stats-interval seconds and on exit.
+"""
+import queue
+import threading
+import time
+
+import bridge
+import bridge_log
+import chain_config
+import event_stream
+import relay_scheduler
+from rpc_client import RPCClient
+
+log = bridge_log.get_logger("route_relayer")
+
+
+class RouteStats:
+    """
+    Per-route relay counters.
+    """
+
+    FIELDS = ("found", "relayed", "held", "failed")
+
+    def __init__(self, routes):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.counts = {r.name: dict.fromkeys(self.FIELDS, 0) for r in routes}
+        self.latency = {r.name: [0.0, 0.0] for r in routes}  # total, max
+
+    def add(self, route, field, n=1):
+        with self.lock:
+            self.counts[route][field] += n
+
+    def relayed(self, route, n, seconds):
+        with self.lock:
+            self.counts[route]["relayed"] += n
+            total, worst = self.latency[route]
+            self.latency[route] = [total + n * seconds, max(worst, seconds)]
+
+    def report(self):
+        elapsed = max(time.time() - self.start, 1e-9)
+        with self.lock:
+            print(f"--- route stats after {elapsed:.0f}s ---")
+            for name, c in self.counts.items():
+                total, worst = self.latency[name]
+                mean = total / c["relayed"] if c["relayed"] else 0
+                print(f"{name:<20} found={c['found']:<6} relayed={c['relayed']:<6} held={c['held']:<5} "
+                      f"failed={c['failed']:<5} {c['relayed'] / elapsed:6.2f} relays/s  "
+                      f"latency mean={mean:.1f}s max={worst:.1f}s")
+
+
+class RouteRelayer:
+    """
+    Scans both sides of every route and relays through per-chain queues.
+    """
+
+    def __init__(self, routes, relay=True, queue_size=16, policy=None):
+        self.routes = routes
+        self.relay = relay
+        self.stats = RouteStats(routes)
+        chains = {r.chains[side] for r in routes for side in ("source", "destination")}
+        self.clients = {c: RPCClient(chain_config.rpc_url(c)) for c in chains}
+        self.contracts = {r.name: r.contracts() for r in routes}
+        self.cursors = {}  # (route, side) -> last block scanned
+        self.queues = {c: queue.Queue(maxsize=queue_size) for c in chains}
+        if policy is None:
+            policy = relay_scheduler.Policy.from_config(chain_config.load_config()["scheduler"])
+        self.schedulers = {c: relay_scheduler.RelayScheduler(policy, maxsize=queue_size * event_stream.default_batch)
+                           for c in chains}
+        self.closing = threading.Event()
+        self.preflight_workers = [threading.Thread(target=self._preflight_worker, args=(c,), daemon=True)
+                                  for c in chains]
+        self.relay_workers = [threading.Thread(target=self._relay_worker, args=(c,), daemon=True) for c in chains]
+        for t in self.preflight_workers + self.relay_workers:
+            t.start()
+
+    def _preflight_worker(self, chain):
+        q = self.queues[chain]
+        scheduler = self.schedulers[chain]
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            route, side, batch, found_at = item
+            try:
+                ready = bridge.preflight_events(side, batch, route=route.name)
+            except Exception as e:
+                log.error("[%s] error pre-flighting %s events: %s", route.name, side, e,
+                          extra=bridge_log.fields(chain=chain, stage="preflight"))
+                self.stats.add(route.name, "failed", len(batch))
+                continue
+            self.stats.add(route.name, "held", len(batch) - len(ready))
+            for evt, gas in ready:
+                scheduler.push((route, side, evt, gas, found_at), relay_scheduler.relay_amount(evt),
+                               relay_scheduler.relay_recipient(side, evt))
+
+    def _relay_worker(self, chain):
+        scheduler = self.schedulers[chain]
+        while True:
+            item = scheduler.pop(timeout=0.5)
+            if item is None:
+                if self.closing.is_set():
+                    return
+                continue
+            route, side, evt, gas, found_at = item
+            try:
+                tx_hash = bridge.relay_ready(side, evt, gas, route=route.name)
+            except Exception as e:
+                log.error("[%s] error relaying %s event: %s", route.name, side, e,
+                          extra=bridge_log.fields(chain=chain, stage="relay"))
+                tx_hash = None
+            if tx_hash:
+                self.stats.relayed(route.name, 1, time.time() - found_at)
+            else:
+                self.stats.add(route.name, "failed")
+
+    def scan_chain(self, chain):
+        """
+        Scan every route side on `chain` up to its confirmed head.
+        """
+        settings = chain_config.get_chain(chain)
+        client = self.clients[chain]
+        head = client.block_number() - max(0, settings["confirmations"] - 1)
+        for route in self.routes:
+            for side in ("source", "destination"):
+                if route.chains[side] != chain:
+                    continue
+                key = (route.name, side)
+                start = self.cursors[key] + 1 if key in self.cursors else max(0, head - 4)
+                retry = bridge.held.retry(side, route.name)
+                if retry and self.relay:
+                    self.queues[route.target(side)].put((route, side, retry, time.time()))
+                if start > head:
+                    continue
+                event = event_stream.SCAN_EVENTS[side]
+                with event_stream.EventStream(client, self.contracts[route.name][side], event, start, head,
+                                              chain=chain) as stream:
+                    for batch in stream.batches():
+                        self.stats.add(route.name, "found", len(batch))
+                        for evt in batch:
+                            log.debug("[%s] found %r", route.name, evt,
+                                      extra=bridge_log.fields(chain, event, evt.transactionHash, "scan"))
+                        if self.relay:
+                            self.queues[route.target(side)].put((route, side, batch, time.time()))
+                self.cursors[key] = head
+
+    def run(self, stats_interval=60, duration=None):
+        chains = sorted(self.clients)
+        next_poll = dict.fromkeys(chains, 0.0)
+        next_report = time.time() + stats_interval
+        end = time.time() + duration if duration else None
+        try:
+            while end is None or time.time() < end:
+                now = time.time()
+                for chain in chains:
+                    if now < next_poll[chain]:
+                        continue
+                    next_poll[chain] = now + chain_config.get_chain(chain)["block_time"]
+                    try:
+                        self.scan_chain(chain)
+                    except Exception as e:
+                        log.error("error scanning blocks: %s", e, extra=bridge_log.fields(chain=chain, stage="scan"))
+                if time.time() >= next_report:
+                    self.report()
+                    next_report = time.time() + stats_interval
+                time.sleep(max(0.0, min(next_poll.values()) - time.time()))
+        finally:
+            self.close()
+            self.report()
+
+    def report(self):
+        self.stats.report()
+        for chain, scheduler in sorted(self.schedulers.items()):
+            print(f"relay queue to {chain}:")
+            print(scheduler.report())
+
+    def close(self):
+        """
+        Relay everything already queued, then stop the workers.
+        """
+        for q in self.queues.values():
+            q.put(None)
+        for t in self.preflight_workers:
+            t.join()
+        self.closing.set()
+        for t in self.relay_workers:
+            t.join()
@@ -0,0 +1,125 @@
+import http.client
+import itertools
+import json
+from urllib.parse import urlparse
+
+import rpc_limiter
+
+
+class RPCError(Exception):
+    """
+    JSON-RPC error returned by the node.
+    """
+
+    def __init__(self, error):
+        super().__init__(error.get("message", str(error)) if isinstance(error, dict) else str(error))
+        self.error = error
+
+
+class RPCClient:
+    """
+    Minimal JSON-RPC client over a persistent HTTP connection.
+
+    Used on the scan path so that finding events doesn't pay for importing
+    web3.  Requests go through the same per-endpoint limiter as the Web3
+    instances created by connectTo.
+    """
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self.limiter = rpc_limiter.get_limiter(url)
+        self.ids = itertools.count(1)
+        self.conn = None
+        parts = urlparse(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or "/"
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _post(self, method, params):
+        body = json.dumps({"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params})
+        return self._send(body)
+
+    def _send(self, body):
+        if self.conn is None:
+            self.conn = self._connect()
+        try:
+            self.conn.request("POST", self.path, body, {"Content-Type": "application/json",
+                                                        "User-Agent": "bridge-relayer"})
+            resp = self.conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.conn.close()
+            self.conn = None
+            raise rpc_limiter.RetryableError(e, server_error=True)
+
+        if resp.status == 429 or resp.status >= 500:
+            retry_after = resp.getheader("Retry-After", "")
+            raise rpc_limiter.RetryableError(
+                RPCError({"code": resp.status, "message": f"HTTP {resp.status} from {self.host}"}),
+                throttled=resp.status == 429, server_error=resp.status >= 500,
+                retry_after=int(retry_after) if retry_after.isdigit() else None,
+            )
+        if resp.status != 200:
+            raise RPCError({"code": resp.status, "message": f"HTTP {resp.status} from {self.host}"})
+        return json.loads(data)
+
+    def call(self, method, params=()):
+        response = rpc_limiter.limited_call(self.limiter, method, list(params), self._post)
+        if response.get("error"):
+            raise RPCError(response["error"])
+        return response["result"]
+
+    def batch(self, method, params_list, raise_errors=True):
+        """
+        Send one JSON-RPC batch of calls to the same method.
+        Results are returned in the order of params_list.  With
+        raise_errors=False each item is the raw {"result": ...} or
+        {"error": ...} response instead.
+        """
+        if not params_list:
+            return []
+
+        def post(method, params):
+            body = json.dumps([{"jsonrpc": "2.0", "id": i, "method": method, "params": p}
+                               for i, p in enumerate(params)])
+            responses = self._send(body)
+            if isinstance(responses, dict):  # the whole batch was rejected
+                return responses
+            for r in responses:
+                if rpc_limiter.is_throttle_error(r.get("error")):
+                    return {"error": r["error"]}  # retry the whole batch
+            return {"result": sorted(responses, key=lambda r: r["id"])}
+
+        response = rpc_limiter.limited_call(self.limiter, method, params_list, post)
+        if response.get("error"):
+            raise RPCError(response["error"])
+        if not raise_errors:
+            return response["result"]
+        results = []
+        for r in response["result"]:
+            if r.get("error"):
+                raise RPCError(r["error"])
+            results.append(r["result"])
+        return results
+
+    def block_number(self):
+        return int(self.call("eth_blockNumber"), 16)
+
+    def get_logs(self, address, topics, from_block, to_block):
+        return self.call("eth_getLogs", [{
+            "address": address,
+            "topics": topics,
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+        }])
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
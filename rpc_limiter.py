@@ -0,0 +1,234 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+
+# Requests per second and burst size for each RPC host.  The public testnet
+# endpoints start throttling well before these numbers on a busy day, which is
+# what the adaptive concurrency window below is for.
+DEFAULT_LIMITS = {
+    "api.avax-test.network": {"rate": 10.0, "burst": 20},
+    "data-seed-prebsc-1-s1.binance.org": {"rate": 8.0, "burst": 16},
+    # Local test chains (anvil, benchmarks) aren't throttled
+    "127.0.0.1": {"rate": 10000.0, "burst": 10000},
+    "localhost": {"rate": 10000.0, "burst": 10000},
+}
+FALLBACK_LIMITS = {"rate": 20.0, "burst": 40}
+
+# Only read-only calls are retried.  Re-sending eth_sendRawTransaction after a
+# timeout can't double spend (same nonce), but it hides the real error, so the
+# submission path reports failures to its caller instead.
+IDEMPOTENT_METHODS = {
+    "eth_blockNumber",
+    "eth_call",
+    "eth_chainId",
+    "eth_estimateGas",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getBlockByHash",
+    "eth_getBlockByNumber",
+    "eth_getCode",
+    "eth_getFilterChanges",
+    "eth_getFilterLogs",
+    "eth_getLogs",
+    "eth_getTransactionByHash",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_maxPriorityFeePerGas",
+    "net_version",
+    "web3_clientVersion",
+}
+
+THROTTLE_MESSAGES = ("rate limit", "limit exceeded", "too many requests")
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, at most `burst` saved up.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available and take it.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EndpointLimiter:
+    """
+    Token bucket plus an AIMD concurrency window for a single RPC endpoint.
+
+    The window grows by one slot per window's worth of fast, successful calls
+    and is cut in half on a 429, a 5xx, or a call slower than `slow_latency`.
+    """
+
+    def __init__(self, host, rate, burst, max_concurrency=16, slow_latency=2.0):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.slow_latency = slow_latency
+        self.window = float(max(1, max_concurrency // 4))
+        self.in_flight = 0
+        self.lock = threading.Lock()  # guards window, in_flight and stats
+        self.cond = threading.Condition(self.lock)
+        self.stats = {"requests": 0, "throttled": 0, "server_errors": 0, "retries": 0}
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.window):
+                self.cond.wait()
+            self.in_flight += 1
+        self.bucket.acquire()
+
+    def release(self, latency, throttled=False, server_error=False):
+        with self.cond:
+            self.in_flight -= 1
+            self.stats["requests"] += 1
+            if throttled:
+                self.stats["throttled"] += 1
+            if server_error:
+                self.stats["server_errors"] += 1
+
+            if throttled or server_error or latency > self.slow_latency:
+                self.window = max(1.0, self.window / 2)
+            else:
+                self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+            self.cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint_uri):
+    """
+    Return the limiter shared by every Web3 instance talking to this endpoint.
+    """
+    host = urlparse(str(endpoint_uri)).hostname or str(endpoint_uri)
+    with _limiters_lock:
+        if host not in _limiters:
+            limits = DEFAULT_LIMITS.get(host, FALLBACK_LIMITS)
+            _limiters[host] = EndpointLimiter(host, limits["rate"], limits["burst"])
+        return _limiters[host]
+
+
+def backoff_delay(attempt, base=0.25, cap=8.0):
+    """
+    Full-jitter exponential backoff.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_throttle_error(error):
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") in (429, -32005) or any(m in message for m in THROTTLE_MESSAGES)
+
+
+class RetryableError(Exception):
+    """
+    Raised by a transport when a request failed in a way worth retrying.
+    """
+
+    def __init__(self, error, throttled=False, server_error=False, retry_after=None):
+        super().__init__(str(error))
+        self.error = error
+        self.throttled = throttled
+        self.server_error = server_error
+        self.retry_after = retry_after
+
+
+def limited_call(limiter, method, params, make_request, max_retries=5):
+    """
+    Make one JSON-RPC request through `limiter`.
+
+    make_request(method, params) returns the decoded response dict or raises
+    RetryableError for 429s, 5xx and connection failures.  Idempotent reads
+    are retried with jittered backoff; everything else fails straight away.
+    """
+    attempt = 0
+    while True:
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = make_request(method, params)
+        except RetryableError as e:
+            limiter.release(time.monotonic() - start, throttled=e.throttled, server_error=e.server_error)
+            failure = e
+        except Exception:
+            limiter.release(time.monotonic() - start)
+            raise
+        else:
+            throttled = is_throttle_error(response.get("error"))
+            limiter.release(time.monotonic() - start, throttled=throttled)
+            if not throttled:
+                return response
+            failure = None
+
+        if method not in IDEMPOTENT_METHODS or attempt >= max_retries:
+            if failure is not None:
+                raise failure.error
+            return response
+        with limiter.lock:
+            limiter.stats["retries"] += 1
+        retry_after = failure.retry_after if failure is not None else None
+        time.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+        attempt += 1
+
+
+def rate_limit_middleware(make_request, w3, max_retries=5):
+    """
+    Web3 middleware that routes every request through the endpoint's limiter
+    and retries idempotent reads with jittered backoff.
+    """
+    from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+    limiter = get_limiter(getattr(w3.provider, "endpoint_uri", "default"))
+
+    def send(method, params):
+        try:
+            return make_request(method, params)
+        except HTTPError as e:
+            status = e.response.status_code if e.response is not None else 0
+            if status != 429 and status < 500:
+                raise
+            retry_after = e.response.headers.get("Retry-After", "") if e.response is not None else ""
+            raise RetryableError(e, throttled=status == 429, server_error=status >= 500,
+                                 retry_after=int(retry_after) if retry_after.isdigit() else None)
+        except (ConnectionError, Timeout) as e:
+            raise RetryableError(e, server_error=True)
+
+    def middleware(method, params):
+        return limited_call(limiter, method, params, send, max_retries)
+
+    return middleware
+
+
+def install(w3):
+    """
+    Put the limiter underneath all other middleware on `w3`.
+
+    The HTTPProvider's own retry middleware re-fires failed requests
+    immediately, bypassing the limiter, so it is removed.
+    """
+    w3.provider.middlewares = ()
+    w3.middleware_onion.inject(rate_limit_middleware, name="rate_limit", layer=0)
+    return w3
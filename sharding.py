@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from abi_artifact import keccak
+
+
+lease_db = "relayer_leases.db"
+lease_ttl = 30  # seconds without a heartbeat before a shard's work is taken over
+max_rebroadcasts = 5  # unmined broadcasts of a signed relay before it is signed again
+
+# Relay states.  A relay moves claimed -> signed -> done (or failed, if the
+# broadcast transaction reverted).  The raw signed transaction is stored
+# *before* it is broadcast, so a survivor taking over a dead shard can
+# rebroadcast the exact same transaction (same account, same nonce) instead of
+# signing a second one.  That is what makes takeover exactly-once: the chain
+# accepts at most one transaction per nonce.  A signed relay that was never
+# seen mined (e.g. the broadcast failed) stays signed and is rebroadcast the
+# same way on the next poll, up to max_rebroadcasts times: a transaction that
+# still has no receipt by then has been dropped (its nonce used by another
+# one), so the relay is dropped too and signed again.
+CLAIMED = "claimed"
+SIGNED = "signed"
+DONE = "done"
+FAILED = "failed"
+FINAL = (DONE, FAILED)
+
+
+def shard_for(key, num_shards):
+    """
+    Stable shard assignment for an address (token or recipient).
+    """
+    digest = hashlib.sha256(key.lower().encode()).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+def event_id(chain, evt):
+    """
+    Unique id of a Deposit/Unwrap log across shards.
+    """
+    tx_hash = evt.transactionHash if isinstance(evt.transactionHash, str) else evt.transactionHash.hex()
+    if not tx_hash.startswith("0x"):
+        tx_hash = "0x" + tx_hash
+    return f"{chain}:{tx_hash.lower()}:{evt.logIndex}"
+
+
+def transfer_id(evt):
+    """
+    keccak256(abi.encode(transactionHash, logIndex)) of a Deposit/Unwrap log:
+    the id Source/Destination record so a transfer is settled at most once,
+    by withdraw/wrap or by a claim.
+    """
+    tx_hash = evt.transactionHash if isinstance(evt.transactionHash, str) else evt.transactionHash.hex()
+    tx_hash = tx_hash[2:] if tx_hash.startswith("0x") else tx_hash
+    return keccak(bytes.fromhex(tx_hash) + evt.logIndex.to_bytes(32, "big"))
+
+
+class LeaseTable:
+    """
+    Shard leases and relay claims shared by all relayer processes on a host.
+    """
+
+    def __init__(self, path=None, owner=None):
+        self.path = path or str(Path(__file__).with_name(lease_db))
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS leases (shard INTEGER PRIMARY KEY, owner TEXT, expires REAL)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS relays ("
+            " event_id TEXT PRIMARY KEY, shard INTEGER, owner TEXT, status TEXT,"
+            " tx_hash TEXT, raw_tx BLOB, updated REAL, attempts INTEGER DEFAULT 0)"
+        )
+        try:
+            self.db.execute("ALTER TABLE relays ADD COLUMN attempts INTEGER DEFAULT 0")  # tables from before it
+        except sqlite3.OperationalError:
+            pass  # already there
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cursors (shard INTEGER, chain TEXT, block INTEGER, PRIMARY KEY (shard, chain))"
+        )
+
+    def heartbeat(self, shard):
+        """
+        Renew (or take) the lease on our own shard.
+        """
+        self.db.execute(
+            "INSERT INTO leases (shard, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, expires = excluded.expires",
+            (shard, self.owner, time.time() + lease_ttl),
+        )
+
+    def owned_shards(self, shard, num_shards):
+        """
+        Heartbeat our own shard and adopt any shard whose owner stopped
+        heartbeating.  Returns the set of shards this process serves.
+        """
+        self.heartbeat(shard)
+        now = time.time()
+        for other in range(num_shards):
+            if other == shard:
+                continue
+            # Adopt shards that have never been leased or whose lease expired
+            self.db.execute("INSERT OR IGNORE INTO leases (shard, owner, expires) VALUES (?, '', 0)", (other,))
+            self.db.execute(
+                "UPDATE leases SET owner = ?, expires = ? WHERE shard = ? AND (expires < ? OR owner = ?)",
+                (self.owner, now + lease_ttl, other, now, self.owner),
+            )
+        rows = self.db.execute("SELECT shard FROM leases WHERE owner = ?", (self.owner,)).fetchall()
+        return {r[0] for r in rows if r[0] < num_shards}
+
+    def renew(self):
+        """
+        Extend every lease we still hold.
+        """
+        self.db.execute("UPDATE leases SET expires = ? WHERE owner = ?", (time.time() + lease_ttl, self.owner))
+
+    def resign(self):
+        """
+        Expire every lease we hold so survivors take over immediately.
+        """
+        self.db.execute("UPDATE leases SET expires = 0 WHERE owner = ?", (self.owner,))
+
+    def cursor(self, shard, chain, default):
+        """
+        Last block of `chain` fully relayed for `shard`.
+        """
+        row = self.db.execute("SELECT block FROM cursors WHERE shard = ? AND chain = ?", (shard, chain)).fetchone()
+        return row[0] if row else default
+
+    def advance(self, shard, chain, block):
+        self.db.execute(
+            "INSERT INTO cursors (shard, chain, block) VALUES (?, ?, ?) "
+            "ON CONFLICT(shard, chain) DO UPDATE SET block = excluded.block",
+            (shard, chain, block),
+        )
+
+    def claim(self, eid, shard):
+        """
+        Claim a relay.  Returns (claimed, raw_tx): raw_tx is set when we are
+        taking over a relay a dead shard already signed and it must be
+        rebroadcast rather than re-signed.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute("SELECT owner, status, raw_tx FROM relays WHERE event_id = ?", (eid,)).fetchone()
+            if row is None:
+                self.db.execute(
+                    "INSERT INTO relays (event_id, shard, owner, status, updated) VALUES (?, ?, ?, ?, ?)",
+                    (eid, shard, self.owner, CLAIMED, time.time()),
+                )
+                self.db.execute("COMMIT")
+                return True, None
+            owner, status, raw_tx = row
+            if status in (DONE, FAILED) or (owner != self.owner and self._alive(owner)):
+                self.db.execute("COMMIT")
+                return False, None
+            self.db.execute("UPDATE relays SET owner = ?, updated = ? WHERE event_id = ?", (self.owner, time.time(), eid))
+            self.db.execute("COMMIT")
+            return True, raw_tx if status == SIGNED else None
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def status(self, eid):
+        """
+        Status of a relay, None if nobody has claimed it.
+        """
+        row = self.db.execute("SELECT status FROM relays WHERE event_id = ?", (eid,)).fetchone()
+        return row[0] if row else None
+
+    def record_signed(self, eid, tx_hash, raw_tx):
+        self.db.execute(
+            "UPDATE relays SET status = ?, tx_hash = ?, raw_tx = ?, updated = ?, attempts = 0 WHERE event_id = ?",
+            (SIGNED, tx_hash, bytes(raw_tx), time.time(), eid),
+        )
+
+    def finish(self, eid, tx_hash, mined=False):
+        """
+        Record the outcome of a relay (mined: its receipt was seen, so a None
+        tx_hash means it reverted) and return the relay's new status.  A claim
+        that failed before anything was signed is dropped (None) so it is
+        retried; a signed relay that wasn't seen mined stays signed, to be
+        rebroadcast, until max_rebroadcasts attempts have gone unmined, when it
+        is dropped to be signed again; a mined relay is final.
+        """
+        row = self.db.execute("SELECT status, attempts FROM relays WHERE event_id = ?", (eid,)).fetchone()
+        if row is None:
+            return None
+        if row[0] == CLAIMED and tx_hash is None:
+            self.db.execute("DELETE FROM relays WHERE event_id = ?", (eid,))
+            return None
+        if row[0] == SIGNED and tx_hash is None and not mined:
+            if (row[1] or 0) + 1 >= max_rebroadcasts:
+                self.db.execute("DELETE FROM relays WHERE event_id = ?", (eid,))
+                return None
+            self.db.execute("UPDATE relays SET updated = ?, attempts = attempts + 1 WHERE event_id = ?",
+                            (time.time(), eid))
+            return SIGNED
+        status = DONE if tx_hash else FAILED
+        self.db.execute("UPDATE relays SET status = ?, updated = ? WHERE event_id = ?", (status, time.time(), eid))
+        return status
+
+    def _alive(self, owner):
+        row = self.db.execute(
+            "SELECT 1 FROM leases WHERE owner = ? AND expires >= ? LIMIT 1", (owner, time.time())
+        ).fetchone()
+        return row is not None
+
+
+class Heartbeat:
+    """
+    Renews `owner`'s leases every lease_ttl / 3 seconds from a background
+    thread, on its own connection, while the relay loop is blocked.
+    """
+
+    def __init__(self, path, owner):
+        self.path = path
+        self.owner = owner
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        leases = LeaseTable(self.path, self.owner)
+        try:
+            while not self.stopped.wait(lease_ttl / 3):
+                try:
+                    leases.renew()
+                except sqlite3.Error:
+                    pass  # busy; the next beat retries well before the lease runs out
+        finally:
+            leases.db.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+
+def launch(num_shards, keys, extra_args):
+    """
+    Start one relayer process per shard, each with its own warden key.
+    """
+    procs = []
+    for shard in range(num_shards):
+        env = dict(os.environ, BRIDGE_WARDEN_KEY=keys[shard % len(keys)])
+        cmd = [sys.executable, str(Path(__file__).with_name("bridge.py")),
+               "--shard", str(shard), "--num-shards", str(num_shards)] + extra_args
+        procs.append(subprocess.Popen(cmd, env=env))
+    try:
+        for p in procs:
+            p.wait()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run N sharded relayer processes")
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--keys", required=True, help="file with one warden private key per line")
+    args, rest = parser.parse_known_args()
+    with open(args.keys) as f:
+        keys = [line.strip() for line in f if line.strip()]
+    launch(args.num_shards, keys, rest)
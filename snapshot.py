@@ -0,0 +1,454 @@
+"""
+Relayer state snapshots and warm restart.
+
+Without a snapshot, a restarted daemon rescans from the head, bootstraps the
+token index from RPC and knows nothing about the relays it had signed but not
+yet seen confirmed.  RelayState holds that state while the daemon runs:
+
+- scan cursors, and the hashes of recent cursor blocks (to detect a reorg
+  across the restart)
+- token mappings (token_mapping.TokenIndex)
+- pending relays: signed, not yet confirmed, with the raw transaction and
+  the transfer (event, token, recipient, amount) each one settles
+
+A Snapshotter thread writes it every `interval` seconds (and on exit) to
+relayer.snapshot, in the binary format below, via a temporary file and
+os.replace, so a crash mid-write leaves the previous snapshot in place.  The
+relay threads only touch RelayState under a lock.
+
+warm_start() loads a snapshot and reconciles only what can have changed since:
+
+- one eth_getBlockByNumber batch per chain checks the recorded block hashes;
+  scanning resumes after the newest block that is still canonical
+- one eth_getTransactionReceipt batch per chain settles pending relays,
+  each receipt checked against its transfer with relay_verify.verify;
+  those with no receipt are rebroadcast from the stored raw transaction (same
+  nonce, so they can't be applied twice).  No relay thread waits for a
+  rebroadcast relay, so the daemon calls settle() each poll until it is mined
+  (or given up on after settle_timeout seconds)
+- token mappings are merged into the index, which then syncs from its cursors
+
+Format (big-endian):
+
+    magic "BRSNAP", u16 version, f64 created, str key, u16 section count
+    sections: u8 tag, u32 length, payload
+
+    str = u16 length + utf-8.  A snapshot with another version or key
+    (route contracts) is ignored; unknown section tags are skipped.
+"""
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+
+import abi_artifact
+import bridge_log
+import relay_verify
+import transfer_index
+from rpc_client import RPCClient
+
+log = bridge_log.get_logger("snapshot")
+
+snapshot_file = "relayer.snapshot"
+MAGIC = b"BRSNAP"
+SNAPSHOT_VERSION = 2
+default_interval = 30  # seconds between snapshots
+keep_blocks = 8  # recent cursor blocks (number, hash) kept per chain
+reorg_rescan = 64  # blocks rescanned before the oldest recorded block if none of them is canonical any more
+settle_timeout = 600  # seconds a rebroadcast relay may go without a receipt before it is dropped
+
+CURSORS, BLOCKS, TOKENS, PENDING = 1, 2, 3, 5  # version 1 kept send_transaction's nonces under 4
+
+
+def source_of(evt):
+    """
+    (event, token, recipient, amount) of a Deposit/Unwrap: what its relay
+    has to emit, kept with the pending relay.
+    """
+    if evt.event == "Deposit":
+        return evt.event, evt.args["token"], evt.args["recipient"], evt.args["amount"]
+    return evt.event, evt.args["underlying_token"], evt.args["to"], evt.args["amount"]
+
+
+class SourceEvent:
+    """
+    A Deposit/Unwrap rebuilt from source_of(), for relay_verify.verify.
+    """
+
+    def __init__(self, event, token, recipient, amount):
+        self.event = event
+        if event == "Deposit":
+            self.args = {"token": token, "recipient": recipient, "amount": amount}
+        else:
+            self.args = {"underlying_token": token, "to": recipient, "amount": amount}
+
+
+class RelayState:
+    """
+    Live relayer state captured by snapshots.  Chains are "source" and
+    "destination" (the scan sides of the route).
+    """
+
+    def __init__(self, key="", started=None):
+        self.key = key
+        self.started = started if started is not None else time.perf_counter()
+        self.lock = threading.Lock()
+        self.cursors = {}  # chain -> last block scanned
+        self.blocks = {}  # chain -> [(number, hash)], oldest first
+        self.pending = {}  # transfer id -> (target chain, tx hash, raw tx, source_of(event))
+        self.rebroadcast = {}  # transfer id -> (target chain, tx hash, time) of pending relays only settle() watches
+        self.token_index = None
+        self.first_relay = None  # seconds from start to the first confirmed relay
+
+    # Updates from the relayer
+
+    def advance(self, chain, block):
+        with self.lock:
+            self.cursors[chain] = block
+
+    def remember_block(self, chain, number, block_hash):
+        with self.lock:
+            blocks = [b for b in self.blocks.get(chain, []) if b[0] < number]
+            self.blocks[chain] = (blocks + [(number, block_hash)])[-keep_blocks:]
+
+    def signed(self, tid, chain, tx_hash, raw_tx, evt):
+        with self.lock:
+            self.pending[tid] = (chain, tx_hash, bytes(raw_tx), source_of(evt))
+
+    def finished(self, tid, tx_hash):
+        with self.lock:
+            self.pending.pop(tid, None)
+            self.rebroadcast.pop(tid, None)
+            if tx_hash and self.first_relay is None:
+                self.first_relay = time.perf_counter() - self.started
+
+    def pending_ids(self):
+        with self.lock:
+            return set(self.pending)
+
+    def capture(self):
+        """
+        Consistent copy of the state for encode().
+        """
+        with self.lock:
+            snap = {
+                "cursors": dict(self.cursors),
+                "blocks": {c: list(b) for c, b in self.blocks.items()},
+                "pending": dict(self.pending),
+            }
+        index = self.token_index
+        if index is not None:
+            snap["tokens"] = (list(index.wrapped.items()), sorted(index.approved), dict(index.cursors))
+        return snap
+
+
+# Encoding
+
+def _str(s):
+    b = s.encode()
+    return struct.pack(">H", len(b)) + b
+
+
+def _hash(h):
+    return bytes.fromhex(h[2:] if h.startswith("0x") else h)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, n):
+        out = self.data[self.pos:self.pos + n]
+        if len(out) != n:
+            raise ValueError("truncated snapshot")
+        self.pos += n
+        return out
+
+    def unpack(self, fmt):
+        return struct.unpack(fmt, self.take(struct.calcsize(fmt)))
+
+    def str(self):
+        return self.take(self.unpack(">H")[0]).decode()
+
+    def hex(self, n):
+        return "0x" + self.take(n).hex()
+
+
+def encode(snap, key="", created=None):
+    sections = []
+    sections.append((CURSORS, b"".join(_str(c) + struct.pack(">Q", n) for c, n in sorted(snap["cursors"].items()))))
+    sections.append((BLOCKS, b"".join(
+        _str(c) + struct.pack(">H", len(blocks)) + b"".join(struct.pack(">Q", n) + _hash(h) for n, h in blocks)
+        for c, blocks in sorted(snap["blocks"].items()))))
+    if "tokens" in snap:
+        pairs, approved, cursors = snap["tokens"]
+        sections.append((TOKENS, struct.pack(">I", len(pairs)) +
+                         b"".join(_hash(u) + _hash(w) for u, w in pairs) +
+                         struct.pack(">I", len(approved)) + b"".join(_hash(a) for a in approved) +
+                         b"".join(_str(c) + struct.pack(">Q", n) for c, n in sorted(cursors.items()))))
+    sections.append((PENDING, b"".join(
+        _str(tid) + _str(c) + _hash(h) + struct.pack(">I", len(raw)) + raw +
+        _str(event) + _hash(token) + _hash(recipient) + amount.to_bytes(32, "big")
+        for tid, (c, h, raw, (event, token, recipient, amount)) in sorted(snap["pending"].items()))))
+    out = [MAGIC, struct.pack(">Hd", SNAPSHOT_VERSION, created if created is not None else time.time()), _str(key),
+           struct.pack(">H", len(sections))]
+    for tag, payload in sections:
+        out.append(struct.pack(">BI", tag, len(payload)) + payload)
+    return b"".join(out)
+
+
+def decode(data, key=None):
+    """
+    Snapshot dict (plus "created"), or None if data is not a snapshot of
+    this version (and key, if given).
+    """
+    r = _Reader(data)
+    if r.take(len(MAGIC)) != MAGIC:
+        return None
+    version, created = r.unpack(">Hd")
+    if version != SNAPSHOT_VERSION:
+        return None
+    if r.str() != key and key is not None:
+        return None
+    snap = {"created": created, "cursors": {}, "blocks": {}, "pending": {}}
+    for _ in range(r.unpack(">H")[0]):
+        tag, length = r.unpack(">BI")
+        s = _Reader(r.take(length))
+        if tag == CURSORS:
+            while s.pos < length:
+                chain = s.str()
+                snap["cursors"][chain] = s.unpack(">Q")[0]
+        elif tag == BLOCKS:
+            while s.pos < length:
+                chain = s.str()
+                snap["blocks"][chain] = [(s.unpack(">Q")[0], s.hex(32)) for _ in range(s.unpack(">H")[0])]
+        elif tag == TOKENS:
+            pairs = [(s.hex(20), s.hex(20)) for _ in range(s.unpack(">I")[0])]
+            approved = [s.hex(20) for _ in range(s.unpack(">I")[0])]
+            cursors = {}
+            while s.pos < length:
+                chain = s.str()
+                cursors[chain] = s.unpack(">Q")[0]
+            snap["tokens"] = (pairs, approved, cursors)
+        elif tag == PENDING:
+            while s.pos < length:
+                tid, chain, tx_hash = s.str(), s.str(), s.hex(32)
+                raw = s.take(s.unpack(">I")[0])
+                source = (s.str(), s.hex(20), s.hex(20), int.from_bytes(s.take(32), "big"))
+                snap["pending"][tid] = (chain, tx_hash, raw, source)
+    return snap
+
+
+def write(path, data):
+    path = Path(path)
+    tmp = path.with_suffix(".tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(path, key=None):
+    try:
+        data = Path(path).read_bytes()
+    except OSError:
+        return None
+    try:
+        return decode(data, key)
+    except (ValueError, struct.error, UnicodeDecodeError) as e:
+        log.warning("ignoring unreadable snapshot %s: %s", path, e, extra=bridge_log.fields(stage="snapshot"))
+        return None
+
+
+class Snapshotter:
+    """
+    Writes RelayState to `path` every `interval` seconds from a background
+    thread.  Before each write it looks up the hash of every cursor block (one
+    eth_getBlockByNumber per chain) on its own RPC connections.
+    """
+
+    def __init__(self, state, urls, path=None, interval=default_interval):
+        self.state = state
+        self.clients = {chain: RPCClient(url) for chain, url in urls.items()}
+        self.path = Path(path) if path else Path(__file__).with_name(snapshot_file)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+        self.writes = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.snapshot()
+
+    def snapshot(self):
+        start = time.perf_counter()
+        try:
+            with self.state.lock:
+                cursors = dict(self.state.cursors)
+            for chain, block in cursors.items():
+                if chain in self.clients:
+                    header = self.clients[chain].call("eth_getBlockByNumber", [hex(block), False])
+                    if header:
+                        self.state.remember_block(chain, block, header["hash"])
+            data = encode(self.state.capture(), self.state.key)
+            write(self.path, data)
+        except Exception as e:
+            log.warning("snapshot failed: %s", e, extra=bridge_log.fields(stage="snapshot"))
+            return
+        self.writes += 1
+        log.debug("snapshot written (%s bytes)", len(data),
+                  extra=bridge_log.fields(stage="snapshot", duration=time.perf_counter() - start))
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.snapshot()
+
+
+def _resume_block(client, blocks):
+    """
+    Newest recorded (number, hash) that is still canonical, or None.
+    """
+    if not blocks:
+        return None
+    headers = client.batch("eth_getBlockByNumber", [[hex(n), False] for n, _ in blocks], raise_errors=False)
+    for (n, h), header in reversed(list(zip(blocks, headers))):
+        if (header.get("result") or {}).get("hash", "").lower() == h.lower():
+            return n
+    return None
+
+
+def _settled(tid, chain, source, receipt, contracts, transfers):
+    """
+    Check a pending relay's receipt against its transfer (relay_verify) and
+    record the outcome in the transfer index.  Returns the Outcome.
+    """
+    outcome = relay_verify.verify(SourceEvent(*source), receipt, contracts)
+    if outcome.status == relay_verify.MISMATCHED:
+        log.error("relay of %s mined without its relay event: %s", tid, outcome.detail,
+                  extra=bridge_log.fields(chain=chain, txHash=outcome.tx_hash, stage="snapshot"))
+    if transfers is not None:
+        transfers.update(tid, transfer_index.outcome_status(outcome), outcome.tx_hash, outcome.detail)
+    return outcome
+
+
+def warm_start(state, clients, path=None, token_index=None, transfers=None, contracts=None):
+    """
+    Load the snapshot at `path` into `state` and reconcile it with the chains
+    (clients maps "source"/"destination" to RPCClients; contracts is the
+    abi_artifact the relay receipts are checked against).  Returns a summary
+    dict, or None if there was no usable snapshot (cold start).
+    """
+    start = time.perf_counter()
+    path = Path(path) if path else Path(__file__).with_name(snapshot_file)
+    snap = load(path, state.key)
+    if snap is None:
+        return None
+    contracts = contracts or abi_artifact.load_artifact()
+    summary = {"age": time.time() - snap["created"], "reorged": [], "confirmed": 0, "failed": 0, "mismatched": 0,
+               "rebroadcast": 0, "tokens": 0}
+
+    for chain, cursor in snap["cursors"].items():
+        blocks = snap["blocks"].get(chain, [])
+        if chain not in clients:
+            continue
+        resume = _resume_block(clients[chain], blocks)
+        if resume is None and blocks:
+            resume = max(0, blocks[0][0] - reorg_rescan)
+        if resume is not None and resume < cursor:
+            summary["reorged"].append(chain)
+            log.warning("blocks after %s changed since the snapshot; rescanning from there", resume,
+                        extra=bridge_log.fields(chain=chain, stage="snapshot"))
+            cursor = resume
+        state.cursors[chain] = cursor
+        state.blocks[chain] = [b for b in blocks if b[0] <= cursor]
+
+    by_chain = {}
+    for tid, (chain, tx_hash, raw, source) in snap["pending"].items():
+        by_chain.setdefault(chain, []).append((tid, tx_hash, raw, source))
+    for chain, pending in by_chain.items():
+        client = clients.get(chain)
+        if client is None:
+            state.pending.update({tid: (chain, h, raw, source) for tid, h, raw, source in pending})
+            continue
+        receipts = client.batch("eth_getTransactionReceipt", [[h] for _, h, _, _ in pending], raise_errors=False)
+        for (tid, tx_hash, raw, source), receipt in zip(pending, receipts):
+            receipt = receipt.get("result")
+            if receipt:
+                outcome = _settled(tid, chain, source, receipt, contracts, transfers)
+                summary[transfer_index.outcome_status(outcome)] += 1
+                continue
+            try:
+                client.call("eth_sendRawTransaction", ["0x" + raw.hex()])
+            except Exception as e:  # already known, or the nonce was used since
+                log.warning("rebroadcasting %s: %s", tx_hash, e, extra=bridge_log.fields(chain=chain, txHash=tx_hash,
+                                                                                         stage="snapshot"))
+            summary["rebroadcast"] += 1
+            state.pending[tid] = (chain, tx_hash, raw, source)
+            state.rebroadcast[tid] = (chain, tx_hash, time.time())
+
+    if token_index is not None and "tokens" in snap:
+        pairs, approved, cursors = snap["tokens"]
+        before = len(token_index.wrapped)
+        for underlying, wrapped in pairs:
+            token_index._add_creation(underlying, wrapped)
+        token_index.approved.update(a.lower() for a in approved)
+        for side, block in cursors.items():
+            token_index.cursors.setdefault(side, block)
+        summary["tokens"] = len(token_index.wrapped) - before
+    state.token_index = token_index
+
+    summary["duration"] = time.perf_counter() - start
+    log.info("warm start from a %.0fs old snapshot: cursors %s, %s pending relays confirmed, %s failed, "
+             "%s mismatched, %s rebroadcast, %s token mappings restored", summary["age"], state.cursors,
+             summary["confirmed"], summary["failed"], summary["mismatched"], summary["rebroadcast"], summary["tokens"],
+             extra=bridge_log.fields(stage="snapshot", duration=summary["duration"]))
+    return summary
+
+
+def settle(state, clients, transfers=None, contracts=None):
+    """
+    Settle the relays warm_start() rebroadcast, with one
+    eth_getTransactionReceipt batch per chain.  A mined relay leaves
+    state.pending and its outcome, checked with relay_verify.verify, goes to
+    the transfer index; one with no receipt after settle_timeout seconds (its
+    nonce was used by another transaction) is dropped as failed.  Returns the
+    number settled.
+    """
+    contracts = contracts or abi_artifact.load_artifact()
+    with state.lock:
+        waiting = dict(state.rebroadcast)
+        sources = {tid: state.pending[tid][3] for tid in waiting if tid in state.pending}
+    by_chain = {}
+    for tid, (chain, tx_hash, since) in waiting.items():
+        by_chain.setdefault(chain, []).append((tid, tx_hash, since))
+    settled = 0
+    now = time.time()
+    for chain, entries in by_chain.items():
+        client = clients.get(chain)
+        if client is None:
+            continue
+        receipts = client.batch("eth_getTransactionReceipt", [[h] for _, h, _ in entries], raise_errors=False)
+        for (tid, tx_hash, since), receipt in zip(entries, receipts):
+            receipt = receipt.get("result")
+            if receipt:
+                outcome = _settled(tid, chain, sources[tid], receipt, contracts, transfers)
+                state.finished(tid, tx_hash if outcome.status == relay_verify.VERIFIED else None)
+            elif now - since > settle_timeout:
+                log.warning("no receipt for rebroadcast relay %s after %ss, dropping it", tx_hash, settle_timeout,
+                            extra=bridge_log.fields(chain=chain, txHash=tx_hash, stage="snapshot"))
+                state.finished(tid, None)
+                if transfers is not None:
+                    transfers.update(tid, transfer_index.FAILED, tx_hash)
+            else:
+                continue
+            settled += 1
+    return settled
@@ -0,0 +1,11 @@
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import bridge_log  # noqa: E402
+
+# The log writer otherwise holds on to pytest's captured stdout, which is
+# closed before bridge_log flushes at exit
+bridge_log.configure(stream=io.StringIO())
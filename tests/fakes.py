@@ -0,0 +1,71 @@
+"""
+Stand-ins for the RPC client and transfer index used across the tests.
+"""
+
+
+class Event:
+    """
+    A decoded Deposit/Unwrap with just the fields the relayer reads.
+    """
+
+    def __init__(self, tx_hash, log_index=0, event="Deposit", block=1, **args):
+        self.transactionHash = tx_hash
+        self.logIndex = log_index
+        self.event = event
+        self.blockNumber = block
+        self.args = args
+
+    def __repr__(self):
+        return f"Event({self.transactionHash[:10]}#{self.logIndex})"
+
+
+def tx_hash(n):
+    return "0x" + n.to_bytes(32, "big").hex()
+
+
+class FakeClient:
+    """
+    RPCClient answering block headers and receipts from dicts.
+    """
+
+    def __init__(self, headers=None, receipts=None):
+        self.headers = headers or {}  # block number -> hash
+        self.receipts = receipts or {}  # tx hash -> receipt
+        self.sent = []
+
+    def _answer(self, method, params):
+        if method == "eth_getBlockByNumber":
+            n = int(params[0], 16)
+            return {"hash": self.headers[n], "number": params[0]} if n in self.headers else None
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        raise NotImplementedError(method)
+
+    def call(self, method, params):
+        if method == "eth_sendRawTransaction":
+            self.sent.append(params[0])
+            return None
+        return self._answer(method, params)
+
+    def batch(self, method, params_list, raise_errors=True):
+        return [{"result": self._answer(method, params)} for params in params_list]
+
+
+def receipt(status=1, block=10, tx=None, logs=()):
+    return {"status": hex(status), "blockNumber": hex(block), "transactionHash": tx or tx_hash(0), "logs": list(logs)}
+
+
+class RecordingIndex:
+    """
+    The transfer_index.TransferIndex calls warm_start and settle make.
+    """
+
+    def __init__(self, sent=()):
+        self.updates = []
+        self.sent = set(sent)
+
+    def update(self, tid, status, tx_hash=None, detail=None):
+        self.updates.append((tid, status, tx_hash))
+
+    def relayed(self, chain, events):
+        return self.sent
@@ -0,0 +1,120 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import analytics  # noqa: E402
+from analytics import KINDS, History  # noqa: E402
+
+ADDRESSES = ["0x" + f"{i:040x}" for i in range(1, 7)]  # ids 0-1 tokens, 2-5 accounts
+BIG = 3 * 2 ** 64 + 5  # needs the second amount limb
+
+
+def history(rows):
+    """
+    History from (kind, block, token, account, amount) rows.
+    """
+    n = len(rows)
+    return History(np.array([KINDS.index(r[0]) for r in rows], dtype=np.int8),
+                   np.array([r[1] for r in rows], dtype=np.int64),
+                   np.array([r[2] for r in rows], dtype=np.int32), np.full(n, -1, dtype=np.int32),
+                   np.array([r[3] for r in rows], dtype=np.int32), analytics._limbs([r[4] for r in rows]),
+                   np.zeros((n, 32), dtype=np.uint8), ADDRESSES)
+
+
+ROWS = [
+    ("Deposit", 10, 0, 2, 5),  # 0 matched by 3 (first in, first out)
+    ("Deposit", 11, 0, 2, 5),  # 1 the second transfer of the same key: unmatched
+    ("Deposit", 12, 1, 3, 7),  # 2 never relayed
+    ("Wrap", 20, 0, 2, 5),  # 3
+    ("Wrap", 21, 0, 4, 9),  # 4 no transfer: orphan
+    ("Deposit", 13, 1, 5, BIG),  # 5 matched by 7, not by 6 (differs only in the high limb)
+    ("Wrap", 22, 1, 5, 5),  # 6 orphan
+    ("Wrap", 23, 1, 5, BIG),  # 7
+    ("Unwrap", 14, 0, 2, 5),  # 8 not a Deposit
+]
+
+
+def as_sets(result):
+    return tuple(sorted(r.tolist()) for r in result)
+
+
+def test_match_pairs_transfers_with_their_relays_in_block_order():
+    transfers, relays, unmatched, orphans = analytics.match(history(ROWS), "Deposit")
+    assert sorted(zip(transfers.tolist(), relays.tolist())) == [(0, 3), (5, 7)]
+    assert sorted(unmatched.tolist()) == [1, 2]
+    assert sorted(orphans.tolist()) == [4, 6]
+
+
+def test_match_unwraps_with_withdrawals():
+    rows = ROWS + [("Withdrawal", 30, 0, 2, 5)]
+    transfers, relays, unmatched, orphans = analytics.match(history(rows), "Unwrap")
+    assert (transfers.tolist(), relays.tolist(), unmatched.tolist(), orphans.tolist()) == ([8], [9], [], [])
+
+
+def test_match_of_an_empty_history():
+    assert all(len(r) == 0 for r in analytics.match(history([]), "Deposit"))
+
+
+def test_match_falls_back_to_lexsort_for_many_groups(monkeypatch):
+    expected = as_sets(analytics.match(history(ROWS), "Deposit"))
+    monkeypatch.setattr(analytics, "PACKED_GROUPS", 1)
+    assert as_sets(analytics.match(history(ROWS), "Deposit")) == expected
+
+
+def test_group_ids_past_2_to_the_24_do_not_collide(monkeypatch):
+    # Ids this large overflowed the packed sort key, which then interleaved
+    # groups by block: the late transfer of row 0's key would match as well
+    rows = ROWS + [("Deposit", 15, 0, 2, 5)]
+    expected = as_sets(analytics.match(history(rows), "Deposit"))
+    assert expected[2] == [1, 2, 9]
+    key_ids = analytics._key_ids
+    monkeypatch.setattr(analytics, "_key_ids", lambda keys: key_ids(keys) << 24)
+    assert as_sets(analytics.match(history(rows), "Deposit")) == expected
+
+
+def test_match_with_blocks_past_39_bits():
+    rows = [(kind, block + 2 ** 40, token, account, amount) for kind, block, token, account, amount in ROWS]
+    transfers, relays, _, _ = analytics.match(history(rows), "Deposit")
+    assert sorted(zip(transfers.tolist(), relays.tolist())) == [(0, 3), (5, 7)]
+
+
+def test_volume_sums_amounts_exactly():
+    volume = {(r["event"], r["token"]): (r["events"], r["amount"]) for r in analytics.volume(history(ROWS))}
+    assert volume[("Deposit", ADDRESSES[0])] == (2, 10)
+    assert volume[("Deposit", ADDRESSES[1])] == (2, 7 + BIG)
+    assert volume[("Wrap", ADDRESSES[1])] == (2, 5 + BIG)
+
+
+CSV = """event,block_number,token,recipient,amount,transactionHash,underlying_token,wrapped_token,to
+Deposit,10,{a[0]},{a[2]},5,0x{ff},,,
+Unwrap,11,,,{big},0x{ee},{a[1]},{a[0]},0x{mixed}
+Approval,12,{a[0]},,1,0x{ee},,,
+Wrap,13,,,{max},,{a[0]},{a[1]},{a[2]}
+Withdrawal,14,{a[1]},,0,0x12,,,
+""".format(a=ADDRESSES, mixed="Ab" * 20, ff="ff" * 32, ee="ee" * 32, big=BIG,
+           max=2 ** 256 - 1)
+
+
+def test_load_parses_the_csv_and_caches_its_columns(tmp_path):
+    path = tmp_path / "events.csv"
+    path.write_text(CSV)
+    parsed = analytics.load(path)
+    assert path.with_suffix(".npz").exists()
+    assert [KINDS[k] for k in parsed.kind] == ["Deposit", "Unwrap", "Wrap", "Withdrawal"]
+    assert parsed.block.tolist() == [10, 11, 13, 14]
+    assert [parsed.address(i) for i in parsed.token] == [ADDRESSES[0], ADDRESSES[1], ADDRESSES[0], ADDRESSES[1]]
+    assert [parsed.address(i) for i in parsed.wrapped] == [None, ADDRESSES[0], ADDRESSES[1], None]
+    assert [parsed.address(i) for i in parsed.account] == [ADDRESSES[2], "0x" + "ab" * 20, ADDRESSES[2], None]
+    assert [analytics._as_int(limbs) for limbs in parsed.amount] == [5, BIG, 2 ** 256 - 1, 0]
+    assert [bytes(h) for h in parsed.tx] == [b"\xff" * 32, b"\xee" * 32, bytes(32), bytes(32)]
+
+    cached = analytics.load(path)
+    for name in ("kind", "block", "token", "wrapped", "account", "amount", "tx"):
+        assert (getattr(cached, name) == getattr(parsed, name)).all(), name
+    assert cached.addresses == parsed.addresses
+
+
+def test_load_of_a_csv_with_no_events(tmp_path):
+    path = tmp_path / "events.csv"
+    path.write_text(CSV.splitlines()[0] + "\n")
+    assert len(analytics.load(path, cache=False)) == 0
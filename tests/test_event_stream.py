@@ -0,0 +1,73 @@
+import pytest
+
+import abi_artifact
+import bridge
+import event_stream
+from fakes import tx_hash
+from rpc_client import RPCError
+
+CONTRACTS = abi_artifact.load_artifact()
+
+
+class LogsClient:
+    """
+    get_logs over one Deposit per block, failing for the ranges in `failing`
+    (once each).
+    """
+
+    def __init__(self, blocks, failing=()):
+        spec = CONTRACTS["source"]["events"]["Deposit"]
+        self.logs = [{"address": CONTRACTS["source"]["address"],
+                      "topics": [spec["topic"], "0x" + "00" * 12 + "11" * 20, "0x" + "00" * 12 + "22" * 20],
+                      "data": "0x" + n.to_bytes(32, "big").hex(), "blockNumber": hex(n), "blockHash": tx_hash(n),
+                      "transactionHash": tx_hash(1000 + n), "logIndex": "0x0"} for n in blocks]
+        self.failing = set(failing)
+        self.requests = []
+
+    def get_logs(self, address, topics, lo, hi):
+        self.requests.append((lo, hi))
+        if (lo, hi) in self.failing:
+            self.failing.discard((lo, hi))
+            raise RPCError({"code": -32000, "message": "upstream timeout"})
+        return [entry for entry in self.logs if lo <= int(entry["blockNumber"], 16) <= hi]
+
+
+@pytest.fixture
+def relays(monkeypatch):
+    out = []
+    monkeypatch.setattr(event_stream, "max_range", 10)
+    monkeypatch.setattr(bridge, "relay_events", lambda chain, batch: [out.append(e.blockNumber) for e in batch])
+    return out
+
+
+def test_scan_relays_every_event_in_order(relays):
+    found = event_stream.scan_and_relay("source", LogsClient(range(1, 31)), CONTRACTS, 1, 30, batch_size=3)
+    assert found == 30
+    assert relays == list(range(1, 31))
+
+
+def test_failed_page_reports_the_last_block_relayed(relays):
+    client = LogsClient(range(1, 31), failing=[(11, 20)])
+    with pytest.raises(event_stream.PartialScan) as failure:
+        event_stream.scan_and_relay("source", client, CONTRACTS, 1, 30, batch_size=3)
+    assert failure.value.block == 10
+    assert relays == list(range(1, 11))
+
+    # Resuming after it relays the rest and nothing twice
+    event_stream.scan_and_relay("source", client, CONTRACTS, failure.value.block + 1, 30, batch_size=3)
+    assert relays == list(range(1, 31))
+
+
+def test_failed_first_page_resumes_from_the_start(relays):
+    with pytest.raises(event_stream.PartialScan) as failure:
+        event_stream.scan_and_relay("source", LogsClient(range(5, 31), failing=[(5, 14)]), CONTRACTS, 5, 30)
+    assert failure.value.block == 4
+    assert relays == []
+
+
+def test_empty_blocks_before_a_failed_page_count_as_relayed_up_to_the_last_event(relays):
+    client = LogsClient([2, 3, 24], failing=[(21, 30)])
+    with pytest.raises(event_stream.PartialScan) as failure:
+        event_stream.scan_and_relay("source", client, CONTRACTS, 1, 30)
+    assert failure.value.block == 3
+    assert relays == [2, 3]
@@ -0,0 +1,61 @@
+import importlib
+import importlib.util
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+HARNESS = ROOT / ".guides" / "tests"
+sys.path.append(str(HARNESS))
+
+import build_grader_lib  # noqa: E402
+
+try:
+    subprocess.run(["git", "-C", str(ROOT), "cat-file", "-e", build_grader_lib.REVISION + "^{commit}"], check=True,
+                   capture_output=True)
+except (OSError, subprocess.CalledProcessError):
+    pytest.skip("needs the git history holding build_grader_lib.REVISION", allow_module_level=True)
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    out = tmp_path_factory.mktemp("grader_lib")
+    build_grader_lib.build(out=out)
+    return out
+
+
+def test_grader_lib_has_the_modules_the_grader_imports(built):
+    assert {"abi_artifact.py", "bridge_keyring.py", "chain_config.py", "relay_verify.py", "rpc_client.py",
+            "rpc_limiter.py", "token_mapping.py", "chains.json"} <= {p.name for p in built.iterdir()}
+    assert build_grader_lib.built_revision(built) == build_grader_lib.REVISION
+
+
+def test_grader_lib_imports_only_its_own_modules(built):
+    spec = importlib.util.spec_from_file_location("built_grader_lib", built / "__init__.py",
+                                                  submodule_search_locations=[str(built)])
+    sys.modules[spec.name] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules[spec.name])
+    try:
+        for name in ("chain_config", "relay_verify", "rpc_client", "token_mapping"):
+            module = importlib.import_module(f"built_grader_lib.{name}")
+            assert Path(module.__file__).parent == built
+        assert "from . import bridge_log" in (built / "bridge_keyring.py").read_text()
+    finally:
+        for name in [m for m in sys.modules if m.split(".")[0] == "built_grader_lib"]:
+            del sys.modules[name]
+
+
+def test_ensure_rebuilds_only_for_another_revision(built, monkeypatch):
+    monkeypatch.setattr(build_grader_lib, "build", lambda revision, out: pytest.fail("rebuilt"))
+    build_grader_lib.ensure(out=built)
+
+
+def test_harness_does_not_import_from_the_repository():
+    for path in HARNESS.glob("*.py"):
+        source = path.read_text()
+        assert "parents[" not in source, path.name
+        assert not re.search(r"^(import|from) (abi_artifact|bridge_keyring|bridge_log|chain_config|relay_verify|"
+                             r"rpc_client|rpc_limiter|token_mapping)\b", source, flags=re.M), path.name
@@ -0,0 +1,122 @@
+import bridge
+import liquidity
+import preflight
+from fakes import Event, tx_hash
+
+SOURCE = "0x" + "aa" * 20
+TOKEN, OTHER = "0x" + "11" * 20, "0x" + "12" * 20
+
+
+class LedgerClient:
+    """
+    balanceOf answers from `balances`; get_logs from `logs` (by block).
+    """
+
+    def __init__(self, balances, head=100):
+        self.balances = balances
+        self.head = head
+        self.logs = []
+        self.calls = []
+
+    def block_number(self):
+        return self.head
+
+    def batch(self, method, params_list):
+        self.calls.append(method)
+        return [hex(self.balances.get(params[0]["to"], 0)) for params in params_list]
+
+    def get_logs(self, address, topics, lo, hi):
+        return [entry for entry in self.logs if lo <= entry["blockNumber"] <= hi]
+
+    def add(self, topic, token, amount, block):
+        self.logs.append({"topics": [topic, "0x" + "00" * 12 + token[2:], "0x" + "00" * 32],
+                          "data": "0x" + amount.to_bytes(32, "big").hex(), "blockNumber": block})
+
+
+def test_reserve_holds_liquidity_until_released():
+    ledger = liquidity.LiquidityLedger(LedgerClient({TOKEN: 100}), SOURCE)
+    assert ledger.reserve(TOKEN.upper().replace("0X", "0x"), 60, "a")
+    assert ledger.reserve(TOKEN, 60, "a")  # the same transfer again holds nothing more
+    assert ledger.available(TOKEN) == 40
+    assert not ledger.reserve(TOKEN, 41, "b")  # queued withdrawals can't oversubscribe
+    assert ledger.available(TOKEN) == 40
+    ledger.release("a")
+    assert ledger.reserve(TOKEN, 100, "b")
+    assert ledger.stats["checks"] == 4 and ledger.stats["refused"] == 1
+
+
+def test_unknown_token_costs_one_balance_call():
+    client = LedgerClient({TOKEN: 5})
+    ledger = liquidity.LiquidityLedger(client, SOURCE)
+    assert not ledger.reserve(TOKEN, 6, "a")
+    assert ledger.reserve(TOKEN, 5, "a")
+    assert client.calls == ["eth_call"]
+
+
+def test_synced_withdrawal_replaces_the_reservation():
+    client = LedgerClient({TOKEN: 100})
+    ledger = liquidity.LiquidityLedger(client, SOURCE, tokens=[TOKEN])
+    ledger.sync()  # the first sync verifies
+    assert ledger.reserve(TOKEN, 30, "a")
+    ledger.withdrawn("a", 101)
+
+    client.add(liquidity.WITHDRAWAL_TOPIC, TOKEN, 30, 101)
+    client.add(liquidity.DEPOSIT_TOPIC, TOKEN, 5, 102)
+    client.head = 102
+    ledger.sync()
+    assert (ledger.balances[TOKEN], ledger.reserved[TOKEN], ledger.available(TOKEN)) == (75, 0, 75)
+    assert ledger.cursor == 102 and ledger.reservations == {}
+
+
+def test_another_relays_withdrawal_leaves_the_reservation():
+    client = LedgerClient({TOKEN: 100})
+    ledger = liquidity.LiquidityLedger(client, SOURCE, tokens=[TOKEN])
+    ledger.sync()
+    assert ledger.reserve(TOKEN, 30, "in flight")
+
+    client.add(liquidity.WITHDRAWAL_TOPIC, TOKEN, 30, 101)  # someone else's withdraw
+    client.head = 101
+    ledger.sync()
+    assert (ledger.balances[TOKEN], ledger.reserved[TOKEN], ledger.available(TOKEN)) == (70, 30, 40)
+    ledger.withdrawn("in flight", 103)
+    client.head = 102
+    ledger.sync()
+    assert ledger.reserved[TOKEN] == 30  # not synced up to its block yet
+    client.add(liquidity.WITHDRAWAL_TOPIC, TOKEN, 30, 103)
+    client.head = 103
+    ledger.sync()
+    assert (ledger.balances[TOKEN], ledger.reserved[TOKEN]) == (40, 0)
+
+
+def test_verify_resets_drifted_balances():
+    client = LedgerClient({TOKEN: 100, OTHER: 7})
+    ledger = liquidity.LiquidityLedger(client, SOURCE, tokens=[TOKEN, OTHER])
+    assert ledger.verify() == {}  # nothing to compare against yet
+    client.balances[TOKEN] = 150  # sent to Source directly
+    assert ledger.verify() == {TOKEN: -50}
+    assert ledger.available(TOKEN) == 150 and ledger.available(OTHER) == 7
+
+
+class HeldIndex:
+    def __init__(self):
+        self.records = []
+
+    def held(self, chain, evt, reason=None):
+        self.records.append((chain, evt, reason))
+
+
+def test_refused_withdraw_is_held_for_a_later_poll(monkeypatch, tmp_path):
+    ledger = liquidity.LiquidityLedger(LedgerClient({TOKEN: 5}), SOURCE)
+    index = HeldIndex()
+    monkeypatch.setattr(bridge, "liquidity", ledger)
+    monkeypatch.setattr(bridge, "transfers", index)
+    monkeypatch.setattr(bridge, "held", preflight.HoldQueue(tmp_path / "held.jsonl", retry_after=0))
+    evt = Event(tx_hash(1), 0, event="Unwrap", underlying_token=TOKEN, wrapped_token=OTHER, frm=SOURCE, to=SOURCE,
+                amount=6)
+
+    assert bridge.relay_ready("destination", evt, key="0x" + "01" * 32) is None
+    assert ledger.reservations == {}
+    (chain, held, reason), = index.records
+    assert (chain, held) == ("destination", evt) and reason.startswith("liquidity:")
+    assert bridge.held.load()[0]["category"] == "insufficient_liquidity"
+    assert bridge.held.retry("destination", bridge.chain_config.get_route().name) == [evt]
@@ -0,0 +1,82 @@
+import json
+from pathlib import Path
+
+import abi_artifact
+import preflight
+from fakes import Event, tx_hash
+from sharding import transfer_id
+
+TOKEN, RECIPIENT = "0x" + "11" * 20, "0x" + "22" * 20
+
+
+def contracts(with_transfer_id):
+    """
+    The artifact of contract_info.json, optionally with wrap/withdraw taking
+    a leading bytes32 transfer id as Bridge/src does.
+    """
+    info = json.loads(Path(abi_artifact.__file__).with_name("contract_info.json").read_text())
+    if with_transfer_id:
+        for side in info.values():
+            for item in side["abi"]:
+                if item.get("name") in ("wrap", "withdraw") and item["type"] == "function":
+                    item["inputs"].insert(0, {"name": "_transferId", "type": "bytes32", "internalType": "bytes32"})
+    return abi_artifact.build_artifact(info)
+
+
+def test_relay_call_sends_the_transfer_id_to_contracts_that_take_it():
+    deposit = Event(tx_hash(1), 2, token=TOKEN, recipient=RECIPIENT, amount=5)
+    assert preflight.relay_call("source", deposit, contracts(True)) == \
+        ("destination", "wrap", [transfer_id(deposit), TOKEN, RECIPIENT, 5])
+    unwrap = Event(tx_hash(2), 0, event="Unwrap", underlying_token=TOKEN, to=RECIPIENT, amount=7)
+    assert preflight.relay_call("destination", unwrap, contracts(True)) == \
+        ("source", "withdraw", [transfer_id(unwrap), TOKEN, RECIPIENT, 7])
+
+
+def test_relay_call_leaves_it_out_for_contracts_deployed_before():
+    deposit = Event(tx_hash(1), 2, token=TOKEN, recipient=RECIPIENT, amount=5)
+    assert preflight.relay_call("source", deposit, contracts(False)) == ("destination", "wrap", [TOKEN, RECIPIENT, 5])
+
+
+class PreflightClient:
+    """
+    eth_estimateGas passes (or answers `reverts` for a call's position);
+    balanceOf answers from `balances`.
+    """
+
+    def __init__(self, balances, reverts=None):
+        self.balances = balances
+        self.reverts = reverts or {}
+
+    def batch(self, method, params_list, raise_errors=True):
+        if method == "eth_call":
+            return [hex(self.balances.get(params[0]["to"], 0)) for params in params_list]
+        return [{"error": self.reverts[i]} if i in self.reverts else {"result": hex(50000)}
+                for i in range(len(params_list))]
+
+
+def unwrap(n, amount, token=TOKEN):
+    return Event(tx_hash(n), 0, event="Unwrap", underlying_token=token, wrapped_token=token, frm=RECIPIENT,
+                 to=RECIPIENT, amount=amount)
+
+
+def test_withdraws_draw_down_sources_balance_across_the_batch(tmp_path):
+    other = "0x" + "33" * 20
+    events = [unwrap(1, 60), unwrap(2, 50), unwrap(3, 40), unwrap(4, 9, other)]
+    held = preflight.HoldQueue(tmp_path / "held.jsonl")
+    ready = preflight.preflight("destination", events, RECIPIENT, PreflightClient({TOKEN: 100, other: 9}),
+                                contracts(False), held)
+    assert [evt for evt, _ in ready] == [events[0], events[2], events[3]]
+    assert [(r["transactionHash"], r["category"]) for r in held.load()] == \
+        [(events[1].transactionHash, "insufficient_liquidity")]
+
+
+def test_held_relays_are_retried_unless_no_preflight_can_pass_them(tmp_path):
+    reverted = {"code": 3, "message": "execution reverted: ERC20: transfer amount exceeds balance"}
+    zero = {"code": 3, "message": "execution reverted: Cannot unwrap to 0 address"}
+    events = [unwrap(1, 10), unwrap(2, 10)]
+    held = preflight.HoldQueue(tmp_path / "held.jsonl", retry_after=30)
+    assert preflight.preflight("destination", events, RECIPIENT, PreflightClient({TOKEN: 100}, {0: reverted, 1: zero}),
+                               contracts(False), held, route="r") == []
+    assert held.retry("destination", "r", now=held.load()[0]["time"] + 1) == []  # not due yet
+    assert held.retry("destination", "r", now=held.load()[0]["time"] + 30) == [events[0]]
+    assert len(held) == 0
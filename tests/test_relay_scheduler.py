@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+from relay_scheduler import Policy, RelayScheduler, Tier
+
+LARGE, MEDIUM, SMALL = 10 ** 21, 10 ** 18, 1
+
+
+def drain(scheduler, now=0):
+    out = []
+    while len(scheduler):
+        out.append(scheduler.pop(now=now))
+    return out
+
+
+def test_fifo_keeps_scan_order():
+    scheduler = RelayScheduler(Policy.fifo())
+    for i, (amount, recipient) in enumerate([(SMALL, "a"), (LARGE, "b"), (SMALL, "a"), (MEDIUM, "c")]):
+        scheduler.push(i, amount, recipient, now=0)
+    assert drain(scheduler) == [0, 1, 2, 3]
+
+
+def test_recipients_take_turns():
+    scheduler = RelayScheduler()
+    for i in range(4):
+        scheduler.push(f"a{i}", SMALL, "a", now=0)
+    scheduler.push("b0", SMALL, "b", now=0)
+    scheduler.push("c0", SMALL, "c", now=0)
+    assert drain(scheduler) == ["a0", "b0", "c0", "a1", "a2", "a3"]
+
+
+def test_larger_tiers_get_more_turns():
+    scheduler = RelayScheduler()
+    for i in range(3):
+        scheduler.push(f"small{i}", SMALL, "a", now=0)
+        scheduler.push(f"large{i}", LARGE, "b", now=0)
+    assert drain(scheduler) == ["large0", "large1", "large2", "small0", "small1", "small2"]
+
+
+def test_overdue_relays_go_first_and_count_as_missed():
+    scheduler = RelayScheduler()
+    scheduler.push("old", SMALL, "a", now=0)
+    scheduler.push("fresh", LARGE, "b", now=700)
+    assert drain(scheduler, now=701) == ["old", "fresh"]
+    stats = scheduler.stats()
+    assert (stats["small"]["relayed"], stats["small"]["missed_sla"], stats["small"]["max"]) == (1, 1, 701)
+    assert (stats["large"]["relayed"], stats["large"]["missed_sla"]) == (1, 0)
+
+
+def test_overdue_recipients_still_take_turns():
+    scheduler = RelayScheduler()
+    for i in range(3):
+        scheduler.push(f"a{i}", SMALL, "a", now=0)
+    scheduler.push("b0", SMALL, "b", now=0)
+    assert drain(scheduler, now=1000) == ["a0", "b0", "a1", "a2"]
+
+
+def test_pop_times_out_when_empty():
+    assert RelayScheduler().pop(timeout=0.01) is None
+
+
+def test_push_blocks_while_full():
+    scheduler = RelayScheduler(maxsize=1)
+    scheduler.push("first", SMALL, "a")
+    pushed = threading.Event()
+    pusher = threading.Thread(target=lambda: (scheduler.push("second", SMALL, "a"), pushed.set()))
+    pusher.start()
+    assert not pushed.wait(0.05)
+    assert scheduler.pop() == "first"
+    assert pushed.wait(5)
+    pusher.join()
+    assert scheduler.pop() == "second"
+
+
+def test_policy_needs_a_tier_for_every_amount():
+    with pytest.raises(ValueError):
+        Policy([Tier("large", min_amount=10)])
+    assert Policy.from_config({"tiers": [{"name": "all"}], "fair_share": False}).classify(SMALL).name == "all"
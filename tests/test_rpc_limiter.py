@@ -0,0 +1,73 @@
+import pytest
+
+import rpc_limiter
+from rpc_limiter import EndpointLimiter, RetryableError, TokenBucket
+
+
+class Clock:
+    """
+    Stands in for rpc_limiter's time module: sleep() only moves monotonic().
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rpc_limiter, "time", clock)
+    return clock
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst(clock):
+    bucket = TokenBucket(rate=4, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire()  # empty: waits a quarter second for the next token
+    assert clock.slept == [0.25]
+    clock.now += 10  # idle far longer than the burst takes to refill
+    bucket.acquire()
+    assert bucket.tokens == 1
+
+
+def test_throttled_calls_halve_the_window(clock):
+    limiter = EndpointLimiter("host", rate=100, burst=100, max_concurrency=16)
+    assert limiter.window == 4
+    throttled = {"jsonrpc": "2.0", "id": 1, "error": {"code": 429, "message": "Too Many Requests"}}
+    responses = [throttled, throttled, {"jsonrpc": "2.0", "id": 1, "result": "0x1"}]
+    assert rpc_limiter.limited_call(limiter, "eth_blockNumber", [], lambda m, p: responses.pop(0))["result"] == "0x1"
+    assert limiter.window == 2  # halved twice to 1, then grown by a fast call
+    assert limiter.stats == {"requests": 3, "throttled": 2, "server_errors": 0, "retries": 2}
+
+
+def test_writes_are_not_retried(clock):
+    limiter = EndpointLimiter("host", rate=100, burst=100)
+
+    def unavailable(method, params):
+        raise RetryableError(ConnectionError("reset"), server_error=True)
+
+    with pytest.raises(ConnectionError):
+        rpc_limiter.limited_call(limiter, "eth_sendRawTransaction", ["0x"], unavailable)
+    assert limiter.stats["retries"] == 0 and limiter.window == 2
+    assert limiter.in_flight == 0
+
+
+def test_a_call_that_raises_gives_its_slot_back(clock):
+    limiter = EndpointLimiter("host", rate=100, burst=100)
+
+    def broken(method, params):
+        raise ValueError("bad response")
+
+    with pytest.raises(ValueError):
+        rpc_limiter.limited_call(limiter, "eth_call", [], broken)
+    assert limiter.in_flight == 0 and limiter.stats["requests"] == 1
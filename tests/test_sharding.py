@@ -0,0 +1,292 @@
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+from collections import Counter
+
+import pytest
+
+import bridge
+import sharding
+from abi_artifact import keccak
+from fakes import Event, tx_hash
+
+TOKENS = ["0x" + f"{i:040x}" for i in range(1, 9)]
+
+
+def deposits(n):
+    return [Event(tx_hash(i), 0, block=i, token=TOKENS[i % len(TOKENS)], recipient=TOKENS[0], amount=i)
+            for i in range(1, n + 1)]
+
+
+class FakeW3:
+    def __init__(self, head):
+        self.eth = self
+        self.head = head
+
+    def get_block_number(self):
+        return self.head() if callable(self.head) else self.head
+
+
+class Stop(Exception):
+    pass
+
+
+def test_shard_for_is_stable_and_in_range():
+    shards = [sharding.shard_for(t, 4) for t in TOKENS]
+    assert shards == [sharding.shard_for(t.upper().replace("0X", "0x"), 4) for t in TOKENS]
+    assert all(0 <= s < 4 for s in shards)
+    spread = Counter(sharding.shard_for("0x" + f"{i:040x}", 4) for i in range(4000))
+    assert min(spread.values()) > 900
+
+
+def test_event_and_transfer_ids():
+    evt = Event(tx_hash(7)[2:].upper(), 3)
+    assert sharding.event_id("source", evt) == f"source:{tx_hash(7)}:3"
+    assert sharding.transfer_id(evt) == keccak(bytes.fromhex(tx_hash(7)[2:]) + (3).to_bytes(32, "big"))
+
+
+def test_relay_lifecycle(tmp_path):
+    leases = sharding.LeaseTable(str(tmp_path / "leases.db"), owner="a")
+    assert leases.claim("e1", 0) == (True, None)
+    assert leases.finish("e1", None) is None  # nothing signed: dropped, so it is retried
+    assert leases.claim("e1", 0) == (True, None)
+
+    leases.record_signed("e1", "0xabc", b"raw")
+    assert leases.finish("e1", None) == sharding.SIGNED  # broadcast failed, no receipt
+    assert leases.claim("e1", 0) == (True, b"raw")  # rebroadcast, not re-signed
+    assert leases.finish("e1", None, mined=True) == sharding.FAILED  # reverted
+    assert leases.claim("e1", 0) == (False, None)
+
+    leases.claim("e2", 0)
+    leases.record_signed("e2", "0xdef", b"raw2")
+    assert leases.finish("e2", "0xdef") == sharding.DONE
+    assert leases.claim("e2", 0) == (False, None)
+
+
+def test_signed_relay_is_signed_again_after_max_rebroadcasts(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharding, "max_rebroadcasts", 3)
+    leases = sharding.LeaseTable(str(tmp_path / "leases.db"), owner="a")
+    leases.claim("e1", 0)
+    leases.record_signed("e1", "0xabc", b"raw")
+    assert leases.finish("e1", None) == sharding.SIGNED
+    assert leases.claim("e1", 0) == (True, b"raw")
+    assert leases.finish("e1", None) == sharding.SIGNED
+    assert leases.claim("e1", 0) == (True, b"raw")
+    assert leases.finish("e1", None) is None  # its nonce went to another transaction
+    assert leases.status("e1") is None
+    assert leases.claim("e1", 0) == (True, None)  # signed again, from scratch
+
+
+def test_old_lease_tables_get_the_attempts_column(tmp_path):
+    path = str(tmp_path / "leases.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE relays (event_id TEXT PRIMARY KEY, shard INTEGER, owner TEXT, status TEXT,"
+               " tx_hash TEXT, raw_tx BLOB, updated REAL)")
+    db.execute("INSERT INTO relays VALUES ('e1', 0, 'a', 'signed', '0xabc', x'00', 0)")
+    db.commit()
+    db.close()
+    leases = sharding.LeaseTable(path, owner="a")
+    assert leases.finish("e1", None) == sharding.SIGNED
+
+
+def test_dead_owners_shards_are_adopted(tmp_path):
+    path = str(tmp_path / "leases.db")
+    a, b = sharding.LeaseTable(path, owner="a"), sharding.LeaseTable(path, owner="b")
+    assert a.owned_shards(0, 2) == {0, 1}  # shard 1 was never leased
+    assert b.owned_shards(1, 2) == {1}  # its owner takes it back
+    assert a.owned_shards(0, 2) == {0}
+    a.claim("e1", 1)
+    assert b.claim("e1", 1) == (False, None)  # a is alive
+
+    b.resign()
+    assert a.owned_shards(0, 2) == {0, 1}
+    a.resign()
+    assert b.claim("e1", 1) == (True, None)
+
+
+def test_renew_extends_only_our_leases(tmp_path):
+    path = str(tmp_path / "leases.db")
+    a, b = sharding.LeaseTable(path, owner="a"), sharding.LeaseTable(path, owner="b")
+    a.heartbeat(0)
+    b.heartbeat(1)
+    b.resign()
+    a.renew()
+    expires = dict(a.db.execute("SELECT shard, expires FROM leases").fetchall())
+    assert expires[0] > time.time() and expires[1] == 0
+
+
+@pytest.mark.parametrize("shard,num_shards", [(2, 2), (-1, 2), (0, 0)])
+def test_run_shard_rejects_bad_arguments(shard, num_shards, tmp_path):
+    with pytest.raises(ValueError):
+        bridge.run_shard(shard, num_shards, lease_path=str(tmp_path / "leases.db"))
+
+
+def test_cursor_stops_before_a_failed_relay(tmp_path, monkeypatch):
+    events = deposits(6)
+    broadcast_ok = {"up": False}
+    sent, rebroadcast = [], []
+
+    def relay_event(chain, evt, on_signed=None, on_receipt=None, **kwargs):
+        h = tx_hash(1000 + evt.blockNumber)
+        on_signed(h, b"raw-%d" % evt.blockNumber)
+        sent.append(evt.blockNumber)
+        if evt.blockNumber == 3 and not broadcast_ok["up"]:
+            return None  # signed, but the broadcast failed
+        on_receipt({"status": 1})
+        return h
+
+    def fake_rebroadcast(chain, raw_tx, on_receipt=None):
+        rebroadcast.append(raw_tx)
+        on_receipt({"status": 1})
+        return "0x" + raw_tx.hex()
+
+    polls = {"n": 0}
+
+    def sleep(_):
+        polls["n"] += 1
+        if polls["n"] == 2:
+            raise Stop
+        broadcast_ok["up"] = True
+
+    monkeypatch.setattr(bridge, "connectTo", lambda chain: FakeW3(6))
+    monkeypatch.setattr(bridge, "get_events",
+                        lambda chain, a, b: [e for e in events if a <= e.blockNumber <= b] if chain == "source" else [])
+    monkeypatch.setattr(bridge, "relay_event", relay_event)
+    monkeypatch.setattr(bridge, "rebroadcast", fake_rebroadcast)
+    monkeypatch.setattr(bridge.time, "sleep", sleep)
+    path = str(tmp_path / "leases.db")
+    cursors = []
+    advance = sharding.LeaseTable.advance
+    monkeypatch.setattr(sharding.LeaseTable, "advance",
+                        lambda self, s, chain, block: (cursors.append((chain, block)), advance(self, s, chain, block)))
+
+    with pytest.raises(Stop):
+        bridge.run_shard(0, 1, lease_path=path)
+
+    assert cursors[0] == ("source", 2)  # not past the relay that has to be retried
+    assert rebroadcast == [b"raw-3"]  # the same signed relay, not a new one
+    assert sorted(sent) == [2, 3, 4, 5, 6]  # a new shard starts 5 blocks behind the head
+    assert cursors[2] == ("source", 6)
+    leases = sharding.LeaseTable(path, owner="check")
+    assert leases.cursor(0, "source", None) == 6
+    statuses = dict(leases.db.execute("SELECT event_id, status FROM relays").fetchall())
+    assert set(statuses.values()) == {sharding.DONE} and len(statuses) == 5
+
+
+def test_cursor_stops_before_a_relay_another_owner_holds(tmp_path, monkeypatch):
+    events = deposits(4)
+    path = str(tmp_path / "leases.db")
+    other = sharding.LeaseTable(path, owner="other")
+    other.heartbeat(7)  # alive, on a shard of its own
+    other.claim(sharding.event_id("source", events[1]), 0)  # block 2, mid-relay
+    sent = []
+
+    def relay_event(chain, evt, on_signed=None, on_receipt=None, **kwargs):
+        on_signed(tx_hash(1000 + evt.blockNumber), b"raw")
+        sent.append(evt.blockNumber)
+        on_receipt({"status": 1})
+        return tx_hash(1000 + evt.blockNumber)
+
+    def sleep(_):
+        raise Stop
+
+    monkeypatch.setattr(bridge, "connectTo", lambda chain: FakeW3(5))
+    monkeypatch.setattr(bridge, "get_events",
+                        lambda chain, a, b: [e for e in events if a <= e.blockNumber <= b] if chain == "source" else [])
+    monkeypatch.setattr(bridge, "relay_event", relay_event)
+    monkeypatch.setattr(bridge.time, "sleep", sleep)
+    with pytest.raises(Stop):
+        bridge.run_shard(0, 1, lease_path=path)
+
+    assert sent == [1, 3, 4]
+    # If `other` dies before finishing, whoever serves shard 0 rescans from block 2
+    assert sharding.LeaseTable(path, owner="check").cursor(0, "source", None) == 1
+
+
+def _shard_process(path, shard, num_shards, head_file, log_file, ttl):
+    """
+    run_shard against a fake chain whose head is read from head_file;
+    each relay appends "pid shard event_id" to log_file.
+    """
+    events = deposits(40)
+    sharding.lease_ttl = ttl
+
+    def head():
+        with open(head_file) as f:
+            return int(f.read())
+
+    def relay_event(chain, evt, on_signed=None, on_receipt=None, **kwargs):
+        h = tx_hash(1000 + evt.blockNumber)
+        on_signed(h, b"raw")
+        line = f"{os.getpid()} {sharding.shard_for(evt.args['token'], num_shards)} {sharding.event_id(chain, evt)}\n"
+        fd = os.open(log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        os.write(fd, line.encode())
+        os.close(fd)
+        on_receipt({"status": 1})
+        return h
+
+    bridge.connectTo = lambda chain: FakeW3(head)
+    bridge.get_events = lambda chain, a, b: [e for e in events if a <= e.blockNumber <= b] if chain == "source" else []
+    bridge.relay_event = relay_event
+    bridge.run_shard(shard, num_shards, poll_interval=0.05, lease_path=path)
+
+
+def _relayed(log_file):
+    if not os.path.exists(log_file):
+        return []
+    with open(log_file) as f:
+        return [line.split() for line in f if line.endswith("\n")]
+
+
+def _wait_for(log_file, n, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(_relayed(log_file)) >= n:
+            time.sleep(0.3)  # let any duplicate show up
+            return _relayed(log_file)
+        time.sleep(0.05)
+    raise AssertionError(f"only {len(_relayed(log_file))} of {n} relays after {timeout}s")
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_two_processes_hand_over_a_dead_shard(tmp_path):
+    path, head_file, log_file = str(tmp_path / "leases.db"), str(tmp_path / "head"), str(tmp_path / "relays")
+    ttl = 1.0
+    with open(head_file, "w") as f:
+        f.write("5")  # new shards start 5 blocks behind the head, so from block 1
+    # Lease shard 1 up front so shard 0's process doesn't adopt it before its owner starts
+    sharding.LeaseTable(path, owner="starting").db.execute(
+        "INSERT INTO leases (shard, owner, expires) VALUES (1, 'starting', ?)", (time.time() + 30,))
+    ctx = multiprocessing.get_context("fork")
+    a = ctx.Process(target=_shard_process, args=(path, 0, 2, head_file, log_file, ttl), daemon=True)
+    b = ctx.Process(target=_shard_process, args=(path, 1, 2, head_file, log_file, ttl), daemon=True)
+    a.start()
+    b.start()
+    try:
+        _wait_for(log_file, 5)
+        with open(head_file, "w") as f:
+            f.write("20")
+        first = _wait_for(log_file, 20)
+        assert len(first) == 20 and len({eid for _, _, eid in first}) == 20
+        assert all(pid == str(a.pid if shard == "0" else b.pid) for pid, shard, _ in first)
+
+        os.kill(b.pid, signal.SIGKILL)  # no resign: a has to wait out the lease
+        b.join()
+        with open(head_file, "w") as f:
+            f.write("40")
+        relays = _wait_for(log_file, 40)
+        assert len(relays) == 40 and len({eid for _, _, eid in relays}) == 40
+        handed_over = [pid for pid, shard, eid in relays[20:] if shard == "1"]
+        assert handed_over and set(handed_over) == {str(a.pid)}
+        leases = sharding.LeaseTable(path, owner="check")
+        deadline = time.time() + 5
+        while leases.cursor(1, "source", None) != 40 and time.time() < deadline:
+            time.sleep(0.05)
+        assert leases.cursor(0, "source", None) == leases.cursor(1, "source", None) == 40
+    finally:
+        for p in (a, b):
+            if p.is_alive():
+                p.kill()
+            p.join()
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+from hexbytes import HexBytes
+
+import bridge
+from bridge_keyring import load_account
+
+KEYS = ["0x" + f"{i:064x}" for i in range(1, 3)]
+RECIPIENT = "0x" + "22" * 20
+
+
+def unsigned(nonce):
+    return {"to": RECIPIENT, "value": 1, "gas": 21000, "gasPrice": 10 ** 9, "nonce": nonce, "chainId": 1}
+
+
+class FakeEth:
+    def __init__(self, pending):
+        self.pending = pending
+        self.gas_price = 10 ** 9
+        self.sent = []
+
+    def get_transaction_count(self, address, block):
+        return self.pending
+
+    def send_raw_transaction(self, raw_tx):
+        self.sent.append(bytes(raw_tx))
+        return HexBytes(b"\x01" * 32)
+
+    def wait_for_transaction_receipt(self, tx_hash):
+        return SimpleNamespace(transactionHash=HexBytes(tx_hash), status=1, blockNumber=10, gasUsed=21000)
+
+
+class Transfer:
+    def __init__(self, *args):
+        pass
+
+    def build_transaction(self, params):
+        return dict(unsigned(params["nonce"]), gas=params["gas"], gasPrice=params["gasPrice"])
+
+
+def test_send_transaction_signs_inline_at_the_pending_nonce():
+    account = load_account(KEYS[0])
+    eth = FakeEth(pending=7)
+    signed = []
+    result = bridge.send_transaction(SimpleNamespace(eth=eth), Transfer, [], account, KEYS[0], gas_estimate=21000,
+                                     on_signed=lambda h, raw: signed.append((h, bytes(raw))))
+    expected = account.sign_transaction(dict(unsigned(7), gas=1500000))
+    assert signed == [(expected.hash.hex(), bytes(expected.rawTransaction))]
+    assert eth.sent == [signed[0][1]]
+    assert result == "0x" + "01" * 32
+
+
+def test_relays_sign_with_the_account_parsed_once():
+    assert load_account(KEYS[0]) is load_account(KEYS[0])
+    assert load_account(KEYS[0]).address != load_account(KEYS[1]).address
+
+
+def test_warden_key_is_read_on_first_use(monkeypatch):
+    monkeypatch.setattr(bridge, "private_key", None)
+    monkeypatch.setenv("BRIDGE_WARDEN_KEY", KEYS[1])
+    assert bridge.warden_key() == KEYS[1]
+    monkeypatch.setenv("BRIDGE_WARDEN_KEY", KEYS[0])
+    assert bridge.warden_key() == KEYS[1]
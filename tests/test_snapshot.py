@@ -0,0 +1,148 @@
+import time
+
+import pytest
+
+import abi_artifact
+import bridge
+import snapshot
+from fakes import Event, FakeClient, RecordingIndex, receipt, tx_hash
+from sharding import event_id
+
+KEY = "0xsource/0xdestination"
+TOKEN, RECIPIENT = "0x" + "11" * 20, "0x" + "44" * 20
+SOURCE = ("Deposit", TOKEN, RECIPIENT, 5)  # snapshot.source_of the relayed Deposit
+CONTRACTS = abi_artifact.load_artifact()
+
+
+def topic(address):
+    return "0x" + "00" * 12 + address[2:]
+
+
+def wrapped(relay_tx, status=1, amount=5):
+    """
+    Receipt of a wrap relaying SOURCE (or another amount).
+    """
+    wrap = {"address": CONTRACTS["destination"]["address"], "blockNumber": hex(10), "blockHash": tx_hash(10),
+            "transactionHash": relay_tx, "logIndex": "0x0",
+            "topics": [CONTRACTS["destination"]["events"]["Wrap"]["topic"], topic(TOKEN), topic("0x" + "22" * 20),
+                       topic(RECIPIENT)],
+            "data": "0x" + amount.to_bytes(32, "big").hex()}
+    return receipt(status, tx=relay_tx, logs=[wrap] if status == 1 else [])
+
+
+def sample():
+    return {
+        "cursors": {"source": 120, "destination": 80},
+        "blocks": {"source": [(119, tx_hash(119)), (120, tx_hash(120))], "destination": [(80, tx_hash(80))]},
+        "tokens": ([("0x" + "11" * 20, "0x" + "22" * 20)], ["0x" + "11" * 20], {"source": 100, "destination": 70}),
+        "pending": {"source:" + tx_hash(1) + ":0": ("destination", tx_hash(501), b"\x02raw-1", SOURCE)},
+    }
+
+
+def write_snapshot(path, snap):
+    snapshot.write(path, snapshot.encode(snap, KEY, created=time.time()))
+
+
+def test_encode_decode_round_trip():
+    snap = sample()
+    out = snapshot.decode(snapshot.encode(snap, KEY, created=1.5), KEY)
+    assert out.pop("created") == 1.5
+    assert out == snap
+
+
+def test_decode_rejects_another_key_or_version():
+    data = snapshot.encode(sample(), KEY)
+    assert snapshot.decode(data, "other") is None
+    assert snapshot.decode(data.replace(snapshot.MAGIC, b"XXXXXX", 1), KEY) is None
+    versioned = bytearray(data)
+    versioned[len(snapshot.MAGIC) + 1] += 1
+    assert snapshot.decode(bytes(versioned), KEY) is None
+
+
+def test_load_ignores_a_truncated_snapshot(tmp_path):
+    path = tmp_path / "relayer.snapshot"
+    path.write_bytes(snapshot.encode(sample(), KEY)[:-5])
+    assert snapshot.load(path, KEY) is None
+
+
+def test_warm_start_settles_mined_relays_and_rebroadcasts_the_rest(tmp_path):
+    snap = sample()
+    mined, waiting = "source:" + tx_hash(1) + ":0", "source:" + tx_hash(2) + ":1"
+    snap["pending"] = {mined: ("destination", tx_hash(501), b"raw-1", SOURCE),
+                       waiting: ("destination", tx_hash(502), b"raw-2", SOURCE)}
+    write_snapshot(tmp_path / "s", snap)
+    clients = {"source": FakeClient(headers={119: tx_hash(119), 120: tx_hash(120)}),
+               "destination": FakeClient(headers={80: tx_hash(80)}, receipts={tx_hash(501): wrapped(tx_hash(501))})}
+    index = RecordingIndex()
+    state = snapshot.RelayState(KEY)
+
+    summary = snapshot.warm_start(state, clients, tmp_path / "s", transfers=index)
+
+    assert summary["confirmed"] == 1 and summary["rebroadcast"] == 1 and not summary["reorged"]
+    assert state.cursors == {"source": 120, "destination": 80}
+    assert clients["destination"].sent == ["0x" + b"raw-2".hex()]
+    assert set(state.pending) == set(state.rebroadcast) == {waiting}
+    assert index.updates == [(mined, "confirmed", tx_hash(501))]
+
+
+def test_warm_start_rescans_after_a_reorg(tmp_path):
+    write_snapshot(tmp_path / "s", sample())
+    clients = {"source": FakeClient(headers={119: tx_hash(119), 120: tx_hash(999)}),
+               "destination": FakeClient(headers={80: tx_hash(80)})}
+    state = snapshot.RelayState(KEY)
+    summary = snapshot.warm_start(state, clients, tmp_path / "s")
+    assert summary["reorged"] == ["source"]
+    assert state.cursors["source"] == 119
+
+
+def test_rescan_after_warm_start_skips_rebroadcast_relays(tmp_path, monkeypatch):
+    pending = Event(tx_hash(2), 1, token="0x" + "11" * 20, recipient="0x" + "44" * 20, amount=5)
+    fresh = Event(tx_hash(3), 0, token="0x" + "11" * 20, recipient="0x" + "44" * 20, amount=5)
+    snap = sample()
+    snap["pending"] = {event_id("source", pending): ("destination", tx_hash(502), b"raw-2", SOURCE)}
+    write_snapshot(tmp_path / "s", snap)
+    clients = {"source": FakeClient(headers={120: tx_hash(120)}), "destination": FakeClient(headers={80: tx_hash(80)})}
+    state = snapshot.RelayState(KEY)
+    snapshot.warm_start(state, clients, tmp_path / "s")
+    monkeypatch.setattr(bridge, "relay_state", state)
+    monkeypatch.setattr(bridge, "transfers", None)
+
+    assert bridge.unrelayed("source", [pending, fresh]) == [fresh]
+
+
+def test_unrelayed_skips_transfers_the_index_shows_sent(monkeypatch):
+    sent = Event(tx_hash(4), 0)
+    fresh = Event(tx_hash(5), 0)
+    monkeypatch.setattr(bridge, "relay_state", None)
+    monkeypatch.setattr(bridge, "transfers", RecordingIndex(sent=[event_id("source", sent)]))
+    assert bridge.unrelayed("source", [sent, fresh]) == [fresh]
+
+
+@pytest.mark.parametrize("status,amount,outcome", [(1, 5, "confirmed"), (0, 5, "failed"), (1, 6, "mismatched")])
+def test_settle_finishes_rebroadcast_relays_once_mined(status, amount, outcome):
+    tid = "source:" + tx_hash(2) + ":1"
+    state = snapshot.RelayState(KEY)
+    state.pending[tid] = ("destination", tx_hash(502), b"raw-2", SOURCE)
+    state.rebroadcast[tid] = ("destination", tx_hash(502), time.time())
+    client = FakeClient()
+    index = RecordingIndex()
+
+    assert snapshot.settle(state, {"destination": client}, index) == 0
+    assert tid in state.pending
+
+    client.receipts[tx_hash(502)] = wrapped(tx_hash(502), status, amount)
+    assert snapshot.settle(state, {"destination": client}, index) == 1
+    assert not state.pending and not state.rebroadcast
+    assert index.updates == [(tid, outcome, tx_hash(502))]
+    assert (state.first_relay is not None) == (outcome == "confirmed")
+
+
+def test_settle_drops_relays_with_no_receipt_after_the_timeout(monkeypatch):
+    tid = "source:" + tx_hash(2) + ":1"
+    state = snapshot.RelayState(KEY)
+    state.pending[tid] = ("destination", tx_hash(502), b"raw-2", SOURCE)
+    state.rebroadcast[tid] = ("destination", tx_hash(502), time.time() - snapshot.settle_timeout - 1)
+    index = RecordingIndex()
+    assert snapshot.settle(state, {"destination": FakeClient()}, index) == 1
+    assert not state.pending
+    assert index.updates == [(tid, "failed", tx_hash(502))]
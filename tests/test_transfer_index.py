@@ -0,0 +1,72 @@
+import pytest
+
+import relay_verify
+import transfer_index
+from fakes import Event, tx_hash
+from sharding import event_id
+
+TOKEN, RECIPIENT = "0x" + "11" * 20, "0x" + "22" * 20
+
+
+def deposit(n, **args):
+    return Event(tx_hash(n), 0, block=n, **dict(dict(token=TOKEN, recipient=RECIPIENT, amount=n), **args))
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = transfer_index.TransferIndex(str(tmp_path / "transfers.db"))
+    yield index
+    index.close()
+
+
+def test_lifecycle_and_lookup(index):
+    evt = deposit(1)
+    index.seen("source", [evt], "avax-bsc")
+    index.submitted("source", evt, tx_hash(501))
+    index.verified("source", evt, relay_verify.Outcome(relay_verify.VERIFIED, tx_hash(501)))
+    (t,) = index.lookup(tx_hash(1))
+    assert (t["status"], t["relay_tx"], t["route"]) == (transfer_index.CONFIRMED, tx_hash(501), "avax-bsc")
+    assert [s["status"] for s in t["steps"]] == ["seen", "submitted", "confirmed"]
+    assert index.lookup(RECIPIENT)[0]["transfer_id"] == event_id("source", evt)
+
+
+def test_rescanned_events_keep_their_state(index):
+    evt = deposit(1)
+    index.seen("source", [evt])
+    index.held("source", evt, "pre-flight: would revert")
+    index.seen("source", [evt])
+    assert index.by_tx(tx_hash(1), lifecycle=False)[0]["status"] == transfer_index.HELD
+
+
+def test_relayed_lists_submitted_and_confirmed_transfers(index):
+    events = [deposit(n) for n in range(1, 5)]
+    index.seen("source", events)
+    index.submitted("source", events[0], tx_hash(501))
+    index.finished("source", events[1], tx_hash(502))
+    index.finished("source", events[2], None)
+    assert index.relayed("source", events) == {event_id("source", e) for e in events[:2]}
+    assert index.relayed("source", []) == set()
+
+
+def test_a_failed_batch_is_rolled_back(index):
+    good, bad = deposit(1), deposit(2)
+    del bad.args["amount"]
+    with pytest.raises(KeyError):
+        index.seen("source", [good, bad])
+    assert index.search(limit=10) == []
+
+    # The connection isn't left inside the failed transaction
+    index.seen("source", [good])
+    index.update(event_id("source", good), transfer_index.FAILED)
+    assert index.by_tx(tx_hash(1), lifecycle=False)[0]["status"] == transfer_index.FAILED
+
+
+def test_a_failed_update_is_rolled_back(index):
+    evt = deposit(1)
+    index.seen("source", [evt])
+    with pytest.raises(Exception):
+        index.update(event_id("source", evt), transfer_index.CONFIRMED, tx_hash=12345)  # not a hash
+    (t,) = index.by_tx(tx_hash(1))
+    assert t["status"] == transfer_index.SEEN and len(t["steps"]) == 1
+    index.update(event_id("source", evt), transfer_index.CONFIRMED, tx_hash(501))
+    assert index.by_tx(tx_hash(1), lifecycle=False)[0]["status"] == transfer_index.CONFIRMED
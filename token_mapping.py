@@ -0,0 +1,238 @@
+"""
+Underlying <-> wrapped token addresses.
+
+Destination.createToken deploys each wrapped token as an EIP-1167 clone of
+Destination.token_implementation with CREATE2, salted by the underlying token
+address, so the wrapped address can be computed off-chain without calling
+wrapped_tokens().
+
+TokenIndex keeps a persisted local copy of Destination.wrapped_tokens /
+underlying_tokens and Source.approved.  Those mappings only change through
+Creation and Registration events, and entries are never removed, so the
+index is built once from the events (plus Destination.tokens()) and then
+follows new events with sync().  A lookup that misses the index falls back
+to an eth_call.  A positive answer is cached, a negative one isn't.
+"""
+import json
+import os
+from pathlib import Path
+
+from abi_artifact import keccak, to_checksum_address
+
+
+# EIP-1167 minimal proxy creation code around the 20-byte implementation address
+EIP1167_PREFIX = bytes.fromhex("3d602d80600a3d3981f3363d3d373d3d3d363d73")
+EIP1167_SUFFIX = bytes.fromhex("5af43d82803e903d91602b57fd5bf3")
+
+
+def clone_salt(underlying_token):
+    """
+    Destination._salt(): the underlying token address left-padded to 32 bytes.
+    """
+    return bytes(12) + bytes.fromhex(underlying_token[2:])
+
+
+def predict_wrapped_token(destination, implementation, underlying_token):
+    """
+    Address Destination.createToken(underlying_token, ...) deploys to
+    (same as Destination.predictWrappedToken).
+    """
+    init_code = EIP1167_PREFIX + bytes.fromhex(implementation[2:]) + EIP1167_SUFFIX
+    digest = keccak(b"\xff" + bytes.fromhex(destination[2:]) + clone_salt(underlying_token) + keccak(init_code))
+    return to_checksum_address(digest[12:])
+
+
+def get_token_implementation(client, destination):
+    """
+    Read Destination.token_implementation() with a raw eth_call.
+    """
+    selector = "0x" + keccak(b"token_implementation()")[:4].hex()
+    result = client.call("eth_call", [{"to": destination, "data": selector}, "latest"])
+    return to_checksum_address(bytes.fromhex(result[2:])[12:])
+
+
+index_dir = "token_index"
+INDEX_VERSION = 1
+max_range = 2048  # blocks per eth_getLogs request
+CREATION_TOPIC = "0x" + keccak(b"Creation(address,address)").hex()
+REGISTRATION_TOPIC = "0x" + keccak(b"Registration(address)").hex()
+
+
+def _selector(signature):
+    return "0x" + keccak(signature.encode())[:4].hex()
+
+
+def _address_arg(address):
+    return "00" * 12 + address[2:].lower()
+
+
+def _topic_address(topic):
+    return to_checksum_address(bytes.fromhex(topic[-40:]))
+
+
+class TokenIndex:
+    """
+    Token mappings of one Source/Destination pair, persisted in
+    token_index/<source>-<destination>.json.
+
+    clients maps "source"/"destination" to RPCClients; they are used by
+    sync() and for lookups that miss the index.
+    """
+
+    def __init__(self, source, destination, clients=None, path=None):
+        self.source = to_checksum_address(bytes.fromhex(source[2:]))
+        self.destination = to_checksum_address(bytes.fromhex(destination[2:]))
+        self.clients = clients or {}
+        self.path = Path(path) if path else \
+            Path(__file__).with_name(index_dir) / f"{self.source.lower()}-{self.destination.lower()}.json"
+        self.wrapped = {}  # underlying (lowercase) -> wrapped
+        self.underlying = {}  # wrapped (lowercase) -> underlying
+        self.approved = set()  # lowercase
+        self.cursors = {}  # "source"/"destination" -> last block scanned
+        self.stats = {"hits": 0, "misses": 0}
+        self._load()
+
+    @classmethod
+    def for_contracts(cls, contracts, clients=None, path=None):
+        return cls(contracts["source"]["address"], contracts["destination"]["address"], clients, path)
+
+    def _load(self):
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        for underlying, wrapped in data["wrapped"].items():
+            self._add_creation(underlying, wrapped)
+        self.approved = set(data["approved"])
+        self.cursors = data["cursors"]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open("w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "source": self.source,
+                "destination": self.destination,
+                "cursors": self.cursors,
+                "wrapped": {u: w for u, w in self.wrapped.items()},
+                "approved": sorted(self.approved),
+            }, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def _add_creation(self, underlying, wrapped):
+        self.wrapped[underlying.lower()] = to_checksum_address(bytes.fromhex(wrapped[2:]))
+        self.underlying[wrapped.lower()] = to_checksum_address(bytes.fromhex(underlying[2:]))
+
+    # Lookups
+
+    def _call(self, side, signature, address):
+        client = self.clients[side]
+        contract = self.source if side == "source" else self.destination
+        result = client.call("eth_call", [{"to": contract, "data": _selector(signature) + _address_arg(address)},
+                                          "latest"])
+        return bytes.fromhex(result[2:])
+
+    def wrapped_token(self, underlying):
+        """
+        Destination.wrapped_tokens(underlying), or None if it hasn't been created.
+        """
+        wrapped = self.wrapped.get(underlying.lower())
+        if wrapped:
+            self.stats["hits"] += 1
+            return wrapped
+        self.stats["misses"] += 1
+        wrapped = to_checksum_address(self._call("destination", "wrapped_tokens(address)", underlying)[12:])
+        if int(wrapped, 16) == 0:
+            return None
+        self._add_creation(underlying, wrapped)
+        self.save()
+        return wrapped
+
+    def underlying_token(self, wrapped):
+        """
+        Destination.underlying_tokens(wrapped), or None for an unknown token.
+        """
+        underlying = self.underlying.get(wrapped.lower())
+        if underlying:
+            self.stats["hits"] += 1
+            return underlying
+        self.stats["misses"] += 1
+        underlying = to_checksum_address(self._call("destination", "underlying_tokens(address)", wrapped)[12:])
+        if int(underlying, 16) == 0:
+            return None
+        self._add_creation(underlying, wrapped)
+        self.save()
+        return underlying
+
+    def is_approved(self, token):
+        """
+        Source.approved(token).
+        """
+        if token.lower() in self.approved:
+            self.stats["hits"] += 1
+            return True
+        self.stats["misses"] += 1
+        if int.from_bytes(self._call("source", "approved(address)", token), "big") == 0:
+            return False
+        self.approved.add(token.lower())
+        self.save()
+        return True
+
+    # Following events
+
+    def _bootstrap_destination(self, client, page=50):
+        """
+        Enumerate Destination.tokens(i) until the call fails; used on the first
+        sync so that tokens created before the scan window are indexed too.
+        """
+        wrapped = []
+        while True:
+            params = [[{"to": self.destination, "data": _selector("tokens(uint256)") + i.to_bytes(32, "big").hex()},
+                       "latest"] for i in range(len(wrapped), len(wrapped) + page)]
+            results = client.batch("eth_call", params, raise_errors=False)
+            for r in results:
+                if "error" in r or len(r.get("result") or "0x") < 66:
+                    break
+                wrapped.append(to_checksum_address(bytes.fromhex(r["result"][2:])[12:]))
+            else:
+                continue
+            break
+        if wrapped:
+            params = [[{"to": self.destination, "data": _selector("underlying_tokens(address)") + _address_arg(w)},
+                       "latest"] for w in wrapped]
+            for w, result in zip(wrapped, client.batch("eth_call", params)):
+                self._add_creation(to_checksum_address(bytes.fromhex(result[2:])[12:]), w)
+        return len(wrapped)
+
+    def sync(self, lookback=10000):
+        """
+        Apply Creation/Registration events since the last sync.  The first
+        sync scans the last `lookback` blocks (and enumerates
+        Destination.tokens()); approvals older than that are picked up by
+        is_approved() on first use.  Returns the number of new entries.
+        """
+        before = len(self.wrapped) + len(self.approved)
+        for side, contract, topic in (("destination", self.destination, CREATION_TOPIC),
+                                      ("source", self.source, REGISTRATION_TOPIC)):
+            client = self.clients[side]
+            head = client.block_number()
+            if side not in self.cursors:
+                if side == "destination":
+                    self._bootstrap_destination(client)
+                start = max(0, head - lookback)
+            else:
+                start = self.cursors[side] + 1
+            for lo in range(start, head + 1, max_range):
+                hi = min(head, lo + max_range - 1)
+                for log in client.get_logs(contract, [topic], lo, hi):
+                    if topic == CREATION_TOPIC:
+                        self._add_creation(_topic_address(log["topics"][1]), _topic_address(log["topics"][2]))
+                    else:
+                        self.approved.add(_topic_address(log["topics"][1]).lower())
+            self.cursors[side] = head
+        self.save()
+        return len(self.wrapped) + len(self.approved) - before
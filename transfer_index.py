@@ -0,0 +1,292 @@
+"""
+Local transfer-status index: "where is my deposit?" without RPC calls.
+
+The relayer records every Deposit/Unwrap it sees and every step of relaying
+it in transfers.db (SQLite, WAL):
+
+    seen -> held (pre-flight says it would revert)
+         -> submitted (relay signed, hash known) -> confirmed | failed | mismatched
+         -> attested (claim mode)
+
+A relay is confirmed once its receipt holds the matching Wrap/Withdrawal
+(relay_verify); mismatched means it was mined without one.
+
+transfers holds the current state of each transfer, indexed by source
+transaction hash, recipient, token and block.  transfer_steps holds the
+timestamped lifecycle.  Lookups are single index probes:
+
+    python bridge_cli.py status 0x<source tx hash | recipient | token> [--json]
+    python bridge_cli.py status --serve 8548
+    GET /transfers/<source tx hash>
+    GET /transfers?recipient=0x...&token=0x...&from_block=N&limit=50
+"""
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import relay_verify
+from sharding import event_id
+
+index_db = "transfers.db"
+
+SEEN = "seen"
+HELD = "held"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+MISMATCHED = "mismatched"
+ATTESTED = "attested"
+
+COLUMNS = ("transfer_id", "route", "chain", "event", "src_tx", "log_index", "block", "token", "wrapped_token",
+           "recipient", "amount", "status", "relay_tx", "detail", "seen_at", "updated")
+
+
+def outcome_status(outcome):
+    """
+    Transfer status of a relay_verify.Outcome.
+    """
+    return {relay_verify.VERIFIED: CONFIRMED, relay_verify.REVERTED: FAILED}.get(outcome.status, MISMATCHED)
+
+
+def _hex(value):
+    value = value if isinstance(value, str) else value.hex()
+    return (value if value.startswith("0x") else "0x" + value).lower()
+
+
+def _fields(chain, evt):
+    args = evt.args
+    if chain == "source":
+        return args["token"], None, args["recipient"]
+    return args["underlying_token"], args["wrapped_token"], args["to"]
+
+
+class TransferIndex:
+    """
+    transfers.db; safe to share between the relay threads of one process and
+    to read from other processes while the relayer writes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or str(Path(__file__).with_name(index_db))
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS transfers ("
+            " transfer_id TEXT PRIMARY KEY, route TEXT, chain TEXT, event TEXT, src_tx TEXT, log_index INTEGER,"
+            " block INTEGER, token TEXT, wrapped_token TEXT, recipient TEXT, amount TEXT, status TEXT,"
+            " relay_tx TEXT, detail TEXT, seen_at REAL, updated REAL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS transfer_steps ("
+            " transfer_id TEXT, status TEXT, tx_hash TEXT, detail TEXT, at REAL)"
+        )
+        for column in ("src_tx", "recipient", "token", "block"):
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS transfers_{column} ON transfers ({column})")
+        self.db.execute("CREATE INDEX IF NOT EXISTS transfer_steps_id ON transfer_steps (transfer_id)")
+
+    # Updates from the relayer
+
+    def seen(self, chain, events, route=None):
+        """
+        Index a batch of scanned events in one transaction.  Events already
+        indexed (rescanned blocks) keep their state.
+        """
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                for evt in events:
+                    tid = event_id(chain, evt)
+                    token, wrapped, recipient = _fields(chain, evt)
+                    cursor = self.db.execute(
+                        "INSERT OR IGNORE INTO transfers (transfer_id, route, chain, event, src_tx, log_index, block,"
+                        " token, wrapped_token, recipient, amount, status, seen_at, updated)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (tid, route, chain, evt.event, _hex(evt.transactionHash), evt.logIndex, evt.blockNumber,
+                         token.lower(), wrapped and wrapped.lower(), recipient.lower(), str(evt.args["amount"]),
+                         SEEN, now, now))
+                    if cursor.rowcount:
+                        self.db.execute("INSERT INTO transfer_steps VALUES (?, ?, ?, ?, ?)",
+                                        (tid, SEEN, None, None, now))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def held(self, chain, evt, reason=None):
+        self.record(chain, evt, HELD, detail=reason)
+
+    def submitted(self, chain, evt, tx_hash):
+        self.record(chain, evt, SUBMITTED, tx_hash)
+
+    def finished(self, chain, evt, tx_hash):
+        """
+        Outcome of relay_event: the confirmed relay hash, or None if it failed.
+        """
+        self.record(chain, evt, CONFIRMED if tx_hash else FAILED, tx_hash)
+
+    def verified(self, chain, evt, outcome):
+        """
+        Outcome of relay_event checked against the relay receipt
+        (a relay_verify.Outcome).
+        """
+        self.record(chain, evt, outcome_status(outcome), outcome.tx_hash, outcome.detail)
+
+    def attested(self, chain, events):
+        for evt in events:
+            self.record(chain, evt, ATTESTED)
+
+    def record(self, chain, evt, status, tx_hash=None, detail=None):
+        """
+        Move a transfer to `status`; tx_hash is the relay transaction if known.
+        """
+        self.update(event_id(chain, evt), status, tx_hash, detail)
+
+    def update(self, tid, status, tx_hash=None, detail=None):
+        now = time.time()
+        with self.lock:
+            # The connection is in autocommit mode (isolation_level=None), so
+            # the transaction is explicit and rolled back by hand on errors
+            self.db.execute("BEGIN")
+            try:
+                self.db.execute(
+                    "UPDATE transfers SET status = ?, relay_tx = COALESCE(?, relay_tx), detail = ?, updated = ?"
+                    " WHERE transfer_id = ?", (status, tx_hash and _hex(tx_hash), detail, now, tid))
+                self.db.execute("INSERT INTO transfer_steps VALUES (?, ?, ?, ?, ?)",
+                                (tid, status, tx_hash and _hex(tx_hash), detail, now))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    # Queries
+
+    def relayed(self, chain, events):
+        """
+        Event ids of the `events` whose relay was already sent (submitted or
+        confirmed), so a rescan doesn't settle them a second time.
+        """
+        ids = [event_id(chain, evt) for evt in events]
+        if not ids:
+            return set()
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT transfer_id FROM transfers WHERE status IN (?, ?)"
+                f" AND transfer_id IN ({', '.join('?' * len(ids))})", [SUBMITTED, CONFIRMED] + ids).fetchall()
+        return {r[0] for r in rows}
+
+    def _rows(self, sql, params):
+        with self.lock:
+            cursor = self.db.execute(sql, params)
+            return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+    def steps(self, tid):
+        with self.lock:
+            rows = self.db.execute("SELECT status, tx_hash, detail, at FROM transfer_steps WHERE transfer_id = ?"
+                                   " ORDER BY at, rowid", (tid,)).fetchall()
+        return [{"status": s, "txHash": h, "detail": d, "at": at} for s, h, d, at in rows]
+
+    def by_tx(self, tx_hash, lifecycle=True):
+        """
+        Transfers from one source transaction (usually one), with their steps.
+        """
+        out = self._rows(f"SELECT {', '.join(COLUMNS)} FROM transfers WHERE src_tx = ? ORDER BY log_index",
+                         (_hex(tx_hash),))
+        if lifecycle:
+            for t in out:
+                t["steps"] = self.steps(t["transfer_id"])
+        return out
+
+    def search(self, recipient=None, token=None, from_block=None, to_block=None, status=None, limit=50):
+        """
+        Latest transfers matching all given filters.
+        """
+        where, params = [], []
+        for column, value in (("recipient", recipient), ("token", token), ("status", status)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value.lower() if column != "status" else value)
+        if from_block is not None:
+            where.append("block >= ?")
+            params.append(from_block)
+        if to_block is not None:
+            where.append("block <= ?")
+            params.append(to_block)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM transfers"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._rows(sql + " ORDER BY block DESC, log_index DESC LIMIT ?", params + [limit])
+
+    def lookup(self, key, limit=50):
+        """
+        A 32-byte hash is a source transaction; a 20-byte address is tried as
+        a recipient, then as a token.
+        """
+        key = key.lower()
+        if len(key) == 66:
+            return self.by_tx(key)
+        return self.search(recipient=key, limit=limit) or self.search(token=key, limit=limit)
+
+    def close(self):
+        self.db.close()
+
+
+def format_transfer(t):
+    lines = [f"{t['event']} {t['src_tx']}#{t['log_index']} ({t['chain']}, block {t['block']}): {t['status']}",
+             f"  {t['amount']} of {t['token']} to {t['recipient']}" + (f" via {t['route']}" if t["route"] else "")]
+    if t["relay_tx"]:
+        lines.append(f"  relay tx {t['relay_tx']}")
+    for s in t.get("steps", ()):
+        at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(s["at"]))
+        lines.append(f"  {at} {s['status']:<10} {s['txHash'] or ''} {s['detail'] or ''}".rstrip())
+    return "\n".join(lines)
+
+
+def serve(index, port=8548, host="127.0.0.1"):
+    """
+    Serve transfer lookups over HTTP in a background thread.  Returns the server.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body):
+            out = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            if parts[0] != "transfers":
+                return self._reply(404, {"error": "not found"})
+            if len(parts) == 2:
+                found = index.by_tx(parts[1])
+                return self._reply(200, found) if found else self._reply(404, {"error": "unknown transaction"})
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            try:
+                found = index.search(query.get("recipient"), query.get("token"),
+                                     int(query["from_block"]) if "from_block" in query else None,
+                                     int(query["to_block"]) if "to_block" in query else None,
+                                     query.get("status"), int(query.get("limit", 50)))
+            except ValueError as e:
+                return self._reply(400, {"error": str(e)})
+            return self._reply(200, found)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving transfer status on http://{host}:{server.server_port}/transfers")
+    return server